@@ -1,12 +1,22 @@
+import numpy as np
 from itertools import product
-from typing import List
-from src.jaggdy.utils.utils import evaluate_sentence
-from src.jaggdy.utils.enums import Z2, Prop, Logic
-from src.jaggdy.utils.types import Sentence, Interpretation
+from typing import List, Iterator
+from numpy.typing import NDArray
+from src.jaggdy.utils.utils import evaluate_indexed_sentence, compile_sentence, truth_table, normalize_sentence
+from src.jaggdy.utils.sat import enumerate_models
+from src.jaggdy.utils.atoms import AtomTable
+from src.jaggdy.utils.cache import ArrayCache
+from src.jaggdy.utils.enums import Z2, Logic
+from src.jaggdy.utils.types import Sentence, IndexedSentence, Interpretation, Atom
+from src.jaggdy.ModelSet import ModelSet
+
+
+# Number of truth table rows evaluated per batch by the compiled model search.
+TRUTH_TABLE_CHUNK: int = 1 << 16
+# Largest agenda for which the automatic model search walks the whole truth table.
+TRUTH_TABLE_MAX_ATOMS: int = 20
 
 
-# TODO: allow input by strs instead of props
-# TODO: implement Sympy or a faster sat sovler to find models
 class BeliefBase:
     """
     A `belief base` contains a set of atomic propositions, a set of rational
@@ -14,12 +24,24 @@ class BeliefBase:
     of vectors over Z_2 representing rational assignments of truth values to the
     atomic propositions with respect to the integrity constraints.
 
+    Atoms may be given as members of the Prop enum or by arbitrary names, so agendas
+    are not limited to the eleven members of Prop.
+
     ATTRIBUTES:
-        atoms (List[Prop]): The atomic propositions in the agenda.
+        atoms (List[Atom]): The atomic propositions in the agenda.
+        atom_table (AtomTable): Maps each atom to its position in an interpretation.
         constraints (Sentence): The conjunction of propositional sentence in the
         set of integrity constraints.
+        indexed_constraints (IndexedSentence): The same conjunction, referring to atoms by
+        their ids in atom_table.
         models (List[Interpretation]): The vectors representing rational assignments
-        of truth values to the atomic propositions with respect to the integrity constraints
+        of truth values to the atomic propositions with respect to the integrity constraints.
+        Computed on first access; use iter_models to stream them instead.
+        packed_models (ModelSet): The same models packed into 64-bit words, computed on
+        first access without building vectors over Z_2.
+        cache (ArrayCache | None): If given, the packed models are loaded from it when a belief
+        base with the same atoms and integrity constraints was solved before, and stored in
+        it otherwise.
 
     REFERENCES:
     [1] Gabriella Pigozzi. Belief merging and the discursive dilemma: an
@@ -28,10 +50,51 @@ class BeliefBase:
     [2] Christian List. The theory of judgment aggregation: An introductory
             review. Synthese, 187(1):179–207, 2012.
     """
-    def __init__(self, atoms: List[Prop], constraints: List[Sentence]=list()) -> None:
-        self.atoms: List[Prop] = atoms
+    def __init__(self, atoms: List[Atom], constraints: List[Sentence]=list(),
+                 cache: ArrayCache | None=None) -> None:
+        self.atoms: List[Atom] = atoms
+        self.atom_table: AtomTable = AtomTable(atoms)
         self.constraints: Sentence = self.get_constraints(constraints)
-        self.models: List[Interpretation] = self.get_models()
+        self.indexed_constraints: IndexedSentence = self.atom_table.index_sentence(self.constraints)
+        self.cache: ArrayCache | None = cache
+        self._models: List[Interpretation] | None = None
+        self._packed_models: ModelSet | None = None
+
+
+    @property
+    def models(self) -> List[Interpretation]:
+        # Models are only searched for when first needed, then kept.
+        if self._models is None:
+            self._models = self.get_models() if self.cache is None else self.packed_models.to_interpretations()
+        return self._models
+
+
+    @property
+    def packed_models(self) -> ModelSet:
+        if self._packed_models is None:
+            entry = None if self.cache is None else self.cache.get(self.cache_key())
+            if entry is not None:
+                self._packed_models = ModelSet(entry["words"], len(self.atoms))
+            elif self._models is not None:
+                self._packed_models = ModelSet(self._models, len(self.atoms))
+            else:
+                tables = list(self._iter_model_tables())
+                self._packed_models = ModelSet.from_bools(
+                    np.concatenate(tables) if tables else np.zeros((0, len(self.atoms)), dtype=np.bool_)
+                )
+            if entry is None and self.cache is not None:
+                self.cache.put(self.cache_key(), {"words": self._packed_models.words})
+        return self._packed_models
+
+
+    def cache_key(self) -> str:
+        """
+        :return: The key of the models in a cache, determined by the names of the atoms in
+        order and the integrity constraints referring to atoms by their ids, normalized so
+        that the order of the constraints and of commutative operands does not matter.
+        """
+        return ArrayCache.key("BeliefBase", [AtomTable.name(atom) for atom in self.atoms],
+                              normalize_sentence(self.indexed_constraints))
 
 
     @staticmethod
@@ -56,19 +119,114 @@ class BeliefBase:
         return constraint_sentence
 
 
-    def get_models(self) -> List[Interpretation]:
+    def get_models(self, method: str="auto") -> List[Interpretation]:
         """
         Models are assignments of truth values to the atomic propositions in the belief base
         which render the conjunctive sentence of integrity constraints true.
 
+        :param method: One of "auto", "truth_table", "sat", or "reference"; see iter_models.
         :return: A list of vectors over Z_2 representing rational assignments of truth values
         to the atomic propositions with respect to the integrity constraints.
         """
-        models: List[Interpretation] = list()
+        return list(self.iter_models(method))
+
+
+    def iter_models(self, method: str="auto") -> Iterator[Interpretation]:
+        """
+        Lazily generates the models of the belief base, so that callers needing only some
+        of the models, or streaming them elsewhere, never hold the whole list in memory.
+
+        With method "truth_table", the integrity constraints are compiled into a NumPy
+        program and evaluated on whole chunks of the truth table at once. With method "sat",
+        the models are enumerated by a SAT solver with blocking clauses, so the cost scales
+        with the number of models rather than the number of assignments. With method
+        "reference", each assignment is evaluated separately by evaluate_indexed_sentence. Method
+        "auto" walks the truth table for agendas of at most TRUTH_TABLE_MAX_ATOMS atoms and
+        uses the SAT solver otherwise. Every method generates the models in the order of
+        itertools.product.
+
+        :param method: One of "auto", "truth_table", "sat", or "reference".
+        :return: An iterator over the vectors over Z_2 representing the models.
+        """
+        if method == "auto":
+            method = "truth_table" if len(self.atoms) <= TRUTH_TABLE_MAX_ATOMS else "sat"
+        if method not in ("truth_table", "sat", "reference"):
+            raise ValueError(f"Unknown model enumeration method {method}.")
+        return self._iter_models(method)
+
+
+    def count_models(self) -> int:
+        """
+        Counts the models of the belief base without building them.
 
+        :return: The number of models.
+        """
+        if self._models is not None:
+            return len(self._models)
+        if len(self.atoms) > TRUTH_TABLE_MAX_ATOMS:
+            return sum(1 for _ in enumerate_models(self.atom_table, self.indexed_constraints))
+
+        count: int = 0
+        evaluate = compile_sentence(self.atom_table, self.indexed_constraints)
+        for table in self._truth_table_chunks():
+            count += int(np.count_nonzero(evaluate(table)))
+        return count
+
+
+    def _iter_models(self, method: str) -> Iterator[Interpretation]:
+        if method == "reference":
+            yield from self._iter_models_reference()
+            return
+
+        values = (Z2.ZERO, Z2.ONE)
+        for table in self._iter_model_tables(method):
+            for row in table.tolist():
+                yield [values[value] for value in row]
+
+
+    def _iter_model_tables(self, method: str="auto") -> Iterator[NDArray[np.bool_]]:
+        """
+        Generates the models in blocks of at most TRUTH_TABLE_CHUNK rows of a boolean matrix.
+
+        :param method: One of "auto", "truth_table", or "sat".
+        :return: An iterator over boolean matrices whose rows are models.
+        """
+        if method == "auto":
+            method = "truth_table" if len(self.atoms) <= TRUTH_TABLE_MAX_ATOMS else "sat"
+
+        if method == "sat":
+            block: List[List[bool]] = []
+            for model in enumerate_models(self.atom_table, self.indexed_constraints):
+                block.append(model)
+                if len(block) == TRUTH_TABLE_CHUNK:
+                    yield np.array(block, dtype=np.bool_)
+                    block = []
+            if block:
+                yield np.array(block, dtype=np.bool_).reshape(len(block), len(self.atoms))
+        else:
+            evaluate = compile_sentence(self.atom_table, self.indexed_constraints)
+            for table in self._truth_table_chunks():
+                yield table[evaluate(table)]
+
+
+    def _truth_table_chunks(self) -> Iterator[NDArray[np.bool_]]:
+        """
+        Generates the truth table over the atoms in chunks of TRUTH_TABLE_CHUNK rows.
+        """
+        num_rows: int = 1 << len(self.atoms)
+        for start in range(0, num_rows, TRUTH_TABLE_CHUNK):
+            yield truth_table(len(self.atoms), start, min(start + TRUTH_TABLE_CHUNK, num_rows))
+
+
+    def _iter_models_reference(self) -> Iterator[Interpretation]:
+        """
+        Finds the models by checking every assignment of truth values one at a time
+        with evaluate_indexed_sentence. Kept as a reference for the compiled search.
+
+        :return: An iterator over the models, in the order of itertools.product.
+        """
         # Brute force check every possible assignment of truth values
         for interp in product([Z2(0), Z2(1)], repeat=len(self.atoms)):
             interp_list = list(interp)
-            if not self.constraints or evaluate_sentence(self.atoms, interp_list, self.constraints):
-                models.append(interp_list)
-        return models
+            if evaluate_indexed_sentence(interp_list, self.indexed_constraints):
+                yield interp_list
@@ -1,9 +1,38 @@
-from random import choice
-from typing import List
+import numpy as np
+from typing import Any, Callable, List
 from itertools import product
-from src.jaggdy.utils.utils import hamming_distance
+from collections import Counter
+from numpy.typing import NDArray
 from src.jaggdy.utils.types import Interpretation, Connection
+from src.jaggdy.utils.utils import sample_minimizers
+from src.jaggdy.utils.sparse import build_csr, csr_label_counts
 from src.jaggdy.BeliefBase import BeliefBase
+from src.jaggdy.ModelSet import ModelSet
+
+
+class _ConnectionList(list):
+    """
+    The list of connections of a graph, which tells the graph whenever it is changed in
+    place so that the graph can rebuild its index of the connections.
+    """
+    def __init__(self, connections: List[Connection], changed: Callable[[], None]) -> None:
+        super().__init__(connections)
+        self._changed: Callable[[], None] = changed
+
+
+def _notifying(name: str) -> Callable:
+    method = getattr(list, name)
+    def mutate(self: _ConnectionList, *args: Any) -> Any:
+        result = method(self, *args)
+        self._changed()
+        return result
+    mutate.__name__ = name
+    return mutate
+
+
+for _name in ("append", "extend", "insert", "remove", "pop", "clear", "sort", "reverse",
+              "__setitem__", "__delitem__", "__iadd__", "__imul__"):
+    setattr(_ConnectionList, _name, _notifying(_name))
 
 # TODO: use networkx library to get graphics of each graph
 # TODO: Allow input by integers
@@ -19,10 +48,19 @@ class Graph:
     ATTRIBUTES:
         models (List[Interpretation]): The set of vectors over Z_2 representing rational
         judgments with respect to the integrity constraints of an agenda.
+        model_set (ModelSet): The same models packed into 64-bit words, used for computing
+        Hamming distances.
         connections: List[Connection]: The edges in the graph, representing by ordered
-        tuples from one agent to another.
+        tuples from one agent to another. Changing the list in place, assigning a new
+        list, or calling the methods below all keep the index of the connections current.
         agents: List[Agent]: The beliefs (as represented by models) by each agent in the
         graph. Agents are represented by vertices in the graph.
+        agent_models (NDArray[np.int64]): The index in models of each agent's belief, kept
+        up to date with agents.
+        neighbor_offsets (NDArray[np.int64]), neighbor_indices (NDArray[np.int64]): A compressed
+        sparse row index of the connections; the agents connected to from agent i are
+        neighbor_indices[neighbor_offsets[i]:neighbor_offsets[i + 1]]. The methods that
+        mutate the graph only mark the index as stale, and it is rebuilt on the next read.
 
     REFERENCES:
     [1] Christian List. The theory of judgment aggregation: An introductory
@@ -38,19 +76,125 @@ class Graph:
         self.models: List[Interpretation] = []
         if isinstance(models, BeliefBase):
             self.models = models.models
+            self.model_set: ModelSet = models.packed_models
         else:
             self.models = models
+            self.model_set: ModelSet = ModelSet(models)
 
-        for agent in agents:
-            if agent not in self.models:
-                raise ValueError("Agents must be represented by models.")
-        self.agents: List[Interpretation] = agents
+        self.agents = agents
 
         num_agents: int = len(self.agents)
         for first_agent, second_agent in connections:
             if first_agent >= num_agents or second_agent >= num_agents:
                 raise ValueError("Connections can only be drawn between agents.")
-        self.connections: List[Connection] = connections
+        self.connections = connections
+
+
+    @property
+    def agents(self) -> List[Interpretation]:
+        return self._agents
+
+
+    @agents.setter
+    def agents(self, agents: List[Interpretation]) -> None:
+        # Looking up each agent's model also checks that agents are represented by models
+        self.agent_models: NDArray[np.int64] = self.model_set.indices(agents)
+        self._agents: List[Interpretation] = agents
+        self._neighbor_offsets: NDArray[np.int64] | None = None
+
+
+    @property
+    def connections(self) -> List[Connection]:
+        return self._connections
+
+
+    @connections.setter
+    def connections(self, connections: List[Connection]) -> None:
+        self._connections: List[Connection] = _ConnectionList(connections, self._connections_changed)
+        self._connections_changed()
+
+
+    def _connections_changed(self) -> None:
+        """
+        Marks the membership counts and the index of the connections as stale, to be
+        rebuilt on their next read.
+        """
+        self._connection_counts: Counter[Connection] | None = None
+        self._neighbor_offsets = None
+
+
+    @property
+    def neighbor_offsets(self) -> NDArray[np.int64]:
+        if self._neighbor_offsets is None:
+            self._build_index()
+        return self._neighbor_offsets
+
+
+    @property
+    def neighbor_indices(self) -> NDArray[np.int64]:
+        if self._neighbor_offsets is None:
+            self._build_index()
+        return self._neighbor_indices
+
+
+    def _build_index(self) -> None:
+        """
+        Rebuilds the compressed sparse row index of the connections.
+        """
+        pairs = np.array(self._connections, dtype=np.int64).reshape(len(self._connections), 2)
+        self._neighbor_offsets, self._neighbor_indices = build_csr(pairs[:, 0], pairs[:, 1], len(self.agents))
+
+
+    def neighbors(self, agent: int) -> NDArray[np.int64]:
+        """
+        :param agent: The index of an agent in the graph.
+        :return: The agents connected to from the given agent, once per connection.
+        """
+        return self.neighbor_indices[self.neighbor_offsets[agent]:self.neighbor_offsets[agent + 1]]
+
+
+    def has_connection(self, connection: Connection) -> bool:
+        """
+        :param connection: An ordered pair of agents.
+        :return: Whether the graph contains the edge.
+        """
+        if self._connection_counts is None:
+            self._connection_counts = Counter(self._connections)
+        return self._connection_counts[connection] > 0
+
+
+    def exchangeable_classes(self) -> List[List[int]]:
+        """
+        Partitions the agents into classes of interchangeable agents: agents i and j are in
+        the same class when swapping them maps the connections onto themselves, that is,
+        when they have the same connections to and from every other agent, the same number
+        of connections to themselves, and as many connections from i to j as from j to i.
+        Since the composition of such swaps is again a symmetry of the graph, the dynamics
+        depend only on how many agents of each class hold each model.
+
+        :return: The classes, each a list of agents in increasing order, ordered by their first agent.
+        """
+        num_agents: int = len(self.agents)
+        adjacency = np.zeros((num_agents, num_agents), dtype=np.int64)
+        np.add.at(adjacency, (np.repeat(np.arange(num_agents), np.diff(self.neighbor_offsets)),
+                              self.neighbor_indices), 1)
+
+        # Swaps within a class compose, so comparing with the first agent of each class suffices
+        classes: List[List[int]] = []
+        for agent in range(num_agents):
+            for agent_class in classes:
+                first: int = agent_class[0]
+                others = np.ones(num_agents, dtype=np.bool_)
+                others[[first, agent]] = False
+                if (np.array_equal(adjacency[first, others], adjacency[agent, others])
+                        and np.array_equal(adjacency[others, first], adjacency[others, agent])
+                        and adjacency[first, first] == adjacency[agent, agent]
+                        and adjacency[first, agent] == adjacency[agent, first]):
+                    agent_class.append(agent)
+                    break
+            else:
+                classes.append([agent])
+        return classes
 
 
     def add_agent(self, agent: Interpretation) -> None:
@@ -61,20 +205,27 @@ class Graph:
         :param agent: The interpretation representing the agent's judgment.
         :return: None
         """
-        if agent not in self.models:
-            raise ValueError("Agents must be represented by models.")
-        self.agents.append(agent)
+        model: int = self.model_set.index(agent)
+        self._agents.append(agent)
+        self.agent_models = np.append(self.agent_models, model)
+        self._neighbor_offsets = None
 
 
     def remove_agent(self, agent: int) -> None:
         """
         Mutates the graph in-pace to remove an agent from the graph by its
-        position in the self.agents list attribute.
+        position in the self.agents list attribute. Connections to and from the
+        agent are removed, and connections between later agents are renumbered.
 
         :param agent: The index of the agent to be removed in self.agents
         :return: None
         """
-        self.agents.pop(agent)
+        self._agents.pop(agent)
+        self.agent_models = np.delete(self.agent_models, agent)
+        self.connections = [
+            (first - (first > agent), second - (second > agent))
+            for first, second in self._connections if agent not in (first, second)
+        ]
 
 
     def add_connection(self, connection: Connection) -> None:
@@ -88,7 +239,11 @@ class Graph:
         num_agents: int = len(self.agents)
         if first_agent >= num_agents or second_agent >= num_agents:
             raise ValueError("Connections can only be drawn between agents.")
-        self.connections.append(connection)
+        # Bypass the notification, since the counts can be updated in place
+        list.append(self._connections, connection)
+        if self._connection_counts is not None:
+            self._connection_counts[connection] += 1
+        self._neighbor_offsets = None
 
 
     def remove_connection(self, connection: Connection) -> None:
@@ -98,9 +253,11 @@ class Graph:
         :param connection: The edge to be removed.
         :return: None
         """
-        if connection not in self.connections:
+        if not self.has_connection(connection):
             raise ValueError("Connection to be removed was not found.")
-        self.connections.remove(connection)
+        list.remove(self._connections, connection)
+        self._connection_counts[connection] -= 1
+        self._neighbor_offsets = None
 
 
     def complete_graph(self) -> None:
@@ -113,16 +270,40 @@ class Graph:
         self.connections = [(a, b) for a, b in product(range(num_agents), repeat=2)]
 
 
-    def update(self) -> None:
+    def update(self, rng: np.random.Generator | None=None) -> None:
         """
         Applies the Hamming distance-based rule to update the beliefs of each
         agent in the graph with respect their connections, breaking ties between
         minimizing models randomly. Mutates the graph in-place.
 
+        All agents are updated synchronously in one pass: the candidate costs of every
+        agent are the product of the neighbor model counts (the sparse adjacency matrix
+        times the one-hot agent models) with the table of distances between models.
+
+        :param rng: The random number generator used to break ties; a fresh one by default.
         :return: None
         """
-        self.agents = [choice(self.hamming_distance_rule(i))
-            for i in range(len(self.agents))]
+        if len(self._agents) == 0:
+            return
+        if rng is None:
+            rng = np.random.default_rng()
+
+        choices = sample_minimizers(self.rule_costs(), rng)
+        self.agent_models = choices
+        self._agents = [self.models[i] for i in choices]
+
+
+    def rule_costs(self) -> NDArray[np.int64]:
+        """
+        Computes, for every agent, the total Hamming distance from each model to the
+        beliefs of the agents it is connected to.
+
+        :return: A (agents x models) matrix whose (i, m) entry is the cost of model m for agent i.
+        """
+        counts = csr_label_counts(
+            self.neighbor_offsets, self.neighbor_indices, self.agent_models, len(self.model_set)
+        )
+        return np.matmul(counts, self.model_set.distance_table)
 
 
     def hamming_distance_rule(self, agent: int) -> List[Interpretation]:
@@ -138,25 +319,13 @@ class Graph:
         if agent < 0 or agent >= num_agents:
             raise ValueError("Agent not found in graph.")
 
-        candidates: List[Interpretation] = []
-        current_min = float('inf')
-
-        # Compute the total distance to the relevant agents for each model
-        for candidate in self.models:
-            candidate_distance: int = 0
-
-            # Find connections to the agent in question and add their models' distance
-            for connection in self.connections:
-                (first_agent, second_agent) = connection
-                second_agent_model = self.agents[second_agent]
-                if first_agent == agent:
-                    candidate_distance += hamming_distance(candidate, second_agent_model)
-
-            # Only store the minimizing models
-            if candidate_distance < current_min:
-                candidates = [candidate]
-                current_min = candidate_distance
-            elif candidate_distance == current_min:
-                candidates.append(candidate)
+        # Find connections from the agent in question and the models of those agents
+        neighbor_models: NDArray[np.int64] = self.agent_models[self.neighbors(agent)]
 
-        return candidates
+        # Compute the total distance to the relevant agents for each model, and keep
+        # only the minimizing models
+        candidate_distances = self.model_set.distances(cols=neighbor_models).sum(axis=1)
+        if len(candidate_distances) == 0:
+            return []
+        minimizers = np.flatnonzero(candidate_distances == candidate_distances.min())
+        return [self.models[i] for i in minimizers]
@@ -0,0 +1,297 @@
+import numpy as np
+from itertools import product
+from fractions import Fraction
+from typing import List, Tuple, Dict
+from numpy.typing import NDArray
+from src.jaggdy.utils.types import Interpretation, Matrix, MatrixZ2
+from src.jaggdy.utils.utils import (matrix_to_bits, matrix_to_matrix_z2, unpack_rows,
+                                    compositions, multiset_permutations, multinomial_probability)
+from src.jaggdy.utils.markov import AbsorptionAnalysis, ExactAbsorptionAnalysis
+from src.jaggdy.utils.sparse import csr_label_counts, CSRMatrix
+from src.jaggdy.Graph import Graph
+from src.jaggdy.ModelSet import ModelSet
+
+
+# Number of lumped states whose transitions are computed together.
+LUMPED_STATE_BLOCK: int = 1 << 12
+
+type Counts = Tuple[int, ...]
+
+
+class LumpedMarkovChain:
+    """
+    A Markov chain for the Hamming distance-based aggregation rule on a Graph object whose
+    states record only how many agents of each class of interchangeable agents hold each
+    model. On a complete graph every agent is interchangeable, so the number of states grows
+    polynomially rather than exponentially in the number of agents.
+
+    Agents in a class that hold the same model have the same minimizing models, and each
+    of them adopts one of those models independently and uniformly at random, so the counts
+    they contribute to the next state follow a multinomial distribution.
+
+    With by_belief, the classes are further split by the agents' beliefs in the graph. Agents
+    in such a class are interchangeable in every state reached from the state of the graph,
+    so the probability of each lumped state is shared equally between the per-agent states
+    it stands for, and get_result_by_state can report results by agent.
+
+    With exact, transition probabilities are computed as Fractions, and the absorption
+    analysis is done in exact rational arithmetic, as for an exact MarkovChain.
+
+    ATTRIBUTES:
+        agents (List[Interpretation]): The set of vectors representing rational agents.
+        model_set (ModelSet): The models of the Graph object packed into 64-bit words.
+        classes (List[List[int]]): The classes of interchangeable agents.
+        agent_classes (NDArray[np.int64]): The class of each agent.
+        states (List[NDArray[np.int64]]): Every lumped state, as a (models x classes) matrix
+        whose (m, c) entry is the number of agents in class c holding model m.
+        state_graph_matrix (CSRMatrix): The sparse transition matrix between lumped states.
+        analysis (AbsorptionAnalysis): The absorption analysis of state_graph_matrix; an
+        ExactAbsorptionAnalysis with exact.
+        exact (bool): Whether get_result_by_state returns exact probabilities as Fractions.
+        stationary (CSRMatrix): The stationary matrix computed from state_graph_matrix.
+    """
+    def __init__(self, graph: Graph, by_belief: bool=False, exact: bool=False) -> None:
+        self.exact: bool = exact
+        self.agents: List[Interpretation] = graph.agents
+        self.model_set: ModelSet = graph.model_set
+        self._agent_models: NDArray[np.int64] = graph.agent_models.copy()
+        self._neighbor_offsets: NDArray[np.int64] = graph.neighbor_offsets
+        self._neighbor_indices: NDArray[np.int64] = graph.neighbor_indices
+
+        self.classes: List[List[int]] = graph.exchangeable_classes()
+        if by_belief:
+            self.classes = [
+                [agent for agent in agent_class if self._agent_models[agent] == model]
+                for agent_class in self.classes
+                for model in dict.fromkeys(self._agent_models[agent_class].tolist())
+            ]
+            self.classes.sort(key=lambda agent_class: agent_class[0])
+        self.agent_classes: NDArray[np.int64] = np.zeros(len(self.agents), dtype=np.int64)
+        for i, agent_class in enumerate(self.classes):
+            self.agent_classes[agent_class] = i
+
+        # build states as every way of distributing each class over the models
+        num_models: int = len(self.model_set)
+        class_counts: List[List[Counts]] = [
+            list(compositions(len(agent_class), num_models)) for agent_class in self.classes
+        ]
+        self.states: List[NDArray[np.int64]] = [
+            np.array(combo, dtype=np.int64).reshape(len(self.classes), num_models).T
+            for combo in product(*class_counts)
+        ] if num_models > 0 and self.agents else []
+        self._state_index: Dict[bytes, int] = {
+            state.tobytes(): i for i, state in enumerate(self.states)
+        }
+
+        rows, cols, probs = self._transitions()
+        dim: int = len(self.states)
+        self.state_graph_matrix: CSRMatrix = CSRMatrix.from_triplets(rows, cols, np.array(probs, dtype=np.float64),
+                                                                     (dim, dim))
+        if exact:
+            self.analysis: AbsorptionAnalysis = ExactAbsorptionAnalysis.from_fractions(rows, cols, probs, dim)
+        else:
+            self.analysis: AbsorptionAnalysis = AbsorptionAnalysis(self.state_graph_matrix)
+        self.stationary: CSRMatrix = self.analysis.limit_matrix()
+
+
+    def get_state_counts(self, coord_matrix: MatrixZ2 | None=None) -> NDArray[np.int64]:
+        """
+        :param coord_matrix: A coordinate matrix over Z2 representing a state of the graph;
+        defaults to the state of the Graph object.
+        :return: The lumped state, as a (models x classes) matrix of counts.
+        """
+        num_agents: int = len(self.agents)
+        if coord_matrix is None:
+            agent_models = self._agent_models
+        else:
+            coord = matrix_to_bits(coord_matrix)
+            if coord.ndim != 2 or coord.shape != (len(self.model_set), num_agents):
+                raise ValueError("Coordinate matrices must have same dimensions.")
+            if np.any(coord.sum(axis=0) != 1):
+                raise ValueError("Each agent must hold exactly one model.")
+            agent_models = np.argmax(coord, axis=0)
+
+        counts = np.zeros((len(self.model_set), len(self.classes)), dtype=np.int64)
+        np.add.at(counts, (agent_models, self.agent_classes), 1)
+        return counts
+
+
+    def get_result_by_state(self, coord_matrix: MatrixZ2 | None=None,
+                            by_agent: bool=False) -> List[Tuple[float | Fraction, Matrix | MatrixZ2]]:
+        """
+        For a given coord_matrix representing a state of the graph, returns the possible
+        lumped states that can be achieved after many iterations of the update rule together
+        with the probability of attaining that state.
+
+        :param coord_matrix: coord_matrix representing a possible initial graph state.
+        :param by_agent: If True, report states by agent as MarkovChain.get_result_by_state
+        does. This requires the agents of each class to hold the same model initially, as
+        they do in the state of the graph with by_belief.
+        :return: A list of probabilities of achieving each possible state, together with the
+        lumped state, or with the matrix whose j-th column is the belief of agent j if by_agent.
+        Probabilities are Fractions if the chain is exact.
+        """
+        if not self.states:
+            return []
+        initial = self.get_state_counts(coord_matrix)
+        if by_agent and np.any(np.count_nonzero(initial, axis=0) > 1):
+            raise ValueError("Agents in a class must share a belief to report results by agent.")
+
+        end_states = [(prob if self.exact else float(prob), self.states[i])
+                      for i, prob in zip(*self.analysis.limit_row(self._state_index[initial.tobytes()]))]
+        if not by_agent:
+            return end_states
+
+        # Per-agent states are ordered as in MarkovChain.states
+        expanded: List[Tuple[Tuple[int, ...], float | Fraction]] = []
+        for prob, counts in end_states:
+            expanded += self._expand_result(prob, counts)
+        expanded.sort()
+        return [(prob, self._models_by_agent(agent_models)) for agent_models, prob in expanded]
+
+
+    def get_agent_marginals(self, coord_matrix: MatrixZ2 | None=None) -> NDArray:
+        """
+        For a given coord_matrix representing a state of the graph, computes for each agent
+        the probability of holding each model after many iterations of the update rule, as
+        MarkovChain.get_agent_marginals does. The agents of a class are interchangeable, so
+        each holds a model with the expected share of its class holding that model.
+
+        :param coord_matrix: coord_matrix representing a possible initial graph state, in which
+        the agents of each class hold the same model, as they do in the state of the graph
+        with by_belief.
+        :return: An (agents x models) matrix whose (j, m) entry is the probability that agent j
+        ends up holding the m-th model. Probabilities are Fractions if the chain is exact.
+        """
+        num_models: int = len(self.model_set)
+        if not self.states:
+            return np.zeros((len(self.agents), num_models), dtype=np.object_ if self.exact else np.float64)
+        initial = self.get_state_counts(coord_matrix)
+        if np.any(np.count_nonzero(initial, axis=0) > 1):
+            raise ValueError("Agents in a class must share a belief to report results by agent.")
+
+        cols, probs = self.analysis.limit_row(self._state_index[initial.tobytes()])
+        end_states = np.array([self.states[i] for i in cols.tolist()]).reshape(len(cols), num_models, len(self.classes))
+        if not self.exact:
+            probs = probs.astype(np.float64)
+        class_marginals = (probs[:, np.newaxis, np.newaxis] * end_states).sum(axis=0)
+        class_sizes = np.array([len(agent_class) for agent_class in self.classes], dtype=np.int64)
+        return np.transpose((class_marginals / class_sizes)[:, self.agent_classes])
+
+
+    def _expand_result(self, prob: float | Fraction,
+                       counts: NDArray[np.int64]) -> List[Tuple[Tuple[int, ...], float | Fraction]]:
+        """
+        Shares the probability of a lumped state equally between the assignments of models
+        to agents it stands for.
+
+        :return: Pairs of the model index of each agent and the probability of that state.
+        """
+        class_assignments: List[List[Tuple[int, ...]]] = [
+            list(multiset_permutations(tuple(class_counts.tolist()))) for class_counts in counts.T
+        ]
+
+        num_assignments: int = int(np.prod([len(a) for a in class_assignments]))
+        expanded: List[Tuple[Tuple[int, ...], float | Fraction]] = []
+        for combo in product(*class_assignments):
+            agent_models = [0] * len(self.agents)
+            for agent_class, assignment in zip(self.classes, combo):
+                for agent, model in zip(agent_class, assignment):
+                    agent_models[agent] = model
+            expanded.append((tuple(agent_models), prob / num_assignments))
+        return expanded
+
+
+    def _models_by_agent(self, agent_models: Tuple[int, ...]) -> MatrixZ2:
+        beliefs = unpack_rows(self.model_set.words[list(agent_models)], self.model_set.num_atoms)
+        return matrix_to_matrix_z2(np.transpose(beliefs).astype(np.uint8))
+
+
+    def _representatives(self, states: List[NDArray[np.int64]]) -> NDArray[np.int64]:
+        """
+        :return: For each lumped state, the model index of each agent in one of the
+        per-agent states it stands for, where the agents of each class take models in order.
+        """
+        representatives = np.zeros((len(states), len(self.agents)), dtype=np.int64)
+        models = np.arange(len(self.model_set))
+        for i, state in enumerate(states):
+            for agent_class, class_counts in zip(self.classes, state.T):
+                representatives[i, agent_class] = np.repeat(models, class_counts)
+        return representatives
+
+
+    def _next_counts(self, costs: NDArray[np.int64], state: NDArray[np.int64]) -> Dict[bytes, float | Fraction]:
+        """
+        Computes the distribution of the next lumped state from the costs of every model
+        for the representative agents of a lumped state.
+
+        :param costs: An (agents x models) matrix of the cost of each model for each agent.
+        :param state: The lumped state.
+        :return: The probability of each next lumped state, keyed by its bytes, as a Fraction
+        if the chain is exact.
+        """
+        num_models: int = len(self.model_set)
+        one: float | Fraction = Fraction(1) if self.exact else 1.
+        class_distributions: List[Dict[Counts, float | Fraction]] = []
+        for agent_class, class_counts in zip(self.classes, state.T):
+
+            # Agents of a class holding the same model choose among the same minimizers,
+            # independently of each other; combine the counts of each such group.
+            distribution: Dict[Counts, float | Fraction] = {(0,) * num_models: one}
+            start: int = 0
+            for count in class_counts.tolist():
+                if count == 0:
+                    continue
+                agent_costs = costs[agent_class[start]]
+                minimizers = np.flatnonzero(agent_costs == agent_costs.min())
+                start += count
+
+                group: Dict[Counts, float | Fraction] = {}
+                for split in compositions(count, len(minimizers)):
+                    group_counts = [0] * num_models
+                    for model, model_count in zip(minimizers.tolist(), split):
+                        group_counts[model] = model_count
+                    group[tuple(group_counts)] = multinomial_probability(split, self.exact)
+
+                combined: Dict[Counts, float | Fraction] = {}
+                for first, first_prob in distribution.items():
+                    for second, second_prob in group.items():
+                        key = tuple(a + b for a, b in zip(first, second))
+                        combined[key] = combined.get(key, 0) + first_prob * second_prob
+                distribution = combined
+            class_distributions.append(distribution)
+
+        next_states: Dict[bytes, float | Fraction] = {}
+        for combo in product(*[distribution.items() for distribution in class_distributions]):
+            prob: float | Fraction = one
+            for _, class_prob in combo:
+                prob *= class_prob
+            counts = np.array([class_counts for class_counts, _ in combo], dtype=np.int64).T
+            next_states[counts.tobytes()] = prob
+        return next_states
+
+
+    def _transitions(self) -> Tuple[NDArray[np.int64], NDArray[np.int64], List[float | Fraction]]:
+        """
+        Computes the entries of the Markov transition matrix, where each (i, j) entry represents
+        the probability of attaining the lumped state j from the lumped state i.
+
+        :return: The row, the column, and the probability of each entry.
+        """
+        dim: int = len(self.states)
+        rows: List[int] = []
+        cols: List[int] = []
+        probs: List[float | Fraction] = []
+        table = self.model_set.distance_table
+        for start in range(0, dim, LUMPED_STATE_BLOCK):
+            block = self.states[start:start + LUMPED_STATE_BLOCK]
+            counts = csr_label_counts(self._neighbor_offsets, self._neighbor_indices,
+                                      self._representatives(block), len(self.model_set))
+            costs = np.matmul(counts, table)
+            for i, state in enumerate(block, start):
+                for key, prob in self._next_counts(costs[i - start], state).items():
+                    rows.append(i)
+                    cols.append(self._state_index[key])
+                    probs.append(prob)
+        return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), probs
+
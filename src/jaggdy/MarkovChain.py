@@ -1,18 +1,166 @@
+import os
 import numpy as np
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
 from itertools import product
-from typing import List, Tuple, cast
+from fractions import Fraction
+from typing import Iterable, List, Tuple, Dict
+from numpy.typing import NDArray
 from src.jaggdy.utils.types import Interpretation, Matrix, MatrixZ2
-from src.jaggdy.utils.enums import Z2
-from src.jaggdy.utils.utils import (hamming_distance, matrix_z2_to_matrix,
-                         matrix_to_matrix_z2, find_stationary)
+from src.jaggdy.utils.utils import (matrix_z2_to_matrix, matrix_to_matrix_z2, matrix_to_bits,
+                         pack_rows, packed_hamming_distances, state_code_weights)
+from src.jaggdy.utils.markov import AbsorptionAnalysis, ExactAbsorptionAnalysis
+from src.jaggdy.utils.sparse import CSRMatrix, CSRFileWriter, csr_label_counts
+from multiprocessing.shared_memory import SharedMemory
+from src.jaggdy.utils.cache import ArrayCache
+from src.jaggdy.utils.shared import SharedArraySpec, share_array, create_array, attach_array, keep_array
 from src.jaggdy.Graph import Graph
+from src.jaggdy.ModelSet import ModelSet
+
+
+# Number of states whose transitions are computed together.
+STATE_BLOCK: int = 1 << 12
+
+
+def _minimizer_masks(offsets: NDArray[np.int64], indices: NDArray[np.int64], table: NDArray[np.unsignedinteger],
+                     models: NDArray) -> NDArray[np.bool_]:
+    """
+    Computes the possible judgments of every agent for a block of states at once: the cost
+    of each model for each agent is the number of its neighbors holding each model
+    contracted with the table of distances between models.
+
+    :param offsets: The row offsets of the adjacency in compressed sparse row form.
+    :param indices: The neighbors of each agent, ordered by agent.
+    :param table: The distances between models.
+    :param models: A (states x agents) array of the model indices of the states.
+    :return: A (states x agents x models) array, true where the model minimizes the cost.
+    """
+    # The counts are int64, so the product with the compact table is summed in int64
+    costs = np.matmul(csr_label_counts(offsets, indices, models, len(table)), table)
+    return costs == costs.min(axis=2, keepdims=True)
+
+
+def _successor_codes(masks: NDArray[np.bool_], weights: NDArray) -> Tuple[NDArray[np.int64], NDArray]:
+    """
+    Computes the codes of every state where each agent adopts one of its possible judgments,
+    for a block of states, without building their coordinate matrices. The next states of
+    each state are in the order of MarkovChain._expand_states, that is, of increasing code.
+
+    :param masks: The possible judgments of each agent, such as returned by _minimizer_masks.
+    :param weights: The place value of each agent in the code of a state.
+    :return: The number of possible next states of each state, and the codes of the
+    possible next states of all of them, ordered by state.
+    """
+    num_choices = masks.sum(axis=2)
+    entry_rows = np.arange(len(masks), dtype=np.int64)
+    codes = np.zeros(len(masks), dtype=weights.dtype)
+    for agent, weight in enumerate(weights):
+        # Replace each partial next state by one copy per choice of this agent
+        _, choices = np.nonzero(masks[:, agent, :])
+        choice_starts = np.cumsum(num_choices[:, agent]) - num_choices[:, agent]
+        repeats = num_choices[entry_rows, agent]
+        copy_starts = np.repeat(np.cumsum(repeats) - repeats, repeats)
+        picks = np.repeat(choice_starts[entry_rows], repeats) + np.arange(len(copy_starts)) - copy_starts
+        codes = np.repeat(codes, repeats) + choices[picks].astype(weights.dtype) * weight
+        entry_rows = np.repeat(entry_rows, repeats)
+    return np.prod(num_choices, axis=1, dtype=np.int64), codes
+
+
+def _transition_rows(offsets: NDArray[np.int64], indices: NDArray[np.int64], table: NDArray[np.unsignedinteger],
+                     weights: NDArray, models: NDArray,
+                     state_codes: NDArray | None) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Computes a block of rows of the transition matrix.
+
+    :param models: A (states x agents) array of the model indices of the states.
+    :param state_codes: The sorted codes of every state, or None if every state is present,
+    so that the row of each state is its code.
+    :return: The number of entries of each row, and the columns of the entries of all of them.
+    """
+    lengths, codes = _successor_codes(_minimizer_masks(offsets, indices, table, models), weights)
+    if state_codes is None:
+        return lengths, codes.astype(np.int64)
+    return lengths, np.searchsorted(state_codes, codes).astype(np.int64)
+
+
+def _attach_inputs(specs: List[SharedArraySpec | str]) -> Tuple[List[SharedMemory], List[NDArray]]:
+    """
+    Opens the inputs of a worker process: arrays in shared memory, given by their specs, and
+    arrays stored in .npy files, given by their paths, which are memory-mapped read-only.
+
+    :return: The shared memory blocks attached to, which must be closed once the arrays
+    are released, and the arrays.
+    """
+    memories: List[SharedMemory] = []
+    arrays: List[NDArray] = []
+    for spec in specs:
+        if isinstance(spec, str):
+            arrays.append(np.load(spec, mmap_mode="r"))
+        else:
+            memory, array = attach_array(spec)
+            memories.append(memory)
+            arrays.append(array)
+    return memories, arrays
+
+
+def _shared_transition_lengths(specs: List[SharedArraySpec | str], start: int, stop: int,
+                               lengths_spec: SharedArraySpec) -> None:
+    """
+    Counts the entries of the rows start to stop of the transition matrix in a worker
+    process, reading the adjacency, the distance table, and the states from shared memory
+    or their files, and writes them into the shared lengths. Only the possible judgments of each agent are
+    found, without listing the next states.
+    """
+    memories, arrays = _attach_inputs(specs)
+    lengths_memory, lengths = attach_array(lengths_spec, writeable=True)
+    try:
+        offsets, indices, table, models, _ = arrays
+        masks = _minimizer_masks(offsets, indices, table, models[start:stop])
+        lengths[start:stop] = np.prod(masks.sum(axis=2), axis=1, dtype=np.int64)
+    finally:
+        # The arrays must be released before their shared memory can be closed
+        del arrays, lengths
+        for memory in memories + [lengths_memory]:
+            memory.close()
+
+
+def _shared_transition_rows(specs: List[SharedArraySpec | str], weights: NDArray, by_code: bool, start: int,
+                            stop: int, offset: int, target: SharedArraySpec | str) -> None:
+    """
+    Computes the rows start to stop of the transition matrix in a worker process, reading
+    the adjacency, the distance table, the states, and their codes from shared memory or
+    their files, and writes the columns of their entries at offset into the indices of the matrix.
+
+    :param offset: The position of the first entry of the rows in the indices.
+    :param target: The indices, in shared memory, or the path of the raw int64 file they
+    are written to.
+    """
+    memories, arrays = _attach_inputs(specs)
+    try:
+        offsets, indices, table, models, codes = arrays
+        _, cols = _transition_rows(offsets, indices, table, weights, models[start:stop],
+                                   codes if by_code else None)
+        if isinstance(target, str):
+            out = np.memmap(target, dtype=np.int64, mode="r+", offset=offset * cols.itemsize, shape=cols.shape)
+            out[:] = cols
+            out.flush()
+            del out
+        else:
+            out_memory, out = attach_array(target, writeable=True)
+            out[offset:offset + len(cols)] = cols
+            del out
+            out_memory.close()
+    finally:
+        # The arrays must be released before their shared memory can be closed
+        del arrays
+        for memory in memories:
+            memory.close()
 
 
 # TODO: For experiments, add method to get frequency of all possible end states
 # TODO: get result by state
 # TODO: test get_state_models and get_result_by_state
-# TODO: Pretty printing and by_agent option for get_result_by_state
-# TODO: Do not build states, state_graph_matrix and stationary until necessary
+# TODO: Pretty printing for get_result_by_state
 # TODO: function to get result for single iteration of distance rule?
 # TODO: Docstrings and comments
 # TODO: Move stationary matrix method back to class, check eigenvalues
@@ -27,20 +175,52 @@ class MarkovChain:
 
     ATTRIBUTES:
         agents (List[Interpretation]): The set of vectors representing rational agents.
+        model_set (ModelSet): The models of the Graph object packed into 64-bit words.
         model_matrix (Matrix): A matrix with columns representing all the rational interpretations
         of the agenda with respect to the integrity constraints contained in the Graph object.
         coord_matrix (MatrixZ2): A matrix representing the coordinates of each agents' beliefs in
         the model_matrix.
         adjacency (MatrixZ2): Adjacency matrix for the Graph object-- each 1 entry at (i, j)
         represents a directed edge from agent i to agent j.
-        states (List[MatrixZ2]): Every possible state the graph can take, as represented by coord
-        matrices.
-        state_graph_matrix (Matrix): The transition matrix for the Markov chain. Each entry (i, j)
+        state_models (NDArray): Every possible state the graph can take, as a (states x agents)
+        array of the model index of each agent, in the smallest unsigned integer type that
+        holds every model index. With reachable, only the states reachable from the seed
+        states, in the same relative order.
+        states (List[MatrixZ2]): The states of state_models as coord matrices, built on each
+        access.
+        state_codes (NDArray): The code of each state, the number whose digits in base models
+        are the model index of each agent, with the first agent most significant. States are
+        ordered by code, so in the full chain the row of each state is its code; with
+        reachable, states are looked up by binary search over the codes.
+        state_graph_matrix (CSRMatrix): The transition matrix for the Markov chain. Each entry (i, j)
         represents the probability of moving from state i to state j after a single iteration
-        of the Hamming distance-based aggregation rule.
-        self.stationary (Matrix): The stationary matrix for the Markov chain, computed from
-        state_graph_matrix.
+        of the Hamming distance-based aggregation rule. Stored in compressed sparse row form,
+        since each row only has an entry for each combination of tie-breaks.
+        analysis (AbsorptionAnalysis): The communicating classes of the chain, the stationary
+        distribution of each closed class, and the probabilities of absorption into them.
+        With exact, an ExactAbsorptionAnalysis whose probabilities are Fractions.
+        exact (bool): Whether get_result_by_state returns exact probabilities as Fractions.
+        workers (int): The number of worker processes building state_graph_matrix over all states
+        in blocks of STATE_BLOCK rows; it is built in this process if 1.
+        workdir (str | None): If given, the directory where state_models, state_codes,
+        state_graph_matrix, stationary, and the arrays of analysis with an entry per state
+        are stored as they are built, in files that are then memory-mapped rather than
+        loaded, so that these arrays need not fit in memory. The search for the components of
+        the chain still holds a few integers per state in memory, and the search for reachable
+        states holds every state found. The files of a chain are replaced when it is built again.
+        cache (ArrayCache | None): If given, states, state_graph_matrix, analysis, and
+        stationary are loaded from it when a chain with the same models, adjacency, and seeds
+        was built before, and stored in it otherwise; queries of single rows then read them
+        from a stationary matrix stored before, or else from a stored analysis. An exact
+        analysis holds Fractions, and is never stored.
+        stationary (CSRMatrix): The stationary matrix for the Markov chain, computed from
+        state_graph_matrix by absorption analysis: entry (i, j) is the long-run probability of
+        state j starting from state i, averaged over time for periodic chains.
 
+        model_matrix, coord_matrix, and adjacency are stored as native uint8 arrays, and
+        these attributes return views over Z2 of them. state_models, state_codes,
+        state_graph_matrix, analysis, and stationary are built on first access and cached
+        until invalidate is called, so update_from_state and get_state_models never build them.
 
     REFERENCES:
         [1] Gabriella Pigozzi. Belief merging and the discursive dilemma: an
@@ -53,51 +233,196 @@ class MarkovChain:
                 https://web.stanford.edu/class/cs265/Lectures/Lecture13/l13.pdf
 
     """
-    def __init__(self, graph: Graph) -> None:
+    def __init__(self, graph: Graph, reachable: bool=False, seeds: List[MatrixZ2] | None=None,
+                 exact: bool=False, workers: int=1, workdir: str | None=None,
+                 cache: ArrayCache | None=None) -> None:
+        self.exact: bool = exact
+        self.cache: ArrayCache | None = cache
+        self.workers: int = workers
+        self.workdir: str | None = workdir
+        if workdir is not None:
+            os.makedirs(workdir, exist_ok=True)
         self.agents: List[Interpretation] = graph.agents
-        self.model_matrix: MatrixZ2 = np.transpose(np.array(graph.models))
-
-        # build coord_matrix from the agents and the model_matrix
-        if self.model_matrix.size > 0 and len(self.agents) > 0:
-            rows = len(self.model_matrix[0])
-            cols = len(self.agents)
-            self.coord_matrix: MatrixZ2 = np.empty((rows, cols), dtype=object)
-
-            agent_tuples = [tuple(agent) for agent in self.agents]
-            model_tuples = [tuple(model) for model in np.transpose(self.model_matrix)]
-
-            # if the agent i's belief matches the j-th belief in the model matrix,
-            # then coord_matrix[j, i] = 1, else 0.
-            for i, agent_tuple in enumerate(agent_tuples):
-                for j, model_tuple in enumerate(model_tuples):
-                    if agent_tuple == model_tuple:
-                        self.coord_matrix[j, i] = Z2.ONE
-                    else:
-                        self.coord_matrix[j, i] = Z2.ZERO
+        self.model_set: ModelSet = graph.model_set
+
+        # The matrices are stored internally as native uint8 arrays; the attributes
+        # of the same names are views over Z2 built on access.
+        self._model_matrix: NDArray[np.uint8] = matrix_to_bits(np.transpose(np.array(graph.models)))
+
+        # build coord_matrix from the agents and the model_matrix: if the agent i's belief
+        # matches the j-th belief in the model matrix, then coord_matrix[j, i] = 1, else 0.
+        num_agents: int = len(self.agents)
+        if self._model_matrix.size > 0 and num_agents > 0:
+            self._coord_matrix: NDArray[np.uint8] = np.zeros((len(self.model_set), num_agents), dtype=np.uint8)
+            self._coord_matrix[self.model_set.indices(self.agents), np.arange(num_agents)] = 1
         else:
-            self.coord_matrix: MatrixZ2 = np.array([], dtype=object)
+            self._coord_matrix: NDArray[np.uint8] = np.array([], dtype=np.uint8)
 
         # build adjacency matrix
-        dim: int = len(self.agents)
-        if dim == 0:
-            self.adjacency: MatrixZ2 = np.array([])
+        if num_agents == 0:
+            self._adjacency: NDArray[np.uint8] = np.array([], dtype=np.uint8)
         else:
-            self.adjacency: MatrixZ2 = np.empty((dim, dim), dtype=object)
-            for (i, j) in product(range(dim), repeat=2):
-                if (i, j) in graph.connections:
-                    self.adjacency[i, j] = Z2.ONE
-                else:
-                    self.adjacency[i, j] = Z2.ZERO
-
-        # build states, state_graph_matrix, and stationary
-        # states is computed by finding all the permutations of matrices over
-        # Z2 such that each column has exactly one 1; this is achieved by calling
-        # get_possible states on a matrix of all 1s.
-        self.states: List[MatrixZ2] = self._get_possible_states(
-            np.full(self.coord_matrix.shape, Z2.ONE, dtype=object)
-        )
-        self.state_graph_matrix: Matrix = self._build_state_graph()
-        self.stationary: Matrix = find_stationary(self.state_graph_matrix)
+            self._adjacency: NDArray[np.uint8] = np.zeros((num_agents, num_agents), dtype=np.uint8)
+            sources = np.repeat(np.arange(num_agents), np.diff(graph.neighbor_offsets))
+            self._adjacency[sources, graph.neighbor_indices] = 1
+
+        # The adjacency in compressed sparse row form, with each connection counted once
+        neighbor_agents, self._neighbor_indices = np.nonzero(self._adjacency.reshape(num_agents, num_agents))
+        self._neighbor_offsets: NDArray[np.int64] = np.zeros(num_agents + 1, dtype=np.int64)
+        np.cumsum(np.bincount(neighbor_agents, minlength=num_agents), out=self._neighbor_offsets[1:])
+
+        # states, state_graph_matrix, analysis, and stationary are built on first access
+        self._code_weights: NDArray = state_code_weights(len(self.model_set), num_agents)
+        self._model_dtype: np.dtype = np.min_scalar_type(max(len(self.model_set) - 1, 0))
+        self._seed_models: NDArray | None = None
+        if reachable or seeds is not None:
+            # Only the states reachable from the seeds, by default the state of the graph
+            seed_states = [self._coord_matrix] if seeds is None else [matrix_to_bits(seed) for seed in seeds]
+            if self._coord_matrix.size > 0:
+                for seed in seed_states:
+                    if seed.shape != self._coord_matrix.shape:
+                        raise ValueError("Coordinate matrices must have same dimensions.")
+                    if self._state_code(seed) is None:
+                        raise ValueError("Each agent must hold exactly one model.")
+                self._seed_models = np.array([np.argmax(seed, axis=0) for seed in seed_states],
+                                             dtype=self._model_dtype).reshape(len(seed_states), num_agents)
+            else:
+                self._seed_models = np.zeros((0, 0), dtype=self._model_dtype)
+
+        self._cached_state_models: NDArray | None = None
+        self._cached_state_codes: NDArray | None = None
+        self._cached_successors: List[List[int]] | None = None
+        self._cached_state_graph_matrix: CSRMatrix | None = None
+        self._cached_analysis: AbsorptionAnalysis | None = None
+        self._cached_stationary: CSRMatrix | None = None
+
+
+    def invalidate(self) -> None:
+        """
+        Discards states, state_graph_matrix, analysis, and stationary, so that they are built
+        again on next access, for example after changing exact, or to free their memory.
+        """
+        self._cached_state_models = None
+        self._cached_state_codes = None
+        self._cached_successors = None
+        self._cached_state_graph_matrix = None
+        self._cached_analysis = None
+        self._cached_stationary = None
+
+
+    @property
+    def state_models(self) -> NDArray:
+        if self._cached_state_models is None:
+            self._build_states()
+        return self._cached_state_models
+
+
+    @property
+    def state_codes(self) -> NDArray:
+        if self._cached_state_codes is None:
+            self._build_states()
+        return self._cached_state_codes
+
+
+    @property
+    def state_graph_matrix(self) -> CSRMatrix:
+        if self._cached_state_graph_matrix is None:
+            if self._cached_state_models is None:
+                self._build_states()
+            entry = self._cache_get("state_graph_matrix")
+            if entry is None:
+                self._cached_state_graph_matrix = self._build_state_graph(self._cached_successors)
+                self._cache_put("state_graph_matrix", self._matrix_arrays(self._cached_state_graph_matrix))
+            else:
+                self._cached_state_graph_matrix = self._store_matrix("state_graph_matrix", self._entry_matrix(entry))
+            # The successors found while exploring states are only needed once
+            self._cached_successors = None
+        return self._cached_state_graph_matrix
+
+
+    @property
+    def analysis(self) -> AbsorptionAnalysis:
+        if self._cached_analysis is None:
+            entry = self._cache_get("analysis")
+            if entry is not None:
+                self._cached_analysis = AbsorptionAnalysis.from_arrays(
+                    {name: self._store_analysis_array(name, array) for name, array in entry.items()}
+                )
+                return self._cached_analysis
+            mat = self.state_graph_matrix
+            if self.exact:
+                # Each row has a probability of one over its number of entries
+                self._cached_analysis = ExactAbsorptionAnalysis(
+                    mat.indptr, mat.indices, [1] * mat.nnz, np.diff(mat.indptr).tolist(),
+                    self._new_analysis_array, self._store_analysis_array
+                )
+            else:
+                self._cached_analysis = AbsorptionAnalysis(mat, self._new_analysis_array, self._store_analysis_array)
+            self._cache_put("analysis", self._cached_analysis.arrays())
+        return self._cached_analysis
+
+
+    @property
+    def stationary(self) -> CSRMatrix:
+        if self._cached_stationary is None:
+            entry = self._cache_get("stationary")
+            if entry is None:
+                self._cached_stationary = self._store_matrix("stationary", self.analysis.limit_matrix())
+                self._cache_put("stationary", self._matrix_arrays(self._cached_stationary))
+            else:
+                self._cached_stationary = self._store_matrix("stationary", self._entry_matrix(entry))
+        return self._cached_stationary
+
+
+    def cache_key(self, stage: str) -> str:
+        """
+        :param stage: One of "states", "state_graph_matrix", "analysis", or "stationary".
+        :return: The key of the stage in a cache, determined by the models, the adjacency,
+        the update rule, and the seed states, and for analysis and stationary by exact.
+        """
+        return ArrayCache.key("MarkovChain", stage, "hamming distance rule", self.model_set.words,
+                              self.model_set.num_atoms, self._adjacency, self._seed_models,
+                              self.exact if stage in ("analysis", "stationary") else None)
+
+
+    def _cache_get(self, stage: str) -> Dict[str, NDArray] | None:
+        return None if self.cache is None else self.cache.get(self.cache_key(stage))
+
+
+    def _cache_put(self, stage: str, arrays: Dict[str, NDArray]) -> None:
+        # Codes of Python integers cannot be stored without pickling
+        if self.cache is not None and all(array.dtype != np.object_ for array in arrays.values()):
+            self.cache.put(self.cache_key(stage), arrays)
+
+
+    @staticmethod
+    def _matrix_arrays(matrix: CSRMatrix) -> Dict[str, NDArray]:
+        return {"indptr": matrix.indptr, "indices": matrix.indices, "data": matrix.data}
+
+
+    def _entry_matrix(self, entry: Dict[str, NDArray]) -> CSRMatrix:
+        dim: int = len(self.state_models)
+        return CSRMatrix(entry["indptr"], entry["indices"], entry["data"], (dim, dim))
+
+
+    @property
+    def model_matrix(self) -> MatrixZ2:
+        return matrix_to_matrix_z2(self._model_matrix)
+
+
+    @property
+    def coord_matrix(self) -> MatrixZ2:
+        return matrix_to_matrix_z2(self._coord_matrix)
+
+
+    @property
+    def adjacency(self) -> MatrixZ2:
+        return matrix_to_matrix_z2(self._adjacency)
+
+
+    @property
+    def states(self) -> List[MatrixZ2]:
+        return [matrix_to_matrix_z2(self._models_to_coord(models)) for models in self.state_models]
 
 
     def get_state_models(self, coord_matrix: MatrixZ2 | None=None) -> MatrixZ2:
@@ -107,19 +432,11 @@ class MarkovChain:
         :param coord_matrix: Matrix providing the coordinates of each agent's beliefs in model_matrix
         :return: Matrix where the j-th column represents the belief of the j-th agent.
         """
-        if coord_matrix is None:
-            coord_matrix = self.coord_matrix
-
-        if self.model_matrix.shape == 0 == coord_matrix.shape:
-            return np.array([])
-        elif self.model_matrix.shape[1] != coord_matrix.shape[0]:
-            raise ValueError("Model and coord matrices must be compatible for matrix multiplication.")
-
-        # Models are recovered by multiplication of model and coord matrices.
-        return np.matmul(self.model_matrix, coord_matrix)
+        coord = self._coord_matrix if coord_matrix is None else matrix_to_bits(coord_matrix)
+        return matrix_to_matrix_z2(self._get_state_models(coord))
 
 
-    def get_result_by_state(self, coord_matrix: MatrixZ2 | None=None) -> List[Tuple[float, MatrixZ2]]:
+    def get_result_by_state(self, coord_matrix: MatrixZ2 | None=None) -> List[Tuple[float | Fraction, MatrixZ2]]:
         """
         For a given coord_matrix representing a state of the graph, returns the possible
         states that can be achieved after many iterations of the update rule together with
@@ -128,31 +445,301 @@ class MarkovChain:
         :param coord_matrix: coord_matrix representing a possible initial graph state.
         :return: A list of probabilities of achieving each possible state, together with a matrix
         representing that state, where the j-th column represents the belief of agent j in
-        that state.
+        that state. Probabilities are Fractions if the chain is exact.
         """
-        if coord_matrix is None:
-            coord_matrix = self.coord_matrix
+        coord = self._coord_matrix if coord_matrix is None else matrix_to_bits(coord_matrix)
 
-        # Find all possible states together with their respective probabilities
-        results: List[Tuple[float, MatrixZ2]] = []
-        for i, state in enumerate(self.states):
+        # Look up the row of the stationary matrix for the given coord_matrix by its code
+        row: int | None = self._state_row(coord)
+        if row is None:
+            return []
 
-            # Find the results from the stationary matrix for the given coord_matrix
-            if np.array_equal(coord_matrix, state):
-                end_state_probs = self.stationary[i]
+        # Find all end states with non-zero probability from the initial state
+        results: List[Tuple[float | Fraction, MatrixZ2]] = []
+        for end_state_index, end_state_prob in zip(*self._limit_row(row)):
+            results.append((
+                end_state_prob,
+                matrix_to_matrix_z2(self._model_matrix[:, self.state_models[end_state_index]])
+            ))
+        return results
 
-                # Find all end states with non-zero probability from the initial
-                for end_state_index, end_state_prob in enumerate(end_state_probs):
-                    end_state_prob = cast(float, end_state_prob)
 
-                    # append probability and possible state
-                    if end_state_prob != 0:
-                        results.append((
-                            end_state_prob,
-                            self.get_state_models(self.states[end_state_index])
-                        ))
+    def get_agent_marginals(self, coord_matrix: MatrixZ2 | None=None) -> NDArray:
+        """
+        For a given coord_matrix representing a state of the graph, computes for each agent
+        the probability of holding each model after many iterations of the update rule, by
+        summing the long-run probabilities of the end states without decoding them.
+
+        :param coord_matrix: coord_matrix representing a possible initial graph state.
+        :return: An (agents x models) matrix whose (j, m) entry is the probability that agent j
+        ends up holding the m-th model of model_matrix, or zeros if coord_matrix is not one of
+        the states. Probabilities are Fractions if the chain is exact.
+        """
+        num_agents: int = len(self.agents)
+        marginals = np.zeros((num_agents, len(self.model_set)), dtype=np.object_ if self.exact else np.float64)
+        if self.exact:
+            marginals.fill(Fraction(0))
+        coord = self._coord_matrix if coord_matrix is None else matrix_to_bits(coord_matrix)
+        row: int | None = self._state_row(coord)
+        if row is None:
+            return marginals
+
+        # Each end state adds its probability to the model of each agent in it
+        cols, probs = self._limit_row(row)
+        np.add.at(marginals, (np.tile(np.arange(num_agents), len(cols)), self.state_models[cols].ravel()),
+                  np.repeat(probs, num_agents))
+        return marginals
+
+
+    def get_marginals(self, results: CSRMatrix) -> NDArray[np.float64]:
+        """
+        Computes get_agent_marginals for every initial state of a matrix returned by
+        get_results at once, as the product of results with the sparse indicator of the
+        model of each agent in each state.
+
+        :param results: A matrix returned by get_results.
+        :return: An (initial states x agents x models) array whose (k, j, m) entry is the
+        probability that agent j ends up holding the m-th model starting from the k-th
+        initial state.
+        """
+        num_states: int = len(self.state_models)
+        num_agents, num_models = len(self.agents), len(self.model_set)
+        indicator = CSRMatrix(
+            np.arange(num_states + 1, dtype=np.int64) * num_agents,
+            (np.arange(num_agents) * num_models + self.state_models.astype(np.int64)).ravel(),
+            np.ones(num_states * num_agents),
+            (num_states, num_agents * num_models)
+        )
+        return (results @ indicator).toarray().reshape(results.shape[0], num_agents, num_models)
 
-        return results
+
+    def get_results(self, initial_models: NDArray | None=None) -> CSRMatrix:
+        """
+        For many initial states at once, computes the probability of attaining each state
+        after many iterations of the update rule, without decoding the end states; use
+        get_outcomes, or state_models with the columns of a row, to decode them when needed.
+
+        :param initial_models: An (initial states x agents) array of the model index of each
+        agent in each initial state; defaults to every state in state_models.
+        :return: An (initial states x states) sparse matrix whose k-th row holds the long-run
+        probability of each state in state_models, starting from the k-th initial state.
+        Rows of initial states that are not among the states are empty. Probabilities of
+        exact chains are rounded to floats.
+        """
+        num_states: int = len(self.state_models)
+        if initial_models is None:
+            rows = np.arange(num_states, dtype=np.int64)
+            found = np.ones(num_states, dtype=np.bool_)
+        else:
+            initial_models = np.asarray(initial_models)
+            if initial_models.ndim != 2 or initial_models.shape[1] != len(self.agents):
+                raise ValueError("Initial states must give a model index for each agent.")
+            if np.any(initial_models < 0) or np.any(initial_models >= len(self.model_set)):
+                raise ValueError("Model indices must refer to models of the chain.")
+
+            # Look up the rows of the initial states by code: in the full chain the row of each
+            # state is its code, and otherwise states are ordered by code
+            codes = self._models_code(initial_models)
+            if self._seed_models is None:
+                rows = codes.astype(np.int64)
+                found = rows < num_states
+            else:
+                rows = np.minimum(np.searchsorted(self.state_codes, codes), max(num_states - 1, 0)).astype(np.int64)
+                found = self.state_codes[rows] == codes if num_states > 0 else np.zeros(len(codes), dtype=np.bool_)
+
+        # Read the rows of stationary if it is kept, and compute them from the analysis otherwise
+        stationary = self._stored_stationary()
+        if stationary is not None:
+            limit = stationary.take_rows(rows[found])
+        else:
+            limit = self.analysis.limit_rows(rows[found])
+        if np.all(found):
+            return limit
+
+        # Insert an empty row for each initial state that is not among the states
+        lengths = np.zeros(len(rows), dtype=np.int64)
+        lengths[found] = np.diff(limit.indptr)
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return CSRMatrix(indptr, limit.indices, limit.data, (len(rows), num_states))
+
+
+    def get_outcomes(self, results: CSRMatrix, k: int) -> List[Tuple[float, MatrixZ2]]:
+        """
+        Decodes a row of the matrix returned by get_results.
+
+        :param results: A matrix returned by get_results.
+        :param k: The index of an initial state in the call to get_results.
+        :return: The end states of the k-th initial state as get_result_by_state returns them.
+        """
+        cols, probs = results.row(k)
+        return [(prob, matrix_to_matrix_z2(self._model_matrix[:, self.state_models[col]]))
+                for col, prob in zip(cols.tolist(), probs)]
+
+
+    def _limit_row(self, row: int) -> Tuple[NDArray[np.int64], NDArray]:
+        """
+        :param row: The index of a state.
+        :return: The states with non-zero long-run probability starting from it and those
+        probabilities, read from stationary if it is already built or stored in the cache and
+        the chain is not exact, since stationary holds floats.
+        """
+        stationary = None if self.exact else self._stored_stationary()
+        if stationary is not None:
+            return stationary.row(row)
+        return self.analysis.limit_row(row)
+
+
+    def _stored_stationary(self) -> CSRMatrix | None:
+        """
+        :return: stationary if it is already built or can be loaded from the cache, and None
+        otherwise, so that queries of a few rows do not build the whole matrix.
+        """
+        if self._cached_stationary is None:
+            entry = self._cache_get("stationary")
+            if entry is not None:
+                self._cached_stationary = self._store_matrix("stationary", self._entry_matrix(entry))
+        return self._cached_stationary
+
+
+    def _build_states(self) -> None:
+        """
+        Builds the model indices of the states with their codes, together with the possible
+        next states of each state when they are found on the way.
+        """
+        self._cached_successors = None
+        entry = self._cache_get("states")
+        if entry is not None:
+            self._cached_state_models = self._store_array("state_models", entry["models"])
+            self._cached_state_codes = self._store_array("state_codes", entry["codes"])
+            return
+
+        if self._seed_models is not None:
+            models, self._cached_successors = self._explore_states(self._seed_models)
+            codes = self._models_code(models)
+        elif self._coord_matrix.size == 0:
+            models = np.zeros((0, 0), dtype=self._model_dtype)
+            codes = np.zeros(0, dtype=self._code_weights.dtype)
+        else:
+            # Every assignment of a model to each agent is a state, and the codes of all of
+            # them are exactly the integers below models ** agents; the digits of each code
+            # are the model indices of the agents.
+            num_models, num_agents = self._coord_matrix.shape
+            num_states: int = num_models ** num_agents
+            models = self._new_array("state_models", (num_states, num_agents), self._model_dtype)
+            codes = self._new_array("state_codes", (num_states,), self._code_weights.dtype)
+            for start in range(0, num_states, STATE_BLOCK):
+                block = np.arange(start, min(start + STATE_BLOCK, num_states), dtype=self._code_weights.dtype)
+                codes[start:start + STATE_BLOCK] = block
+                models[start:start + STATE_BLOCK] = block[:, np.newaxis] // self._code_weights[np.newaxis, :] % num_models
+        self._cached_state_models = self._store_array("state_models", models)
+        self._cached_state_codes = self._store_array("state_codes", codes)
+        self._cache_put("states", {"models": self._cached_state_models, "codes": self._cached_state_codes})
+
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.workdir, name)
+
+
+    def _new_array(self, name: str, shape: Tuple[int, ...], dtype: np.dtype) -> NDArray:
+        """
+        :return: An array to be filled and then passed to _store_array; with workdir, it is
+        memory-mapped from a new file, so that it can be written a block at a time, unless
+        it holds Python objects or is empty.
+        """
+        if self.workdir is None or np.dtype(dtype) == np.object_ or 0 in shape:
+            return np.empty(shape, dtype=dtype)
+        return np.lib.format.open_memmap(self._path(f"{name}.npy.tmp"), mode="w+", dtype=dtype, shape=shape)
+
+
+    def _store_array(self, name: str, array: NDArray) -> NDArray:
+        """
+        With workdir, writes an array to the file name.npy in it, unless it already was by
+        _new_array, and memory-maps it back read-only. Arrays of Python integers and empty
+        arrays stay in memory.
+
+        :return: The stored array.
+        """
+        if self.workdir is None or array.dtype == np.object_ or array.size == 0:
+            return array
+        path: str = self._path(f"{name}.npy")
+        if isinstance(array, np.memmap):
+            array.flush()
+        else:
+            with open(f"{path}.tmp", "wb") as file:
+                np.save(file, array)
+        # Replacing the file leaves arrays mapped from the previous one valid
+        os.replace(f"{path}.tmp", path)
+        return np.load(path, mmap_mode="r")
+
+
+    def _store_matrix(self, name: str, matrix: CSRMatrix) -> CSRMatrix:
+        """
+        With workdir, writes a sparse matrix to files in it and memory-maps it back read-only.
+
+        :return: The stored matrix.
+        """
+        if self.workdir is None:
+            return matrix
+        matrix.save(self._path(name))
+        return CSRMatrix.load(self._path(name), matrix.shape[1])
+
+
+    def _new_analysis_array(self, name: str, shape: Tuple[int, ...], dtype: np.dtype) -> NDArray:
+        return self._new_array(f"analysis.{name}", shape, dtype)
+
+
+    def _store_analysis_array(self, name: str, array: NDArray) -> NDArray:
+        return self._store_array(f"analysis.{name}", array)
+
+
+    def _models_code(self, models: NDArray) -> NDArray:
+        """
+        :param models: An array of shape (..., agents) of model indices.
+        :return: The codes of the states.
+        """
+        return np.matmul(models.astype(self._code_weights.dtype), self._code_weights)
+
+
+    def _models_to_coord(self, models: NDArray) -> NDArray[np.uint8]:
+        """
+        :param models: The model index of each agent.
+        :return: The uint8 coordinate matrix of the state.
+        """
+        coord_matrix = np.zeros(self._coord_matrix.shape, dtype=np.uint8)
+        coord_matrix[models, np.arange(len(models))] = 1
+        return coord_matrix
+
+
+    def _state_code(self, coord_matrix: NDArray[np.uint8]) -> int | None:
+        """
+        :param coord_matrix: A uint8 coordinate matrix.
+        :return: The code of the state, or None if coord_matrix does not represent a state.
+        """
+        if coord_matrix.shape != self._coord_matrix.shape or coord_matrix.ndim != 2:
+            return None
+        if np.any(coord_matrix.sum(axis=0) != 1):
+            return None
+        return int(np.dot(np.argmax(coord_matrix, axis=0).astype(self._code_weights.dtype), self._code_weights))
+
+
+    def _state_row(self, coord_matrix: NDArray[np.uint8]) -> int | None:
+        """
+        Looks a state up in constant time for the full chain, where the row of every state
+        is its code, and by binary search over state_codes for chains of reachable states.
+
+        :param coord_matrix: A uint8 coordinate matrix.
+        :return: The index of the state in states, or None if it is not one of them.
+        """
+        code: int | None = self._state_code(coord_matrix)
+        if code is None:
+            return None
+        if self._seed_models is None:
+            return code if code < len(self.state_models) else None
+
+        # States are ordered by code
+        row: int = int(np.searchsorted(self.state_codes, code))
+        return row if row < len(self.state_codes) and self.state_codes[row] == code else None
 
 
     @staticmethod
@@ -171,21 +758,15 @@ class MarkovChain:
 
         # The computation technique mirrors matrix multiplication, so the matrices must be
         # compatible for matrix multiplication.
-        mat1_rows, mat1_cols = mat1.shape
-        mat2_rows, mat2_cols = mat2.shape
-        distance_matrix: Matrix = np.zeros((mat1_rows, mat2_cols))
-        if mat1_cols != mat2_rows:
+        if mat1.shape[1] != mat2.shape[0]:
             raise ValueError("Matrices must be compatible for multiplication to find model distances.")
 
-        # entry (i, j) in the return matrix is the hamming_distance of row i in mat1
-        # and column j in mat2.
-        for i, model1 in enumerate(mat1):
-            for j, model2 in enumerate(np.transpose(mat2)):
-                model1 = cast(Interpretation, model1)
-                model2 = cast(Interpretation, model2)
-                distance_matrix[i, j] = hamming_distance(model1, model2)
-
-        return distance_matrix
+        # entry (i, j) in the return matrix is the hamming distance of row i in mat1
+        # and column j in mat2, computed on the packed rows and columns.
+        return packed_hamming_distances(
+            pack_rows(matrix_z2_to_matrix(mat1).astype(np.bool_)),
+            pack_rows(matrix_z2_to_matrix(np.transpose(mat2)).astype(np.bool_))
+        ).astype(np.float64)
 
 
     def update_from_state(self, coord_matrix: MatrixZ2) -> MatrixZ2:
@@ -199,31 +780,60 @@ class MarkovChain:
         :return: A matrix providing the coordinates of the possible judgments for each agent
         after a single iteration of the Hamming distance based aggregation rule on the coord_matrix.
         """
-        if coord_matrix.size == 0 == self.coord_matrix.size:
-            return np.array([])
-        elif coord_matrix.shape != self.coord_matrix.shape:
+        return matrix_to_matrix_z2(self._update_from_state(matrix_to_bits(coord_matrix)))
+
+
+    def _get_state_models(self, coord_matrix: NDArray[np.uint8]) -> NDArray[np.uint8]:
+        """
+        Native counterpart of get_state_models on uint8 matrices.
+        """
+        if self._model_matrix.size == 0 == coord_matrix.size:
+            return np.array([], dtype=np.uint8)
+        elif self._model_matrix.ndim != 2 or self._model_matrix.shape[1] != coord_matrix.shape[0]:
+            raise ValueError("Model and coord matrices must be compatible for matrix multiplication.")
+
+        # Models are recovered by multiplication of model and coord matrices.
+        return np.matmul(self._model_matrix, coord_matrix) % 2
+
+
+    def _update_from_state(self, coord_matrix: NDArray[np.uint8]) -> NDArray[np.uint8]:
+        """
+        Native counterpart of update_from_state on uint8 matrices.
+        """
+        if coord_matrix.size == 0 == self._coord_matrix.size:
+            return np.array([], dtype=np.uint8)
+        elif coord_matrix.shape != self._coord_matrix.shape:
             raise ValueError("Coordinate matrices must have same dimensions.")
 
-        # Compute the distances from the agents' beliefs to every possible model.
-        distances: Matrix = np.matmul(
-            self.model_distances(
-                np.transpose(self.model_matrix),
-                np.matmul(self.model_matrix, coord_matrix)
-            ),
-            matrix_z2_to_matrix(np.transpose(self.adjacency))
-        )
+        # Compute the distances from the agents' beliefs to every possible model, looking
+        # them up in the distance table when every agent holds exactly one model.
+        if np.all(coord_matrix.sum(axis=0) == 1):
+            return self._update_from_models(np.argmax(coord_matrix, axis=0))
+        beliefs = np.transpose(self._get_state_models(coord_matrix)).astype(np.bool_)
+        return self._next_coord_matrix(packed_hamming_distances(self.model_set.words, pack_rows(beliefs)))
 
-        # Find the minimum distances in each column and replace with 1; these are all
-        # the distances that the agents in that column can possibly adopt
-        min_vals = np.min(distances, axis=0)
-        next_coord_matrix = np.zeros_like(distances)
-        for col in range(distances.shape[1]):
 
-            # Build a matrix indicating if each entry is minimal in its column.
-            min_mask = (distances[:, col] == min_vals[col])
-            next_coord_matrix[:, col] = min_mask.astype(int)
+    def _update_from_models(self, models: NDArray) -> NDArray[np.uint8]:
+        """
+        Counterpart of _update_from_state on the model index of each agent.
+        """
+        return self._next_coord_matrix(self.model_set.distance_table[:, models])
 
-        return matrix_to_matrix_z2(next_coord_matrix)
+
+    def _next_coord_matrix(self, belief_distances: NDArray) -> NDArray[np.uint8]:
+        """
+        :param belief_distances: A (models x agents) matrix of the distance of each model
+        to the belief of each agent.
+        :return: The coordinates of the possible judgments for each agent.
+        """
+        distances: Matrix = np.matmul(
+            belief_distances.astype(np.float64),
+            np.transpose(self._adjacency).astype(np.float64)
+        )
+
+        # Find the minimum distances in each column; these are all the models that
+        # the agents in that column can possibly adopt
+        return (distances == np.min(distances, axis=0)).astype(np.uint8)
 
 
     def _get_possible_states(self, next_coord_matrix: MatrixZ2) -> List[MatrixZ2]:
@@ -239,54 +849,195 @@ class MarkovChain:
         :return: All possible coordinate matrices where each agent adopts exactly one of
         those possible judgments after a single iteration of the Hamming distance based aggregation.
         """
-        if next_coord_matrix.size == 0 == self.coord_matrix.size:
+        return [matrix_to_matrix_z2(state)
+            for state in self._expand_states(matrix_to_bits(next_coord_matrix))]
+
+
+    def _expand_states(self, next_coord_matrix: NDArray[np.uint8]) -> List[NDArray[np.uint8]]:
+        """
+        Native counterpart of _get_possible_states on uint8 matrices.
+        """
+        if next_coord_matrix.size == 0 == self._coord_matrix.size:
             return []
-        if next_coord_matrix.shape != self.coord_matrix.shape:
+        if next_coord_matrix.shape != self._coord_matrix.shape:
             raise ValueError("Coordinate matrices must have same dimensions.")
 
         # Find the indices of all the rows with a 1 entry
-        coord_matrix: Matrix = matrix_z2_to_matrix(next_coord_matrix)
-        ones_positions: List[Matrix] = []
-        for col in range(coord_matrix.shape[1]):
-            rows_with_ones: Matrix = np.where(coord_matrix[:, col] == 1.)[0]
-            ones_positions.append(rows_with_ones)
-
-        # Find all permutations of rows with a 1 entry
-        valid_arrays: List[MatrixZ2] = []
-        for combo in product(*ones_positions):
-            new_arr = np.zeros_like(coord_matrix)
+        ones_positions: List[NDArray[np.intp]] = [np.flatnonzero(column) for column in next_coord_matrix.T]
 
-            # From each permutation, construct the corresponding coord_matrix
-            for col, row in enumerate(combo):
-                new_arr[row, col] = 1.
-            valid_arrays.append(matrix_to_matrix_z2(new_arr))
+        # From each permutation of rows with a 1 entry, construct the corresponding coord_matrix
+        cols = np.arange(next_coord_matrix.shape[1])
+        valid_arrays: List[NDArray[np.uint8]] = []
+        for combo in product(*ones_positions):
+            new_arr = np.zeros_like(next_coord_matrix)
+            new_arr[list(combo), cols] = 1
+            valid_arrays.append(new_arr)
 
         return valid_arrays
 
 
-    def _build_state_graph(self) -> Matrix:
+    def _explore_states(self, seeds: NDArray) -> Tuple[NDArray, List[List[int]]]:
+        """
+        Finds the states reachable from the seed states by a breadth-first search over
+        the possible next states of each state.
+
+        :param seeds: A (seeds x agents) array of the model indices of the initial states.
+        :return: The model indices of the reachable states, ordered as the full list of states
+        would order them, together with the indices of the possible next states of each of them.
+        """
+        if self._coord_matrix.size == 0:
+            return np.zeros((0, 0), dtype=self._model_dtype), []
+
+        states: List[NDArray] = []
+        index: Dict[int, int] = {}
+        queue: deque[int] = deque()
+        for seed, code in zip(seeds, self._models_code(seeds).tolist()):
+            if code not in index:
+                index[code] = len(states)
+                states.append(seed)
+                queue.append(len(states) - 1)
+
+        # Expand the queued states a block at a time
+        num_models, num_agents = self._coord_matrix.shape
+        table = self.model_set.distance_table
+        successors: List[List[int]] = [[] for _ in states]
+        while queue:
+            block: List[int] = [queue.popleft() for _ in range(min(STATE_BLOCK, len(queue)))]
+            lengths, codes = _successor_codes(
+                _minimizer_masks(self._neighbor_offsets, self._neighbor_indices, table,
+                                 np.array([states[i] for i in block])),
+                self._code_weights
+            )
+            next_models = (codes[:, np.newaxis] // self._code_weights[np.newaxis, :] % num_models).astype(self._model_dtype)
+            for i, code, next_state in zip(np.repeat(block, lengths).tolist(), codes.tolist(), next_models):
+                if code not in index:
+                    index[code] = len(states)
+                    states.append(next_state)
+                    successors.append([])
+                    queue.append(len(states) - 1)
+                successors[i].append(index[code])
+
+        # Order the states by code, as _expand_states does
+        codes: List[int] = list(index)
+        order = sorted(range(len(states)), key=lambda i: codes[i])
+        position = np.empty(len(states), dtype=np.int64)
+        position[order] = np.arange(len(states))
+        return (np.array(states, dtype=self._model_dtype)[order],
+                [position[successors[i]].tolist() for i in order])
+
+
+    def _build_state_graph(self, successors: List[List[int]] | None=None) -> CSRMatrix:
         """
         Build the Markov transition matrix where each (i, j) entry
         represents the probability of attaining the state j from the
         state i.
 
+        :param successors: The indices of the possible next states of each state, if already
+        known from _explore_states.
         :return: The Markov transition matrix.
         """
-        dim: int = len(self.states)
-        state_graph_matrix: Matrix = np.zeros((dim, dim))
-        for i, state in enumerate(self.states):
+        dim: int = len(self.state_models)
+        if successors is None and self.workers > 1 and dim > STATE_BLOCK and self._code_weights.dtype != np.object_:
+            return self._build_state_graph_parallel()
 
-            # For each state, find all the possible next states
-            next_states: List[MatrixZ2] = self._get_possible_states(
-                self.update_from_state(state)
+        if successors is not None:
+            blocks = [(np.array([len(next_states) for next_states in successors], dtype=np.int64),
+                       np.array([j for next_states in successors for j in next_states], dtype=np.int64))]
+        else:
+            # For each block of states, find all the possible next states and look up their
+            # rows by code, since states are ordered by code; if every state is present,
+            # the row of each state is its code.
+            table = self.model_set.distance_table
+            state_codes = None if self._seed_models is None else self.state_codes
+            blocks = (
+                _transition_rows(self._neighbor_offsets, self._neighbor_indices, table, self._code_weights,
+                                 self.state_models[start:start + STATE_BLOCK], state_codes)
+                for start in range(0, dim, STATE_BLOCK)
             )
 
-            for j in range(dim):
-                for next_state in next_states:
+        # Any of the possible next states can be attained with equal probability. The next
+        # states of each state are distinct and come in increasing order of code, hence of
+        # row, so they already form the rows of the matrix in compressed sparse row form.
+        if self.workdir is not None:
+            # Stream the rows to disk as they are computed
+            writer = CSRFileWriter(self._path("state_graph_matrix"), dim)
+            for lengths, cols in blocks:
+                writer.append(lengths, cols, np.repeat(1 / lengths, lengths))
+            return writer.close()
 
-                    # Any of the possible next states can be attained with equal probability.
-                    if np.array_equal(self.states[j], next_state):
-                        state_graph_matrix[i, j] = 1 / len(next_states)
+        block_lengths, block_cols = zip(*blocks) if dim > 0 else ((), ())
+        lengths = np.concatenate(block_lengths) if block_lengths else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(block_cols) if block_cols else np.zeros(0, dtype=np.int64)
+        indptr = np.zeros(dim + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return CSRMatrix(indptr, cols, np.repeat(1 / lengths, lengths), (dim, dim))
 
-        return state_graph_matrix
 
+    def _build_state_graph_parallel(self) -> CSRMatrix:
+        """
+        Builds the Markov transition matrix with a pool of worker processes, each computing
+        blocks of rows from the states in shared memory, or with workdir from their files. A
+        first pass counts the entries of every row, which places the entries of each block in
+        the matrix; a second pass then has each worker write the columns of the entries of its
+        blocks in place, into one array in shared memory, or with workdir straight into the
+        file of the matrix.
+
+        :return: The Markov transition matrix.
+        """
+        dim: int = len(self.state_models)
+        arrays = (self._neighbor_offsets, self._neighbor_indices, self.model_set.distance_table,
+                  self.state_models, self.state_codes)
+        blocks = [(start, min(start + STATE_BLOCK, dim)) for start in range(0, dim, STATE_BLOCK)]
+        by_code: bool = self._seed_models is not None
+
+        # The states and codes memory-mapped from workdir are opened by the workers from their files
+        stored = {i: f"{name}.npy" for i, name in [(3, "state_models"), (4, "state_codes")]
+                  if self.workdir is not None and isinstance(arrays[i], np.memmap)}
+        shared = {i: share_array(np.ascontiguousarray(array)) for i, array in enumerate(arrays) if i not in stored}
+        specs = [shared[i][1] if i in shared else self._path(stored[i]) for i in range(len(arrays))]
+        lengths_memory, lengths, lengths_spec = create_array((dim,), np.int64)
+        memories: List[SharedMemory] = [memory for memory, _ in shared.values()] + [lengths_memory]
+        cols = None
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                self._run_all(executor.submit(_shared_transition_lengths, specs, start, stop, lengths_spec)
+                              for start, stop in blocks)
+                indptr = np.zeros(dim + 1, dtype=np.int64)
+                np.cumsum(lengths, out=indptr[1:])
+
+                # Any of the possible next states can be attained with equal probability
+                if self.workdir is not None:
+                    writer = CSRFileWriter(self._path("state_graph_matrix"), dim)
+                    for start, stop in blocks:
+                        writer.reserve(lengths[start:stop], np.repeat(1 / lengths[start:stop], lengths[start:stop]))
+                    target = writer.indices_path
+                else:
+                    cols_memory, cols, target = create_array((int(indptr[-1]),), np.int64)
+                    memories.append(cols_memory)
+                self._run_all(executor.submit(_shared_transition_rows, specs, self._code_weights, by_code,
+                                              start, stop, int(indptr[start]), target) for start, stop in blocks)
+
+            if self.workdir is not None:
+                return writer.close()
+            # The columns stay in shared memory, which the matrix keeps open
+            memories.remove(cols_memory)
+            cols_memory.unlink()
+            return CSRMatrix(indptr, keep_array(cols_memory, cols), np.repeat(1 / lengths, lengths), (dim, dim))
+        finally:
+            # The arrays must be released before their shared memory can be closed
+            lengths = cols = None
+            for memory in memories:
+                memory.close()
+                memory.unlink()
+
+
+    @staticmethod
+    def _run_all(futures: Iterable[Future]) -> None:
+        """
+        Waits for every task, so that none is still writing into shared memory when it is
+        released, and then raises the error of the first that failed, if any.
+        """
+        futures = list(futures)
+        wait(futures)
+        for future in futures:
+            future.result()
@@ -0,0 +1,132 @@
+import numpy as np
+import tempfile
+from typing import List, Dict
+from numpy.typing import NDArray
+from src.jaggdy.utils.types import Interpretation
+from src.jaggdy.utils.utils import (pack_rows, pack_interpretations, unpack_interpretations,
+                                    packed_hamming_distances)
+
+
+# Distance tables larger than this many bytes are kept in a memory-mapped temporary file.
+DISTANCE_TABLE_MEMMAP_BYTES: int = 1 << 28
+# Number of rows of the distance table computed at a time.
+DISTANCE_TABLE_BLOCK: int = 1 << 10
+
+
+class ModelSet:
+    """
+    A bit-packed set of models. Each model is stored as one or more 64-bit words, so that
+    Hamming distances between models reduce to XOR and popcount over whole words.
+
+    ATTRIBUTES:
+        num_atoms (int): The number of atomic propositions in each model.
+        words (NDArray[np.uint64]): A (models x words) matrix where row i packs model i;
+        atom k is bit k % 64 of word k // 64.
+        distance_table (NDArray[np.unsignedinteger]): A read-only (models x models) matrix of
+        the Hamming distances between models, in the smallest unsigned dtype holding num_atoms.
+        Computed on first access, and memory-mapped when larger than DISTANCE_TABLE_MEMMAP_BYTES.
+    """
+    def __init__(self, models: List[Interpretation] | NDArray[np.uint64], num_atoms: int | None=None) -> None:
+        if isinstance(models, np.ndarray):
+            if num_atoms is None:
+                raise ValueError("The number of atoms must be given with packed models.")
+            self.words: NDArray[np.uint64] = models.astype(np.uint64)
+        else:
+            if num_atoms is None:
+                num_atoms = len(models[0]) if models else 0
+            self.words: NDArray[np.uint64] = pack_interpretations(models, num_atoms)
+        self.num_atoms: int = num_atoms
+        self.words.flags.writeable = False
+        self._index: Dict[bytes, int] | None = None
+        self._distance_table: NDArray[np.unsignedinteger] | None = None
+
+
+    @classmethod
+    def from_bools(cls, table: NDArray[np.bool_]) -> 'ModelSet':
+        """
+        :param table: A boolean matrix whose rows are models.
+        :return: The set of models packed from the rows of table.
+        """
+        return cls(pack_rows(table), table.shape[1])
+
+
+    @property
+    def distance_table(self) -> NDArray[np.unsignedinteger]:
+        # The models never change, so the table is computed once and then shared.
+        if self._distance_table is None:
+            self._distance_table = self._build_distance_table()
+        return self._distance_table
+
+
+    def _build_distance_table(self) -> NDArray[np.unsignedinteger]:
+        """
+        Computes the Hamming distances between every pair of models, a block of rows at a time.
+        """
+        num_models: int = len(self)
+        dtype = np.min_scalar_type(self.num_atoms)
+        shape = (num_models, num_models)
+        if num_models * num_models * dtype.itemsize > DISTANCE_TABLE_MEMMAP_BYTES:
+            table = np.memmap(tempfile.TemporaryFile(), dtype=dtype, mode="w+", shape=shape)
+        else:
+            table = np.empty(shape, dtype=dtype)
+
+        for start in range(0, num_models, DISTANCE_TABLE_BLOCK):
+            stop = min(start + DISTANCE_TABLE_BLOCK, num_models)
+            table[start:stop] = packed_hamming_distances(self.words[start:stop], self.words)
+        table.flags.writeable = False
+        return table
+
+
+    def __len__(self) -> int:
+        return self.words.shape[0]
+
+
+    def to_interpretations(self) -> List[Interpretation]:
+        """
+        :return: The models as vectors over Z2.
+        """
+        return unpack_interpretations(self.words, self.num_atoms)
+
+
+    def index(self, model: Interpretation) -> int:
+        """
+        Finds the position of a model in the set.
+
+        :param model: A vector over Z2.
+        :return: The index of the first row equal to model.
+        """
+        if self._index is None:
+            self._index = {}
+            for i, row in enumerate(self.words):
+                self._index.setdefault(row.tobytes(), i)
+
+        if len(model) != self.num_atoms:
+            raise ValueError("Agents must be represented by models.")
+        key = pack_interpretations([model], self.num_atoms)[0].tobytes()
+        if key not in self._index:
+            raise ValueError("Agents must be represented by models.")
+        return self._index[key]
+
+
+    def indices(self, models: List[Interpretation]) -> NDArray[np.int64]:
+        """
+        :param models: Vectors over Z2, each of which is in the set.
+        :return: The index of each model in the set.
+        """
+        return np.array([self.index(model) for model in models], dtype=np.int64)
+
+
+    def distances(self, rows: NDArray[np.int64] | None=None, cols: NDArray[np.int64] | None=None) -> NDArray[np.int64]:
+        """
+        Looks up Hamming distances between models in the set from the distance table.
+
+        :param rows: Indices of the models for the rows; defaults to every model.
+        :param cols: Indices of the models for the columns; defaults to every model.
+        :return: A matrix whose (i, j) entry is the distance between models rows[i] and cols[j].
+        """
+        table = self.distance_table
+        if rows is not None:
+            table = table[rows]
+        if cols is not None:
+            table = table[:, cols]
+        return table.astype(np.int64)
@@ -0,0 +1,328 @@
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+from numpy.typing import NDArray
+from src.jaggdy.utils.types import Interpretation, MatrixZ2
+from src.jaggdy.utils.utils import matrix_to_bits, matrix_to_matrix_z2, sample_minimizers, unpack_rows
+from src.jaggdy.utils.sparse import csr_label_counts
+from src.jaggdy.utils.shared import SharedArraySpec, share_array, attach_array
+from src.jaggdy.Graph import Graph
+from src.jaggdy.ModelSet import ModelSet
+
+
+# Number of replicas advanced together; each block draws from its own random stream.
+MONTE_CARLO_BLOCK: int = 1 << 10
+
+
+def _block_rng(seed: int, block: int) -> np.random.Generator:
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+
+
+def _step(offsets: NDArray[np.int64], indices: NDArray[np.int64], table: NDArray[np.unsignedinteger],
+          states: NDArray[np.int64], rng: np.random.Generator) -> NDArray[np.int64]:
+    counts = csr_label_counts(offsets, indices, states, table.shape[0])
+    costs = np.matmul(counts, table)
+    return sample_minimizers(costs, rng)
+
+
+def _observation_window(steps: int, window: int | None) -> int:
+    """
+    :return: The number of final iterations among which each trajectory is observed; by
+    default the second half of the trajectory.
+    """
+    if window is None:
+        return max(steps // 2, 1)
+    if window < 1 or window > steps + 1:
+        raise ValueError("The window must contain between 1 and steps + 1 iterations.")
+    return window
+
+
+def _run_block(offsets: NDArray[np.int64], indices: NDArray[np.int64], table: NDArray[np.unsignedinteger],
+               initial: NDArray[np.int64], seed: int, block: int, replicas: int, steps: int,
+               window: int) -> NDArray[np.int64]:
+    rng = _block_rng(seed, block)
+    states = np.tile(initial, (replicas, 1))
+    if window == 1:
+        for _ in range(steps):
+            states = _step(offsets, indices, table, states, rng)
+        return states
+
+    # Each replica is observed at its own step, drawn uniformly from the window, so that
+    # on periodic chains the observations follow the time average over the window
+    stops = steps - window + 1 + rng.integers(window, size=replicas)
+    observed = np.empty_like(states)
+    for step in range(steps + 1):
+        if step > 0:
+            states = _step(offsets, indices, table, states, rng)
+        stopped = stops == step
+        observed[stopped] = states[stopped]
+    return observed
+
+
+def _count_block(offsets: NDArray[np.int64], indices: NDArray[np.int64], table: NDArray[np.unsignedinteger],
+                 initial: NDArray[np.int64], seed: int, block: int, replicas: int, steps: int,
+                 window: int) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    observed = _run_block(offsets, indices, table, initial, seed, block, replicas, steps, window)
+    return np.unique(observed, axis=0, return_counts=True)
+
+
+def _count_shared_block(specs: List[SharedArraySpec], initial: NDArray[np.int64], seed: int, block: int,
+                        replicas: int, steps: int, window: int) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Runs one block of replicas in a worker process, reading the connection index and the
+    distance table from shared memory, and returns the histogram of its observed states.
+    """
+    memories, arrays = zip(*[attach_array(spec) for spec in specs])
+    try:
+        return _count_block(*arrays, initial, seed, block, replicas, steps, window)
+    finally:
+        # The arrays must be released before their shared memory can be closed
+        del arrays
+        for memory in memories:
+            memory.close()
+
+
+class MonteCarlo:
+    """
+    Estimates the outcome distribution of the Hamming distance-based aggregation rule on a
+    Graph object by simulating many independent trajectories at once, for graphs whose
+    state space is too large for a MarkovChain object.
+
+    The state of every replica is a row of model indices, one per agent, so a batch of
+    replicas is a (replicas x agents) integer array. Replicas are advanced in blocks of
+    MONTE_CARLO_BLOCK, and block b draws its tie-breaks from a random stream derived from
+    the seed and b alone, so results for a given seed do not depend on how blocks are run.
+    Blocks may be spread over a pool of worker processes, which read the connection index
+    and the distance table from shared memory and report histograms of observed states.
+
+    Like MarkovChain.stationary, the estimates are long-run time averages: each trajectory
+    is observed at a step drawn uniformly from its last window iterations, so on a chain
+    that cycles between states every state of the cycle is counted in proportion to the
+    time spent in it. For a cycle of period d, the estimate is off by at most d / window.
+
+    ATTRIBUTES:
+        agents (List[Interpretation]): The beliefs of the agents in the initial state.
+        model_set (ModelSet): The models of the Graph object packed into 64-bit words.
+        agent_models (NDArray[np.int64]): The index of each agent's initial belief in models.
+        neighbor_offsets (NDArray[np.int64]), neighbor_indices (NDArray[np.int64]): The
+        compressed sparse row index of the connections of the Graph object.
+        seed (int): The entropy from which the random stream of every block is derived.
+    """
+    def __init__(self, graph: Graph, seed: int | None=None) -> None:
+        self.agents: List[Interpretation] = graph.agents
+        self.model_set: ModelSet = graph.model_set
+        self.agent_models: NDArray[np.int64] = graph.agent_models.copy()
+        self.neighbor_offsets: NDArray[np.int64] = graph.neighbor_offsets
+        self.neighbor_indices: NDArray[np.int64] = graph.neighbor_indices
+
+        # Without a seed, fresh entropy is drawn once and kept, so runs can be repeated.
+        self.seed: int = int(np.random.SeedSequence().entropy) if seed is None else seed
+
+
+    def block_rng(self, block: int) -> np.random.Generator:
+        """
+        :param block: The index of a block of replicas.
+        :return: The random number generator of the block.
+        """
+        return _block_rng(self.seed, block)
+
+
+    def get_initial_state(self, coord_matrix: MatrixZ2 | None=None) -> NDArray[np.int64]:
+        """
+        :param coord_matrix: A coordinate matrix over Z2 representing a state of the graph;
+        defaults to the state of the Graph object.
+        :return: The index of each agent's belief in models.
+        """
+        if coord_matrix is None:
+            return self.agent_models.copy()
+
+        coord = matrix_to_bits(coord_matrix)
+        if coord.ndim != 2 or coord.shape != (len(self.model_set), len(self.agents)):
+            raise ValueError("Coordinate matrices must have same dimensions.")
+        if np.any(coord.sum(axis=0) != 1):
+            raise ValueError("Each agent must hold exactly one model.")
+        return np.argmax(coord, axis=0).astype(np.int64)
+
+
+    def step(self, states: NDArray[np.int64], rng: np.random.Generator) -> NDArray[np.int64]:
+        """
+        Applies one iteration of the Hamming distance-based rule to every replica, breaking
+        ties between minimizing models uniformly at random.
+
+        :param states: A (replicas x agents) array of model indices.
+        :param rng: The random number generator used to break ties.
+        :return: The (replicas x agents) array of model indices after the iteration.
+        """
+        return _step(self.neighbor_offsets, self.neighbor_indices,
+                     self.model_set.distance_table, states, rng)
+
+
+    def simulate(self, replicas: int, steps: int, coord_matrix: MatrixZ2 | None=None,
+                 window: int | None=None) -> NDArray[np.int64]:
+        """
+        Runs independent trajectories of the Hamming distance-based rule from one initial state.
+
+        :param replicas: The number of trajectories.
+        :param steps: The number of iterations of the rule in each trajectory.
+        :param coord_matrix: A coordinate matrix over Z2 representing the initial state;
+        defaults to the state of the Graph object.
+        :param window: The number of final iterations among which each trajectory is observed
+        at a uniformly random step; defaults to half of steps. With 1, the state after steps
+        iterations is observed.
+        :return: A (replicas x agents) array of the model indices in each observed state.
+        """
+        initial = self.get_initial_state(coord_matrix)
+        window = _observation_window(steps, window)
+        observed = np.empty((replicas, len(initial)), dtype=np.int64)
+        if len(initial) == 0:
+            return observed
+
+        for block, start in enumerate(range(0, replicas, MONTE_CARLO_BLOCK)):
+            stop = min(start + MONTE_CARLO_BLOCK, replicas)
+            observed[start:stop] = self.simulate_block(block, stop - start, steps, initial, window)
+        return observed
+
+
+    def count_outcomes(self, replicas: int, steps: int, coord_matrix: MatrixZ2 | None=None,
+                       workers: int=1, window: int | None=None) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+        """
+        Runs independent trajectories of the Hamming distance-based rule from one initial state
+        and counts how often each observed state occurs, merging the histogram of each block of
+        replicas as it finishes. The counts for a given seed do not depend on workers.
+
+        :param replicas: The number of trajectories.
+        :param steps: The number of iterations of the rule in each trajectory.
+        :param coord_matrix: A coordinate matrix over Z2 representing the initial state;
+        defaults to the state of the Graph object.
+        :param workers: The number of worker processes; blocks are run in this process if 1.
+        :param window: The number of final iterations among which each trajectory is observed,
+        as in simulate.
+        :return: The distinct observed states as rows of model indices, in lexicographic order,
+        and the number of trajectories observed in each.
+        """
+        initial = self.get_initial_state(coord_matrix)
+        window = _observation_window(steps, window)
+        if len(initial) == 0 or replicas == 0:
+            return np.empty((0, len(initial)), dtype=np.int64), np.empty(0, dtype=np.int64)
+        blocks = [(block, min(MONTE_CARLO_BLOCK, replicas - start))
+                  for block, start in enumerate(range(0, replicas, MONTE_CARLO_BLOCK))]
+        arrays = (self.neighbor_offsets, self.neighbor_indices, self.model_set.distance_table)
+
+        histogram: Counter[Tuple[int, ...]] = Counter()
+        if workers <= 1:
+            for block, size in blocks:
+                for state, count in zip(*_count_block(*arrays, initial, self.seed, block, size, steps, window)):
+                    histogram[tuple(state.tolist())] += int(count)
+        else:
+            shared = [share_array(np.ascontiguousarray(array)) for array in arrays]
+            try:
+                specs = [spec for _, spec in shared]
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(_count_shared_block, specs, initial, self.seed, block, size, steps,
+                                               window)
+                               for block, size in blocks]
+                    for future in as_completed(futures):
+                        for state, count in zip(*future.result()):
+                            histogram[tuple(state.tolist())] += int(count)
+            finally:
+                for memory, _ in shared:
+                    memory.close()
+                    memory.unlink()
+
+        states = sorted(histogram)
+        return (np.array(states, dtype=np.int64).reshape(len(states), len(initial)),
+                np.array([histogram[state] for state in states], dtype=np.int64))
+
+
+    def simulate_block(self, block: int, replicas: int, steps: int, initial: NDArray[np.int64],
+                       window: int | None=None) -> NDArray[np.int64]:
+        """
+        Runs the trajectories of one block of replicas with the random stream of the block.
+
+        :param block: The index of the block.
+        :param replicas: The number of trajectories in the block.
+        :param steps: The number of iterations of the rule in each trajectory.
+        :param initial: The model index of each agent in the initial state.
+        :param window: The number of final iterations among which each trajectory is observed,
+        as in simulate.
+        :return: A (replicas x agents) array of the model indices in each observed state.
+        """
+        return _run_block(self.neighbor_offsets, self.neighbor_indices, self.model_set.distance_table,
+                          initial, self.seed, block, replicas, steps, _observation_window(steps, window))
+
+
+    def get_result_by_state(self, coord_matrix: MatrixZ2 | None=None, replicas: int=10_000, steps: int=100,
+                            workers: int=1, window: int | None=None) -> List[Tuple[float, float, MatrixZ2]]:
+        """
+        Estimates the long-run time-averaged distribution over the states of the graph, as
+        MarkovChain.get_result_by_state computes it exactly, from the frequency of each
+        observed state over independent trajectories.
+
+        :param coord_matrix: coord_matrix representing a possible initial graph state.
+        :param replicas: The number of trajectories.
+        :param steps: The number of iterations of the rule in each trajectory.
+        :param workers: The number of worker processes simulating the trajectories.
+        :param window: The number of final iterations among which each trajectory is observed,
+        as in simulate.
+        :return: A list of empirical probabilities of achieving each observed state, their
+        standard errors, and a matrix representing that state, where the j-th column represents
+        the belief of agent j in that state. States are ordered as in MarkovChain.states.
+        """
+        unique_states, counts = self.count_outcomes(replicas, steps, coord_matrix, workers, window)
+        return self._results(unique_states, counts, replicas)
+
+
+    def get_agent_marginals(self, coord_matrix: MatrixZ2 | None=None, replicas: int=10_000, steps: int=100,
+                            workers: int=1, window: int | None=None) -> Tuple[NDArray[np.float64], NDArray[np.float64]]:
+        """
+        Estimates for each agent the long-run time-averaged probability of holding each model,
+        as MarkovChain.get_agent_marginals computes it exactly, from the histogram of observed
+        states over independent trajectories.
+
+        :param coord_matrix: coord_matrix representing a possible initial graph state.
+        :param replicas: The number of trajectories.
+        :param steps: The number of iterations of the rule in each trajectory.
+        :param workers: The number of worker processes simulating the trajectories.
+        :param window: The number of final iterations among which each trajectory is observed,
+        as in simulate.
+        :return: An (agents x models) matrix whose (j, m) entry is the fraction of trajectories
+        in which agent j is observed holding the m-th model, and the matrix of their standard errors.
+        """
+        unique_states, counts = self.count_outcomes(replicas, steps, coord_matrix, workers, window)
+        num_agents: int = len(self.agents)
+        marginals = np.zeros((num_agents, len(self.model_set)), dtype=np.float64)
+        np.add.at(marginals, (np.tile(np.arange(num_agents), len(unique_states)), unique_states.ravel()),
+                  np.repeat(counts, num_agents))
+        if replicas > 0:
+            marginals /= replicas
+        return marginals, np.sqrt(marginals * (1 - marginals) / max(replicas, 1))
+
+
+    def summarize(self, final: NDArray[np.int64]) -> List[Tuple[float, float, MatrixZ2]]:
+        """
+        :param final: A (replicas x agents) array of the model indices in each observed state.
+        :return: The empirical probability of each distinct observed state, its standard error,
+        and the matrix over Z2 whose j-th column is the belief of agent j in that state.
+        """
+        if final.size == 0:
+            return []
+        unique_states, counts = np.unique(final, axis=0, return_counts=True)
+        return self._results(unique_states, counts, final.shape[0])
+
+
+    def _results(self, unique_states: NDArray[np.int64], counts: NDArray[np.int64],
+                 replicas: int) -> List[Tuple[float, float, MatrixZ2]]:
+        """
+        Converts counts of distinct observed states into probabilities with standard errors.
+        """
+        model_bits = unpack_rows(self.model_set.words, self.model_set.num_atoms)
+        probs = counts / replicas
+        stderrs = np.sqrt(probs * (1 - probs) / replicas)
+
+        results: List[Tuple[float, float, MatrixZ2]] = []
+        for state, prob, stderr in zip(unique_states, probs, stderrs):
+            # Agents' beliefs are the columns of the state matrix, as in MarkovChain
+            beliefs = np.transpose(model_bits[state]).astype(np.uint8)
+            results.append((float(prob), float(stderr), matrix_to_matrix_z2(beliefs)))
+        return results
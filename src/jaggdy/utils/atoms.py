@@ -0,0 +1,99 @@
+from typing import List, Dict, Iterator, Sequence
+from src.jaggdy.utils.types import Atom, IndexedSentence
+from src.jaggdy.utils.enums import Prop, Logic
+
+
+class AtomTable:
+    """
+    Maps the atomic propositions of an agenda to dense integer ids, so that sentences
+    can refer to atoms by their position in an interpretation. Atoms are either members
+    of the Prop enum or arbitrary names; a Prop and its string value are the same atom,
+    so agendas are not limited to the eleven members of Prop.
+
+    ATTRIBUTES:
+        atoms (List[Atom]): The atoms in the agenda, in order of their ids.
+    """
+    def __init__(self, atoms: Sequence[Atom]=()) -> None:
+        self.atoms: List[Atom] = []
+        self._ids: Dict[str, int] = {}
+        for atom in atoms:
+            self.add(atom)
+
+
+    @staticmethod
+    def name(atom: Atom) -> str:
+        """
+        :param atom: An atomic proposition.
+        :return: The name identifying the atom in the table.
+        """
+        return atom.value if isinstance(atom, Prop) else atom
+
+
+    def add(self, atom: Atom) -> int:
+        """
+        Mutates the table in-place to add a new atom with the next free id.
+
+        :param atom: The atom to be added.
+        :return: The id of the new atom.
+        """
+        if not isinstance(atom, (Prop, str)):
+            raise ValueError("Atoms must be of type Prop or str.")
+        name = self.name(atom)
+        if name in self._ids:
+            raise ValueError("Atoms in the agenda must be distinct.")
+        self._ids[name] = len(self.atoms)
+        self.atoms.append(atom)
+        return self._ids[name]
+
+
+    def index(self, atom: Atom) -> int:
+        """
+        :param atom: An atom in the table.
+        :return: The id of the atom.
+        """
+        try:
+            return self._ids[self.name(atom)]
+        except (KeyError, TypeError):
+            raise ValueError("Sentence contains an atom not in the agenda.")
+
+
+    def index_sentence(self, sentence: Sequence[Logic | Atom | int]) -> IndexedSentence:
+        """
+        Translates a sentence in Polish notation into one referring to atoms by id. Symbols
+        may be Logic members, atoms, ids, or strings naming either an atom or a connective.
+
+        :param sentence: The propositional sentence in Polish notation.
+        :return: The same sentence with every atom replaced by its id.
+        """
+        indexed: IndexedSentence = []
+        for symbol in sentence:
+            if isinstance(symbol, Logic):
+                indexed.append(symbol)
+            elif isinstance(symbol, int):
+                if symbol < 0 or symbol >= len(self.atoms):
+                    raise ValueError("Sentence contains an atom not in the agenda.")
+                indexed.append(symbol)
+            elif isinstance(symbol, str) and symbol not in self._ids:
+                try:
+                    indexed.append(Logic(symbol))
+                except ValueError:
+                    raise ValueError("Symbol is neither a valid atom nor Logic.")
+            else:
+                indexed.append(self.index(symbol))
+        return indexed
+
+
+    def __len__(self) -> int:
+        return len(self.atoms)
+
+
+    def __iter__(self) -> Iterator[Atom]:
+        return iter(self.atoms)
+
+
+    def __contains__(self, atom: object) -> bool:
+        return isinstance(atom, (Prop, str)) and self.name(atom) in self._ids
+
+
+    def __getitem__(self, index: int) -> Atom:
+        return self.atoms[index]
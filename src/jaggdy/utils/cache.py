@@ -0,0 +1,173 @@
+import os
+import hashlib
+import tempfile
+import zipfile
+import contextlib
+import numpy as np
+from enum import Enum
+from typing import Any, Dict, List, Tuple
+from numpy.typing import NDArray
+
+
+# Default bound on the total size of the files in a cache.
+CACHE_MAX_BYTES: int = 1 << 30
+
+
+def _update_digest(digest: Any, part: Any) -> None:
+    """
+    Feeds a canonical encoding of part into digest: every value is tagged with its kind,
+    and arrays with their dtype and shape, so that distinct inputs never share an encoding.
+    """
+    if part is None:
+        digest.update(b"N")
+    elif isinstance(part, Enum):
+        digest.update(f"E{type(part).__name__}.{part.name};".encode())
+    elif isinstance(part, (bool, int, str, bytes)):
+        encoded = part if isinstance(part, bytes) else repr(part).encode()
+        digest.update(f"{type(part).__name__}{len(encoded)};".encode() + encoded)
+    elif isinstance(part, np.ndarray):
+        if part.dtype == np.object_:
+            _update_digest(digest, part.tolist())
+            return
+        digest.update(f"A{part.dtype.str}{part.shape};".encode())
+        digest.update(np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, (list, tuple)):
+        digest.update(f"L{len(part)};".encode())
+        for item in part:
+            _update_digest(digest, item)
+    else:
+        raise ValueError(f"Cannot hash values of type {type(part).__name__}.")
+
+
+class ArrayCache:
+    """
+    A persistent cache of NumPy arrays in a directory, so that results computed from the
+    same inputs are loaded rather than recomputed. Each entry is a set of named arrays
+    stored in one .npz file named after the SHA-256 hash of the inputs it was computed
+    from. When the files exceed max_bytes, the least recently used entries are evicted;
+    using an entry refreshes its modification time.
+
+    ATTRIBUTES:
+        directory (str): The directory holding the entries.
+        max_bytes (int): The bound on the total size of the entries.
+        hits (int): The number of lookups that found their entry.
+        misses (int): The number of lookups that did not.
+    """
+    def __init__(self, directory: str, max_bytes: int=CACHE_MAX_BYTES) -> None:
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """
+        :param parts: The inputs of a computation: None, enum members, booleans, integers,
+        strings, bytes, NumPy arrays, or lists and tuples of them.
+        :return: The hexadecimal SHA-256 hash of the canonical encoding of the inputs.
+        """
+        digest = hashlib.sha256()
+        _update_digest(digest, parts)
+        return digest.hexdigest()
+
+
+    def get(self, key: str) -> Dict[str, NDArray] | None:
+        """
+        :param key: The key of an entry, as returned by key.
+        :return: The arrays of the entry, or None if there is no such entry or it cannot be read.
+        """
+        path: str = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            os.utime(path)
+        except FileNotFoundError:
+            # Also raised when another process evicts the entry while it is being read
+            self.misses += 1
+            return None
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            # A truncated or corrupt entry is dropped, to be replaced by the next put
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays
+
+
+    def put(self, key: str, arrays: Dict[str, NDArray]) -> None:
+        """
+        Stores the arrays of an entry, replacing any previous entry with the same key, then
+        evicts the least recently used entries until the cache fits in max_bytes.
+
+        :param key: The key of the entry, as returned by key.
+        :param arrays: The arrays to store, by name.
+        """
+        path: str = self._path(key)
+        # The entry only appears once it is complete, so readers never see partial files,
+        # and each writer has its own temporary file
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(temporary, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporary)
+            raise
+        self._evict(keep=path)
+
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: The numbers of hits and misses so far, and the number and total size of
+        the entries.
+        """
+        entries = self._entries()
+        return {"hits": self.hits, "misses": self.misses, "entries": len(entries),
+                "bytes": sum(size for _, _, size in entries)}
+
+
+    def clear(self) -> None:
+        """
+        Deletes every entry.
+        """
+        for path, _, _ in self._entries():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+
+    def _entries(self) -> List[Tuple[str, float, int]]:
+        """
+        :return: The path, modification time, and size of each entry.
+        """
+        entries: List[Tuple[str, float, int]] = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                # Another process may evict the entry in the meantime
+                with contextlib.suppress(FileNotFoundError):
+                    info = os.stat(os.path.join(self.directory, name))
+                    entries.append((os.path.join(self.directory, name), info.st_mtime, info.st_size))
+        return entries
+
+
+    def _evict(self, keep: str) -> None:
+        """
+        Deletes the least recently used entries, other than keep, while the cache holds
+        more than max_bytes.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total: int = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                total -= size
@@ -0,0 +1,827 @@
+import numpy as np
+from math import gcd, lcm, isqrt
+from fractions import Fraction
+from typing import Callable, List, Tuple, Dict, Iterator
+from numpy.typing import NDArray
+from src.jaggdy.utils.sparse import CSRMatrix
+
+
+# Largest exact systems solved by Bareiss elimination; larger ones are solved by p-adic lifting.
+BAREISS_SIZE_LIMIT: int = 1 << 4
+
+# Size below which matrices are inverted modulo a prime by Gauss-Jordan elimination.
+MODULAR_INVERSE_BLOCK: int = 1 << 5
+
+# Number of rows of a transition matrix read together.
+ROW_BLOCK: int = 1 << 16
+
+# Allocates an array to be filled in, given a name for it, its shape, and its dtype.
+type ArrayAllocator = Callable[[str, Tuple[int, ...], type], NDArray]
+
+# Stores a filled-in array under its name, returning the stored array.
+type ArrayStore = Callable[[str, NDArray], NDArray]
+
+
+def _empty_array(name: str, shape: Tuple[int, ...], dtype: type) -> NDArray:
+    return np.empty(shape, dtype=dtype)
+
+
+def _kept_array(name: str, array: NDArray) -> NDArray:
+    return array
+
+
+def strongly_connected_components(mat: CSRMatrix,
+                                  new_array: ArrayAllocator=_empty_array) -> Tuple[int, NDArray[np.int64]]:
+    """
+    Finds the strongly connected components of the directed graph with an edge from i to j
+    for every non-zero entry (i, j) of a square matrix, by Tarjan's algorithm without recursion.
+    Components are numbered in the order they are completed, which is a reverse topological
+    order: every component reachable from component k has a number at most k. The state of
+    the search is kept in arrays rather than lists, and the matrix is only read, so it may
+    be memory-mapped.
+
+    :param mat: A square sparse matrix.
+    :param new_array: Allocates the array of components, given its name, shape, and dtype.
+    :return: The number of components and the component of each vertex.
+    """
+    num_vertices: int = mat.shape[0]
+    # Entries that are zero are skipped, if there are any
+    has_zeros: bool = any(not np.all(mat.data[start:start + ROW_BLOCK]) for start in range(0, mat.nnz, ROW_BLOCK))
+
+    # The visit number and low link of each vertex, with -1 for vertices not yet visited
+    order_array = np.full(num_vertices, -1, dtype=np.int64)
+    low_array = np.zeros(num_vertices, dtype=np.int64)
+    on_stack_array = np.zeros(num_vertices, dtype=np.bool_)
+    labels = new_array("components", (num_vertices,), np.int64)
+    # The vertices of the components not yet completed, and the path of the search, three
+    # entries per vertex on it: the vertex, its next entry, and the size of the stack when
+    # it was visited
+    stack_array = np.empty(num_vertices, dtype=np.int64)
+    path_array = np.empty(3 * num_vertices, dtype=np.int64)
+
+    # Single entries are read and written through memoryviews, which give Python numbers
+    indptr, indices, data, order, low, on_stack, stack, path = (
+        memoryview(np.ascontiguousarray(array)) for array in
+        (mat.indptr, mat.indices, mat.data, order_array, low_array, on_stack_array, stack_array, path_array)
+    )
+    stack_size: int = 0
+    counter: int = 0
+    num_components: int = 0
+
+    for root in range(num_vertices):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        path[0], path[1], path[2] = root, indptr[root], stack_size
+        stack[stack_size] = root
+        stack_size += 1
+        on_stack[root] = True
+        top: int = 0
+
+        while top >= 0:
+            vertex = path[top]
+            position = path[top + 1]
+            if position < indptr[vertex + 1]:
+                path[top + 1] = position + 1
+                if has_zeros and data[position] == 0:
+                    continue
+                neighbor = indices[position]
+                if order[neighbor] == -1:
+                    order[neighbor] = low[neighbor] = counter
+                    counter += 1
+                    top += 3
+                    path[top], path[top + 1], path[top + 2] = neighbor, indptr[neighbor], stack_size
+                    stack[stack_size] = neighbor
+                    stack_size += 1
+                    on_stack[neighbor] = True
+                elif on_stack[neighbor] and order[neighbor] < low[vertex]:
+                    low[vertex] = order[neighbor]
+                continue
+
+            # Every edge from vertex has been followed
+            start = path[top + 2]
+            top -= 3
+            if top >= 0 and low[vertex] < low[path[top]]:
+                low[path[top]] = low[vertex]
+            if low[vertex] == order[vertex]:
+                # The component is every vertex stacked since vertex
+                members = stack_array[start:stack_size]
+                on_stack_array[members] = False
+                labels[members] = num_components
+                stack_size = start
+                num_components += 1
+
+    return num_components, labels
+
+
+def bareiss_solve(matrix: NDArray[np.object_], rhs: NDArray[np.object_]) -> Tuple[NDArray[np.object_], int]:
+    """
+    Solves A X = B exactly for a square integer matrix A by Bareiss' fraction-free Gaussian
+    elimination. Every intermediate entry is a minor of the augmented matrix, so entries
+    stay integers whose size grows only linearly, and the division by the previous pivot
+    at each step is exact. The last pivot is det(A), and det(A) X is found by back
+    substitution in integers, again with exact divisions.
+
+    :param matrix: A non-singular (n x n) matrix of integers.
+    :param rhs: An (n x m) matrix of integers.
+    :return: The (n x m) matrix of integer numerators of X, and their common positive denominator.
+    """
+    size: int = len(matrix)
+    num_rhs: int = rhs.shape[1]
+    rows: List[List[int]] = [
+        [int(value) for value in matrix_row] + [int(value) for value in rhs_row]
+        for matrix_row, rhs_row in zip(matrix.tolist(), rhs.tolist())
+    ]
+
+    previous: int = 1
+    for k in range(size):
+        pivot_row = next((i for i in range(k, size) if rows[i][k] != 0), None)
+        if pivot_row is None:
+            raise ValueError("Matrix is singular.")
+        rows[k], rows[pivot_row] = rows[pivot_row], rows[k]
+        pivot_values = rows[k]
+        pivot = pivot_values[k]
+        for i in range(k + 1, size):
+            row = rows[i]
+            factor = row[k]
+            rows[i] = row[:k + 1] + [
+                (value * pivot - factor * pivot_value) // previous
+                for value, pivot_value in zip(row[k + 1:], pivot_values[k + 1:])
+            ]
+        previous = pivot
+
+    # Back substitution of det(A) X on the triangular system
+    determinant: int = previous
+    numerators: List[List[int]] = [[0] * num_rhs for _ in range(size)]
+    for i in reversed(range(size)):
+        row = rows[i]
+        for c in range(num_rhs):
+            value = determinant * row[size + c]
+            for j in range(i + 1, size):
+                if row[j]:
+                    value -= row[j] * numerators[j][c]
+            numerators[i][c] = value // row[i]
+
+    sign: int = 1 if determinant > 0 else -1
+    solution = np.zeros((size, num_rhs), dtype=np.int64).astype(np.object_)
+    for i, row in enumerate(numerators):
+        solution[i] = [sign * value for value in row]
+    return solution, abs(determinant)
+
+
+def _primes_below(bound: int) -> Iterator[int]:
+    """
+    :return: The odd primes below bound, in decreasing order.
+    """
+    candidate = bound - 1 if bound % 2 == 0 else bound - 2
+    while candidate > 2:
+        if all(candidate % divisor for divisor in range(3, isqrt(candidate) + 1, 2)):
+            yield candidate
+        candidate -= 2
+
+
+def _inverse_mod(matrix: NDArray[np.float64], prime: int) -> NDArray[np.float64] | None:
+    """
+    Inverts a matrix modulo a prime by block elimination: the inverses of the leading block
+    and of its Schur complement are combined with matrix products. Entries are integers
+    below prime held in floats, and prime is small enough that the products are exact.
+
+    :param matrix: A square matrix with entries in [0, prime).
+    :param prime: The prime modulus.
+    :return: The inverse modulo prime, or None if a block is singular modulo prime.
+    """
+    size: int = len(matrix)
+    if size <= MODULAR_INVERSE_BLOCK:
+        work = np.concatenate([matrix.astype(np.int64), np.eye(size, dtype=np.int64)], axis=1)
+        for k in range(size):
+            nonzero = np.flatnonzero(work[k:, k])
+            if len(nonzero) == 0:
+                return None
+            work[[k, k + nonzero[0]]] = work[[k + nonzero[0], k]]
+            work[k] = work[k] * pow(int(work[k, k]), -1, prime) % prime
+            column = work[:, k].copy()
+            column[k] = 0
+            work = (work - np.outer(column, work[k])) % prime
+        return work[:, size:].astype(np.float64)
+
+    def multiply(left: NDArray[np.float64], right: NDArray[np.float64]) -> NDArray[np.float64]:
+        return np.remainder(np.matmul(left, right), prime)
+
+    half: int = size // 2
+    top_inverse = _inverse_mod(matrix[:half, :half], prime)
+    if top_inverse is None:
+        return None
+    top_right = multiply(top_inverse, matrix[:half, half:])
+    bottom_left = multiply(matrix[half:, :half], top_inverse)
+    complement = np.remainder(matrix[half:, half:] - multiply(matrix[half:, :half], top_right), prime)
+    complement_inverse = _inverse_mod(complement, prime)
+    if complement_inverse is None:
+        return None
+
+    inverse = np.empty_like(matrix)
+    inverse[:half, half:] = np.remainder(-multiply(top_right, complement_inverse), prime)
+    inverse[:half, :half] = np.remainder(top_inverse - multiply(inverse[:half, half:], bottom_left), prime)
+    inverse[half:, :half] = np.remainder(-multiply(complement_inverse, bottom_left), prime)
+    inverse[half:, half:] = complement_inverse
+    return inverse
+
+
+def _rational_reconstruction(value: int, modulus: int) -> Tuple[int, int] | None:
+    """
+    Finds the fraction a / b congruent to value modulo modulus with |a| and b at most
+    sqrt(modulus / 2), by the extended Euclidean algorithm; it is unique if it exists.
+
+    :return: The numerator and the positive denominator, or None if there is no such fraction.
+    """
+    bound: int = isqrt(modulus // 2)
+    previous, remainder = modulus, value % modulus
+    previous_coefficient, coefficient = 0, 1
+    while remainder > bound:
+        quotient = previous // remainder
+        previous, remainder = remainder, previous - quotient * remainder
+        previous_coefficient, coefficient = coefficient, previous_coefficient - quotient * coefficient
+    if coefficient == 0 or abs(coefficient) > bound:
+        return None
+    return (remainder, coefficient) if coefficient > 0 else (-remainder, -coefficient)
+
+
+def _reconstruct(values: List[int], modulus: int) -> Tuple[List[int], int] | None:
+    """
+    :return: Numerators over a common denominator of fractions congruent to values modulo
+    modulus, both at most sqrt(modulus / 2), together with the denominator, or None.
+    """
+    bound: int = isqrt(modulus // 2)
+    denominator: int = 1
+    for value in values:
+        scaled = value * denominator % modulus
+        if min(scaled, modulus - scaled) > bound:
+            fraction = _rational_reconstruction(scaled, modulus)
+            if fraction is None or denominator * fraction[1] > bound:
+                return None
+            denominator *= fraction[1]
+
+    numerators: List[int] = []
+    for value in values:
+        scaled = value * denominator % modulus
+        scaled = scaled - modulus if scaled > modulus // 2 else scaled
+        if abs(scaled) > bound:
+            return None
+        numerators.append(scaled)
+    return numerators, denominator
+
+
+def dixon_solve(matrix: NDArray[np.object_], rhs: NDArray[np.object_]) -> Tuple[NDArray[np.object_], int]:
+    """
+    Solves A X = B exactly for a square integer matrix A by Dixon's p-adic lifting. A is
+    inverted once modulo a prime p with exact floating-point matrix products, and each step
+    finds the next base-p digit of X from the residual, which is then divided by p. Every
+    so often the fractions congruent to the digits so far are reconstructed and checked
+    against the system, so the number of steps grows with the size of the solution rather
+    than with the worst-case bound. If A is singular modulo the first few primes, the system
+    is solved by bareiss_solve instead.
+
+    :param matrix: A non-singular (n x n) matrix of integers.
+    :param rhs: An (n x m) matrix of integers.
+    :return: The (n x m) matrix of integer numerators of X, and their common positive denominator.
+    """
+    size: int = len(matrix)
+    num_rhs: int = rhs.shape[1]
+    if size == 0 or num_rhs == 0:
+        return np.zeros((size, num_rhs), dtype=np.int64).astype(np.object_), 1
+    matrix = np.asarray(matrix, dtype=np.object_)
+    rhs = np.asarray(rhs, dtype=np.object_)
+    try:
+        small_matrix: NDArray[np.int64] | None = matrix.astype(np.int64)
+    except OverflowError:
+        small_matrix = None
+
+    # Products of n residues modulo the prime must be exact in floats
+    inverse: NDArray[np.float64] | None = None
+    for _, prime in zip(range(3), _primes_below(isqrt((1 << 53) // size))):
+        residues = np.remainder(matrix if small_matrix is None else small_matrix, prime)
+        inverse = _inverse_mod(residues.astype(np.float64), prime)
+        if inverse is not None:
+            break
+    if inverse is None:
+        return bareiss_solve(matrix, rhs)
+
+    # The residual stays below n max|A| in size, so its products with the digits are exact
+    # in floats, or at least in 64 bits, unless A has large entries.
+    product_matrix: NDArray = matrix
+    if small_matrix is not None:
+        bound: int = int(np.abs(small_matrix).max()) * size * prime
+        if bound < 1 << 53:
+            product_matrix = small_matrix.astype(np.float64)
+        elif bound < 1 << 62:
+            product_matrix = small_matrix
+
+    residual = rhs
+    digits_sum = np.zeros((size, num_rhs), dtype=np.int64).astype(np.object_)
+    modulus: int = 1
+    steps: int = 0
+    next_check: int = 1
+    while True:
+        digits = np.remainder(np.matmul(inverse, np.remainder(residual, prime).astype(np.float64)), prime)
+        if product_matrix.dtype == np.float64:
+            products = np.matmul(product_matrix, digits).astype(np.int64)
+            digits = digits.astype(np.int64)
+        else:
+            digits = digits.astype(np.int64)
+            products = np.matmul(product_matrix, digits.astype(product_matrix.dtype))
+        digits_sum += digits.astype(np.object_) * modulus
+        modulus *= prime
+        residual = (residual - products) // prime
+        steps += 1
+        if steps < next_check:
+            continue
+        next_check = steps + max(1, steps // 4)
+
+        candidate = _reconstruct(digits_sum.ravel().tolist(), modulus)
+        if candidate is None:
+            continue
+        numerators, denominator = candidate
+        solution = np.array(numerators, dtype=np.object_).reshape(size, num_rhs)
+        if (np.matmul(matrix, solution) == rhs * denominator).all():
+            return solution, denominator
+
+
+class AbsorptionAnalysis:
+    """
+    Long-run analysis of a finite Markov chain from its sparse transition matrix, without
+    raising it to a power. The communicating classes are the strongly connected components
+    of the transition graph; the closed (recurrent) classes are those no transition leaves,
+    and every other state is transient.
+
+    Each closed class has its own stationary distribution. Starting from a transient state,
+    the chain is eventually absorbed into one of the closed classes; the probabilities of
+    each are found by solving, one component at a time in reverse topological order, the
+    small linear system of each transient component. The limit matrix combines the two: its
+    (i, j) entry is the probability of absorption from state i into the closed class of j
+    times the stationary probability of j. For a periodic closed class the powers of the
+    transition matrix oscillate, and the limit matrix is their Cesàro average.
+
+    The transition matrix is only read, a block of rows or one component at a time, so it
+    may be memory-mapped. The arrays of the analysis with an entry per state are allocated
+    by new_array, given their names, shapes, and dtypes, and handed to store_array under
+    the same names once filled in, so that they too can be kept in files; the search for
+    components still holds a few integers per state in memory.
+
+    ATTRIBUTES:
+        num_states (int): The number of states of the chain.
+        components (NDArray[np.int64]): The strongly connected component of each state, in
+        reverse topological order.
+        closed_classes (List[NDArray[np.int64]]): The states of each closed class.
+        periods (List[int]): The period of each closed class.
+        class_stationary (List[NDArray[np.float64]]): The stationary distribution of each
+        closed class, over its states in the order of closed_classes.
+        absorption (CSRMatrix): A (states x closed classes) matrix of absorption probabilities.
+    """
+    # The type of the probabilities, and of the weights of the transitions from each state
+    _dtype: type = np.float64
+
+    def __init__(self, transitions: CSRMatrix, new_array: ArrayAllocator=_empty_array,
+                 store_array: ArrayStore=_kept_array) -> None:
+        if transitions.shape[0] != transitions.shape[1]:
+            raise ValueError("Transition matrices must be square.")
+        self.num_states: int = transitions.shape[0]
+        self._transitions: CSRMatrix = transitions
+        num_components, components = strongly_connected_components(transitions, new_array)
+        self.components: NDArray[np.int64] = store_array("components", components)
+        is_closed: NDArray[np.bool_] = self._closed_components(num_components)
+        members: List[NDArray[np.int64]] = self._component_members(num_components)
+        closed_components = np.flatnonzero(is_closed)
+        self._closed_class_of: Dict[int, int] = {
+            int(component): i for i, component in enumerate(closed_components)
+        }
+
+        # The states of every closed class and their stationary probabilities, end to end
+        self._class_offsets: NDArray[np.int64] = np.zeros(len(closed_components) + 1, dtype=np.int64)
+        np.cumsum([len(members[c]) for c in closed_components], out=self._class_offsets[1:])
+        class_states = new_array("class_states", (int(self._class_offsets[-1]),), np.int64)
+        class_values = new_array("class_stationary", (int(self._class_offsets[-1]),), self._dtype)
+        self.periods: List[int] = []
+        for c, start, stop in zip(closed_components, self._class_offsets[:-1], self._class_offsets[1:]):
+            class_states[start:stop] = members[c]
+            class_values[start:stop] = self._class_stationary(members[c])
+            self.periods.append(self._period(members[c]))
+        self._class_states: NDArray[np.int64] = store_array("class_states", class_states)
+        self._class_values: NDArray = store_array("class_stationary", class_values)
+        self.closed_classes: List[NDArray[np.int64]] = [
+            self._class_states[start:stop] for start, stop in zip(self._class_offsets[:-1], self._class_offsets[1:])
+        ]
+        self.class_stationary: List[NDArray] = [
+            self._class_values[start:stop] for start, stop in zip(self._class_offsets[:-1], self._class_offsets[1:])
+        ]
+
+        # Every state of a component can be absorbed into the same closed classes
+        targets_of, probs_of = self._absorption(members, is_closed)
+        indptr = new_array("absorption.indptr", (self.num_states + 1,), np.int64)
+        indptr[0] = 0
+        np.cumsum(np.array([len(targets) for targets in targets_of], dtype=np.int64)[self.components],
+                  out=indptr[1:])
+        indices = new_array("absorption.indices", (int(indptr[-1]),), np.int64)
+        values = new_array("absorption.values", (int(indptr[-1]),), self._dtype)
+        for states, targets, probs in zip(members, targets_of, probs_of):
+            entries = (indptr[states][:, np.newaxis] + np.arange(len(targets))).ravel()
+            indices[entries] = np.tile(targets, len(states))
+            values[entries] = probs.ravel()
+        self._absorbed_values: NDArray = store_array("absorption.values", values)
+        self.absorption: CSRMatrix = CSRMatrix(
+            store_array("absorption.indptr", indptr),
+            store_array("absorption.indices", indices),
+            self._absorbed_values if self._dtype is np.float64 else
+            store_array("absorption.data", self._absorbed_values.astype(np.float64)),
+            (self.num_states, len(self.closed_classes))
+        )
+
+
+    def arrays(self) -> Dict[str, NDArray]:
+        """
+        :return: The arrays from which from_arrays restores the analysis, by name.
+        """
+        return {"components": self.components, "class_offsets": self._class_offsets,
+                "class_states": self._class_states, "class_stationary": self._class_values,
+                "periods": np.array(self.periods, dtype=np.int64), "absorption.indptr": self.absorption.indptr,
+                "absorption.indices": self.absorption.indices, "absorption.values": self._absorbed_values}
+
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, NDArray]) -> 'AbsorptionAnalysis':
+        """
+        Restores an analysis from the arrays returned by arrays, without the transition
+        matrix, so that it answers queries of the limit matrix without being computed again.
+
+        :param arrays: The arrays of the analysis, by name.
+        :return: The analysis.
+        """
+        analysis = cls.__new__(cls)
+        analysis.components = arrays["components"]
+        analysis.num_states = len(analysis.components)
+        analysis._class_offsets = arrays["class_offsets"]
+        analysis._class_states = arrays["class_states"]
+        analysis._class_values = arrays["class_stationary"]
+        analysis.periods = arrays["periods"].tolist()
+        bounds = list(zip(analysis._class_offsets[:-1], analysis._class_offsets[1:]))
+        analysis.closed_classes = [analysis._class_states[start:stop] for start, stop in bounds]
+        analysis.class_stationary = [analysis._class_values[start:stop] for start, stop in bounds]
+        analysis._absorbed_values = arrays["absorption.values"]
+        analysis.absorption = CSRMatrix(arrays["absorption.indptr"], arrays["absorption.indices"],
+                                        analysis._absorbed_values.astype(np.float64, copy=False),
+                                        (analysis.num_states, len(bounds)))
+        return analysis
+
+
+    def _closed_components(self, num_components: int) -> NDArray[np.bool_]:
+        """
+        :return: Whether each component is closed, that is, no transition leaves it; the
+        transitions are read a block of rows at a time.
+        """
+        indptr, indices, data = self._transitions.indptr, self._transitions.indices, self._transitions.data
+        is_closed = np.ones(num_components, dtype=np.bool_)
+        for start in range(0, self.num_states, ROW_BLOCK):
+            stop = min(start + ROW_BLOCK, self.num_states)
+            sources = np.repeat(self.components[start:stop], np.diff(indptr[start:stop + 1]))
+            entries = slice(indptr[start], indptr[stop])
+            leaving = (sources != self.components[indices[entries]]) & (data[entries] != 0)
+            is_closed[sources[leaving]] = False
+        return is_closed
+
+
+    def _component_members(self, num_components: int) -> List[NDArray[np.int64]]:
+        """
+        :return: The states of each component, in increasing order.
+        """
+        order = np.argsort(self.components, kind="stable")
+        bounds = np.searchsorted(self.components[order], np.arange(num_components + 1))
+        return [order[bounds[c]:bounds[c + 1]] for c in range(num_components)]
+
+
+    def _weights(self, entries: NDArray[np.int64]) -> NDArray:
+        """
+        :return: The weights of the given entries of the transition matrix, which are their
+        probabilities times _scales of their rows.
+        """
+        return self._transitions.data[entries]
+
+
+    def _entries(self, states: NDArray[np.int64]) -> Tuple[NDArray[np.int64], NDArray[np.int64], NDArray]:
+        """
+        :param states: States in increasing order.
+        :return: For each transition with non-zero probability from one of states, the
+        position of its state in states, the state it leads to, and its weight.
+        """
+        indptr = self._transitions.indptr
+        starts = indptr[states]
+        lengths = indptr[states + 1] - starts
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        rows = np.repeat(np.arange(len(states)), lengths)
+        nonzero = self._transitions.data[entries] != 0
+        rows, entries = rows[nonzero], entries[nonzero]
+        return rows, self._transitions.indices[entries], self._weights(entries)
+
+
+    def _scales(self, states: NDArray[np.int64]) -> NDArray:
+        """
+        :return: The factor by which the transition probabilities of each of states are
+        scaled to give their weights.
+        """
+        return np.ones(len(states), dtype=self._dtype)
+
+
+    def _solve(self, system: NDArray, rhs: NDArray) -> NDArray:
+        return np.linalg.solve(system, rhs)
+
+
+    def _submatrix(self, states: NDArray[np.int64]) -> NDArray:
+        """
+        :param states: States in increasing order.
+        :return: The dense matrix of transition weights between the given states.
+        """
+        rows, cols, weights = self._entries(states)
+        positions = np.minimum(np.searchsorted(states, cols), len(states) - 1)
+        inside = states[positions] == cols
+        block = np.zeros((len(states), len(states)), dtype=self._dtype)
+        np.add.at(block, (rows[inside], positions[inside]), weights[inside])
+        return block
+
+
+    def _period(self, states: NDArray[np.int64]) -> int:
+        """
+        Computes the period of a closed class as the greatest common divisor of the
+        differences in breadth-first levels along its transitions.
+
+        :param states: The states of the class, in increasing order.
+        """
+        rows, cols, _ = self._entries(states)
+        positions = np.searchsorted(states, cols)
+        row_starts = np.searchsorted(rows, np.arange(len(states) + 1))
+        levels = np.full(len(states), -1, dtype=np.int64)
+        levels[0] = 0
+        frontier = np.zeros(1, dtype=np.int64)
+        level: int = 0
+        while len(frontier):
+            level += 1
+            lengths = row_starts[frontier + 1] - row_starts[frontier]
+            entries = np.repeat(row_starts[frontier] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            reached = np.unique(positions[entries])
+            frontier = reached[levels[reached] == -1]
+            levels[frontier] = level
+        return int(np.gcd.reduce(levels[rows] + 1 - levels[positions]))
+
+
+    def _certain(self) -> NDArray:
+        return np.ones(1, dtype=self._dtype)
+
+
+    def _class_stationary(self, states: NDArray[np.int64]) -> NDArray:
+        """
+        Solves pi P = pi with the entries of pi summing to one on a closed class. With the
+        rows of P scaled to weights W = D P, this is y (D - W) = 0 for y = pi D^-1, with the
+        entries of y D summing to one.
+        """
+        if len(states) == 1:
+            return self._certain()
+        scales = self._scales(states)
+        system = np.transpose(np.diag(scales) - self._submatrix(states))
+        system[-1] = scales
+        rhs = np.zeros((len(states), 1), dtype=self._dtype)
+        rhs[-1] = 1
+        return self._solve(system, rhs)[:, 0] * scales
+
+
+    def _leaving(self, states: NDArray[np.int64],
+                 component: int) -> Tuple[NDArray[np.int64], NDArray[np.int64], NDArray[np.int64], NDArray]:
+        """
+        :return: For each transition leaving a component, the position of its state in the
+        component, the component it leads to, the position of the state it leads to in
+        that component, and its weight.
+        """
+        rows, cols, weights = self._entries(states)
+        successors = self.components[cols]
+        leaving = successors != component
+        return rows[leaving], successors[leaving], cols[leaving], weights[leaving]
+
+
+    def _absorption(self, members: List[NDArray[np.int64]],
+                    is_closed: NDArray[np.bool_]) -> Tuple[List[NDArray[np.int64]], List[NDArray]]:
+        """
+        Computes the absorption probabilities of every state. Components are visited in
+        reverse topological order, so the probabilities of every state a component can move
+        to are known when its own small system (I - Q) B = R B_out is solved.
+
+        :return: For each component, the closed classes its states can be absorbed into, and
+        a (states x classes) array of the probabilities, with states in increasing order.
+        """
+        targets_of: List[NDArray[np.int64]] = []
+        probs_of: List[NDArray] = []
+        for component, states in enumerate(members):
+            if is_closed[component]:
+                targets_of.append(np.array([self._closed_class_of[component]], dtype=np.int64))
+                probs_of.append(np.ones((len(states), 1), dtype=self._dtype))
+                continue
+
+            # Collect the transitions leaving the component, by the classes they lead to
+            rows, successors, cols, probs = self._leaving(states, component)
+            unique_successors: List[int] = np.unique(successors).tolist()
+            targets = np.unique(np.concatenate([targets_of[successor] for successor in unique_successors]))
+            rhs = np.zeros((len(states), len(targets)))
+            for successor in unique_successors:
+                chosen = successors == successor
+                absorbed = probs_of[successor][np.searchsorted(members[successor], cols[chosen])]
+                np.add.at(rhs, (rows[chosen][:, np.newaxis], np.searchsorted(targets, targets_of[successor])),
+                          absorbed * probs[chosen, np.newaxis])
+            targets_of.append(targets)
+            probs_of.append(np.linalg.solve(np.eye(len(states)) - self._submatrix(states), rhs))
+        return targets_of, probs_of
+
+
+    def limit_row(self, state: int) -> Tuple[NDArray[np.int64], NDArray]:
+        """
+        :param state: The index of a state.
+        :return: The states with non-zero long-run probability starting from state, in
+        increasing order, and those probabilities.
+        """
+        start, stop = self.absorption.indptr[state], self.absorption.indptr[state + 1]
+        classes = self.absorption.indices[start:stop]
+        sizes = np.diff(self._class_offsets)[classes]
+        entries = np.repeat(self._class_offsets[classes] - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        cols = self._class_states[entries]
+        values = np.repeat(self._absorbed_values[start:stop], sizes) * self._class_values[entries]
+        order = np.argsort(cols)
+        return cols[order], values[order]
+
+
+    def limit_matrix(self) -> CSRMatrix:
+        """
+        :return: The Cesàro limit of the powers of the transition matrix, in which row i is
+        the long-run distribution of the chain started from state i.
+        """
+        return self.limit_rows(np.arange(self.num_states, dtype=np.int64))
+
+
+    def limit_rows(self, states: NDArray[np.int64]) -> CSRMatrix:
+        """
+        Computes the rows of the limit matrix of many states at once, from the probabilities
+        of absorption of each state into each closed class and the stationary distributions
+        of the classes.
+
+        :param states: The indices of states, possibly repeated.
+        :return: A (len(states) x states) matrix whose k-th row is the long-run distribution
+        of the chain started from states[k], with the probabilities of limit_row rounded to floats.
+        """
+        states = np.asarray(states, dtype=np.int64)
+        indptr = self.absorption.indptr
+
+        # The position in absorption of each pair of a row and a class it may be absorbed into
+        lengths = indptr[states + 1] - indptr[states]
+        pairs = np.repeat(indptr[states] - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        pair_classes = self.absorption.indices[pairs]
+
+        # Each pair spreads its probability over the states of its class
+        sizes = np.diff(self._class_offsets)[pair_classes]
+        entries = (np.repeat(self._class_offsets[pair_classes] - (np.cumsum(sizes) - sizes), sizes)
+                   + np.arange(sizes.sum()))
+        values = np.repeat(self._absorbed_values[pairs], sizes) * self._class_values[entries]
+        return CSRMatrix.from_triplets(
+            np.repeat(np.repeat(np.arange(len(states), dtype=np.int64), lengths), sizes),
+            self._class_states[entries], values.astype(np.float64), (len(states), self.num_states)
+        )
+
+
+class ExactAbsorptionAnalysis(AbsorptionAnalysis):
+    """
+    Absorption analysis in exact rational arithmetic. The transition matrix is kept as
+    integer numerators over a common denominator for each row, so the system of each
+    component, scaled row by row by the denominators, has integer entries and is solved by
+    fraction-free elimination; probabilities are Fractions. The float transition matrix
+    built from the same entries gives the structure of the chain, and limit_matrix and
+    absorption hold the probabilities rounded to floats.
+
+    ATTRIBUTES:
+        numerators (List[int]): The numerator of each stored entry of the transition matrix,
+        in compressed sparse row order.
+        denominators (List[int]): The denominator shared by the entries of each row.
+    """
+    _dtype: type = np.object_
+
+    def __init__(self, indptr: NDArray[np.int64], indices: NDArray[np.int64],
+                 numerators: List[int], denominators: List[int], new_array: ArrayAllocator=_empty_array,
+                 store_array: ArrayStore=_kept_array) -> None:
+        self.numerators: List[int] = [int(numerator) for numerator in numerators]
+        self.denominators: List[int] = [int(denominator) for denominator in denominators]
+        if any(numerator <= 0 for numerator in self.numerators):
+            raise ValueError("Numerators of transition probabilities must be positive.")
+        self._numerators: NDArray[np.object_] = np.empty(len(self.numerators), dtype=np.object_)
+        self._numerators[:] = self.numerators
+        rows = np.repeat(np.arange(len(self.denominators)), np.diff(indptr))
+        probs = [numerator / self.denominators[row] for numerator, row in zip(self.numerators, rows.tolist())]
+        super().__init__(CSRMatrix(indptr, indices, np.array(probs), (len(self.denominators),) * 2),
+                         new_array, store_array)
+
+
+    @classmethod
+    def from_fractions(cls, rows: NDArray[np.int64], cols: NDArray[np.int64], probs: List[Fraction],
+                       num_states: int) -> 'ExactAbsorptionAnalysis':
+        """
+        :param rows: The row of each entry of the transition matrix.
+        :param cols: The column of each entry.
+        :param probs: The probability of each entry; each position must appear once.
+        :param num_states: The number of states of the chain.
+        :return: The exact absorption analysis of the chain.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(num_states + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_states), out=indptr[1:])
+        sorted_probs = [Fraction(probs[i]) for i in order.tolist()]
+
+        numerators: List[int] = []
+        denominators: List[int] = []
+        for start, stop in zip(indptr[:-1].tolist(), indptr[1:].tolist()):
+            denominator = lcm(*[prob.denominator for prob in sorted_probs[start:stop]])
+            denominators.append(denominator)
+            numerators += [prob.numerator * (denominator // prob.denominator) for prob in sorted_probs[start:stop]]
+        return cls(indptr, cols[order], numerators, denominators)
+
+
+    def _weights(self, entries: NDArray[np.int64]) -> NDArray[np.object_]:
+        return self._numerators[entries]
+
+
+    def _scales(self, states: NDArray[np.int64]) -> NDArray[np.object_]:
+        return np.array([self.denominators[state] for state in states.tolist()], dtype=np.object_)
+
+
+    def _solve_integers(self, system: NDArray[np.object_], rhs: NDArray[np.object_]) -> Tuple[NDArray[np.object_], int]:
+        if len(system) <= BAREISS_SIZE_LIMIT:
+            return bareiss_solve(system, rhs)
+        return dixon_solve(system, rhs)
+
+
+    def _solve(self, system: NDArray[np.object_], rhs: NDArray[np.object_]) -> NDArray[np.object_]:
+        numerators, denominator = self._solve_integers(system, rhs)
+        solution = np.empty(numerators.shape, dtype=np.object_)
+        for i, row in enumerate(numerators.tolist()):
+            solution[i] = [Fraction(value, denominator) for value in row]
+        return solution
+
+
+    def _absorption(self, members: List[NDArray[np.int64]],
+                    is_closed: NDArray[np.bool_]) -> Tuple[List[NDArray[np.int64]], List[NDArray[np.object_]]]:
+        """
+        Computes the absorption probabilities of every state as AbsorptionAnalysis does, but
+        keeps those of each component as integer numerators over a common denominator. The
+        transitions out of a component lead to a few other components; the weights into each
+        of them are multiplied with its numerators as integer arrays, and the sums are brought
+        to the least common multiple of the denominators, so no fractions are added.
+        """
+        # For each component the closed classes it can be absorbed into, the numerators of
+        # the probabilities of absorption into each of them from each of its states, and
+        # their common denominator
+        targets_of: List[NDArray[np.int64]] = []
+        numerators_of: List[NDArray[np.object_]] = []
+        denominator_of: List[int] = []
+
+        for component, states in enumerate(members):
+            if is_closed[component]:
+                targets_of.append(np.array([self._closed_class_of[component]], dtype=np.int64))
+                numerators_of.append(np.ones((len(states), 1), dtype=np.int64).astype(np.object_))
+                denominator_of.append(1)
+                continue
+
+            # The transitions leaving the component
+            rows, successors, cols, weights = self._leaving(states, component)
+            unique_successors: List[int] = np.unique(successors).tolist()
+            targets = np.unique(np.concatenate([targets_of[successor] for successor in unique_successors]))
+            common: int = lcm(*[denominator_of[successor] for successor in unique_successors])
+            rhs = np.zeros((len(states), len(targets)), dtype=np.int64).astype(np.object_)
+            for successor in unique_successors:
+                chosen = successors == successor
+                contributions = (numerators_of[successor][np.searchsorted(members[successor], cols[chosen])]
+                                 * weights[chosen, np.newaxis])
+                sums = np.zeros((len(states), len(targets_of[successor])), dtype=np.int64).astype(np.object_)
+                np.add.at(sums, rows[chosen], contributions)
+                rhs[:, np.searchsorted(targets, targets_of[successor])] += sums * (common // denominator_of[successor])
+
+            system = np.diag(self._scales(states)) - self._submatrix(states)
+            solution, denominator = self._solve_integers(system, rhs)
+
+            # Cancel the common factor of the numerators and the denominator
+            denominator *= common
+            divisor: int = gcd(denominator, *solution.ravel().tolist())
+            targets_of.append(targets)
+            numerators_of.append(solution // divisor)
+            denominator_of.append(denominator // divisor)
+
+        probs_of: List[NDArray[np.object_]] = []
+        for numerators, denominator in zip(numerators_of, denominator_of):
+            probs = np.empty(numerators.shape, dtype=np.object_)
+            probs.ravel()[:] = [Fraction(numerator, denominator) for numerator in numerators.ravel().tolist()]
+            probs_of.append(probs)
+        return targets_of, probs_of
+
+
+    def _certain(self) -> NDArray[np.object_]:
+        return np.array([Fraction(1)], dtype=np.object_)
@@ -0,0 +1,323 @@
+from typing import List, Dict, Tuple, Iterator
+from src.jaggdy.utils.types import Sentence, IndexedSentence, Atom
+from src.jaggdy.utils.enums import Logic
+from src.jaggdy.utils.atoms import AtomTable
+
+type Clause = List[int]
+
+
+def sentence_to_cnf(atoms: List[Atom] | AtomTable,
+                    sentence: Sentence | IndexedSentence) -> Tuple[List[Clause], int]:
+    """
+    Converts a propositional sentence in Polish notation into an equisatisfiable set of
+    clauses by the Tseitin transformation. Literals are non-zero integers as in the DIMACS
+    format: the atom with id i is the variable i + 1, and every binary connective introduces
+    a fresh variable defined to be equivalent to its subsentence. Each model of the sentence
+    extends to exactly one model of the clauses.
+
+    :param atoms: The atomic propositions of the agenda.
+    :param sentence: The propositional sentence in Polish notation, by atoms or atom ids.
+    :return: The clauses together with the total number of variables.
+    """
+    atom_table = atoms if isinstance(atoms, AtomTable) else AtomTable(atoms)
+    num_vars: int = len(atom_table)
+    clauses: List[Clause] = []
+    if not sentence:
+        return clauses, num_vars
+
+    stack: List[int] = []
+    for symbol in reversed(atom_table.index_sentence(sentence)):
+        if not isinstance(symbol, Logic):
+            stack.append(symbol + 1)
+            continue
+        if symbol == Logic.NOT:
+            if not stack:
+                raise ValueError("Sentence is not well-formed.")
+            stack.append(-stack.pop())
+            continue
+        if len(stack) < 2:
+            raise ValueError("Sentence is not well-formed.")
+
+        first = stack.pop()
+        second = stack.pop()
+        num_vars += 1
+        gate = num_vars
+
+        # Clauses stating that gate is equivalent to (first op second)
+        if symbol == Logic.IMPLIES:
+            first = -first
+        if symbol == Logic.AND:
+            clauses += [[-gate, first], [-gate, second], [gate, -first, -second]]
+        elif symbol == Logic.IFF:
+            clauses += [[-gate, -first, second], [-gate, first, -second],
+                        [gate, first, second], [gate, -first, -second]]
+        else:
+            clauses += [[-gate, first, second], [gate, -first], [gate, -second]]
+        stack.append(gate)
+
+    if len(stack) != 1:
+        raise ValueError("Sentence is not well-formed.")
+    clauses.append([stack[0]])
+    return clauses, num_vars
+
+
+class SatSolver:
+    """
+    A DPLL SAT solver with two-watched-literal unit propagation. Variables are decided
+    in increasing order with False tried first, so successive solutions are found in
+    lexicographic order. Clauses may be added between calls to solve; a clause falsified
+    by the previous solution (such as a blocking clause) resumes the search by backjumping
+    instead of restarting it. Without clause learning, the search between two consecutive
+    solutions can still take exponential time.
+
+    ATTRIBUTES:
+        num_vars (int): The number of variables, numbered from 1.
+        clauses (List[Clause]): The clauses with at least two literals.
+    """
+    def __init__(self, num_vars: int, clauses: List[Clause]=list()) -> None:
+        self.num_vars: int = num_vars
+        self.clauses: List[Clause] = []
+        self._units: List[int] = []
+        self._watches: Dict[int, List[int]] = {}
+        self._empty: bool = False
+
+        # Search state kept between calls to solve.
+        self._values: List[bool | None] | None = None
+        self._trail: List[int] = []
+        # Each decision records the trail length before it, its literal, and whether
+        # the opposite branch has already been tried.
+        self._decisions: List[Tuple[int, int, bool]] = []
+        self._blocking: Clause | None = None
+        for clause in clauses:
+            self.add_clause(clause)
+
+
+    def add_clause(self, clause: Clause) -> None:
+        """
+        Adds a clause, given as a list of non-zero integer literals, to the solver.
+
+        :param clause: The clause to be added.
+        :return: None
+        """
+        literals: Clause = list(dict.fromkeys(clause))
+        if any(-literal in literals for literal in literals):
+            return
+        if any(abs(literal) > self.num_vars or literal == 0 for literal in literals):
+            raise ValueError("Clause refers to an unknown variable.")
+
+        # Resume from the previous solution only for a single clause it falsifies
+        if self._values is not None:
+            falsified = all(self._value(literal) is False for literal in literals)
+            if len(literals) >= 2 and falsified and self._blocking is None:
+                self.clauses.append(literals)
+                self._blocking = literals
+                return
+            self._reset()
+
+        if len(literals) == 0:
+            self._empty = True
+        elif len(literals) == 1:
+            self._units.append(literals[0])
+        else:
+            self.clauses.append(literals)
+            self._watch(len(self.clauses) - 1)
+
+
+    def solve(self) -> List[bool] | None:
+        """
+        Searches for an assignment satisfying every clause.
+
+        :return: None if the clauses are unsatisfiable, otherwise a list of truth values
+        indexed by variable, where the entry at index 0 is unused.
+        """
+        if self._empty:
+            return None
+
+        if self._values is None:
+            if not self._start():
+                return None
+        elif self._blocking is not None:
+            if not self._resume():
+                return None
+        else:
+            return [bool(value) for value in self._values]
+
+        while True:
+            next_var: int = 1
+            while next_var <= self.num_vars and self._values[next_var] is not None:
+                next_var += 1
+            if next_var > self.num_vars:
+                return [bool(value) for value in self._values]
+
+            self._decisions.append((len(self._trail), -next_var, False))
+            self._assign(-next_var)
+            if not self._propagate(len(self._trail) - 1) and not self._backtrack():
+                return None
+
+
+    def _start(self) -> bool:
+        """
+        Starts a new search from the empty assignment by propagating the unit clauses.
+
+        :return: False if the clauses are unsatisfiable, True otherwise.
+        """
+        self._values = [None] * (self.num_vars + 1)
+        self._trail = []
+        self._decisions = []
+        for unit in self._units:
+            if not self._assign(unit):
+                self._empty = True
+                return False
+        if not self._propagate(0):
+            self._empty = True
+            return False
+        return True
+
+
+    def _reset(self) -> None:
+        """
+        Discards the search state, so the next call to solve starts from scratch.
+        """
+        self._values = None
+        self._trail = []
+        self._decisions = []
+        if self._blocking is not None:
+            self._watch(len(self.clauses) - 1)
+            self._blocking = None
+
+
+    def _watch(self, index: int) -> None:
+        """
+        Registers the first two literals of a clause as its watched literals.
+        """
+        clause = self.clauses[index]
+        self._watches.setdefault(clause[0], []).append(index)
+        self._watches.setdefault(clause[1], []).append(index)
+
+
+    def _value(self, literal: int) -> bool | None:
+        current = self._values[abs(literal)]
+        return None if current is None else current == (literal > 0)
+
+
+    def _assign(self, literal: int) -> bool:
+        current = self._values[abs(literal)]
+        if current is not None:
+            return current == (literal > 0)
+        self._values[abs(literal)] = literal > 0
+        self._trail.append(literal)
+        return True
+
+
+    def _undo(self, start: int) -> None:
+        for literal in self._trail[start:]:
+            self._values[abs(literal)] = None
+        del self._trail[start:]
+
+
+    def _resume(self) -> bool:
+        """
+        Continues the search after a clause falsified by the current assignment was added.
+        Backjumps to the latest untried decision made no later than the last assignment in
+        the clause, since flipping any later decision would leave the clause false.
+
+        :return: False if the search space is exhausted, True otherwise.
+        """
+        clause = self._blocking
+        self._blocking = None
+        positions = {abs(literal): i for i, literal in enumerate(self._trail)}
+        clause.sort(key=lambda literal: positions[abs(literal)], reverse=True)
+        self._watch(len(self.clauses) - 1)
+
+        deepest: int = positions[abs(clause[0])]
+        while self._decisions and (self._decisions[-1][2] or self._decisions[-1][0] > deepest):
+            self._decisions.pop()
+        if not self._decisions:
+            self._empty = True
+            return False
+
+        # Flipping the decision satisfies the clause only if its variable occurs in it;
+        # otherwise the watches could be left on false literals, so start over instead.
+        start, literal, _ = self._decisions[-1]
+        if -literal not in clause:
+            return self._start()
+        return self._backtrack()
+
+
+    def _backtrack(self) -> bool:
+        """
+        Undoes assignments back to the most recent untried branch and takes that branch,
+        repeating while propagation fails.
+
+        :return: False if the search space is exhausted, True otherwise.
+        """
+        while True:
+            while self._decisions and self._decisions[-1][2]:
+                self._decisions.pop()
+            if not self._decisions:
+                self._empty = True
+                return False
+            start, literal, _ = self._decisions.pop()
+            self._undo(start)
+            self._decisions.append((start, -literal, True))
+            self._assign(-literal)
+            if self._propagate(start):
+                return True
+
+
+    def _propagate(self, position: int) -> bool:
+        """
+        Performs unit propagation for the assignments on the trail from position onwards.
+
+        :return: False if a clause is falsified, True otherwise.
+        """
+        trail = self._trail
+        while position < len(trail):
+            false_literal = -trail[position]
+            position += 1
+            watching = self._watches.get(false_literal, [])
+            kept: List[int] = []
+            for i, index in enumerate(watching):
+                clause = self.clauses[index]
+                if clause[0] == false_literal:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if self._value(clause[0]) is True:
+                    kept.append(index)
+                    continue
+
+                # Look for a replacement watch among the remaining literals
+                for k in range(2, len(clause)):
+                    if self._value(clause[k]) is not False:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self._watches.setdefault(clause[1], []).append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if not self._assign(clause[0]):
+                        kept.extend(watching[i + 1:])
+                        self._watches[false_literal] = kept
+                        return False
+            self._watches[false_literal] = kept
+        return True
+
+
+def enumerate_models(atoms: List[Atom] | AtomTable,
+                     sentence: Sentence | IndexedSentence) -> Iterator[List[bool]]:
+    """
+    Enumerates the models of a propositional sentence with a SAT solver, blocking each
+    model found before searching for the next. Each search resumes from the previous model
+    by backjumping rather than starting over, so assignments ruled out by an earlier
+    search are not revisited, although the search between two models is not bounded by a
+    polynomial. Models are produced in the order of itertools.product.
+
+    :param atoms: The atomic propositions of the agenda.
+    :param sentence: The propositional sentence in Polish notation, by atoms or atom ids.
+    :return: An iterator over the models, as lists of truth values ordered as in atoms.
+    """
+    clauses, num_vars = sentence_to_cnf(atoms, sentence)
+    solver = SatSolver(num_vars, clauses)
+    num_atoms: int = len(atoms)
+    while (solution := solver.solve()) is not None:
+        model = solution[1:num_atoms + 1]
+        yield model
+        solver.add_clause([-(i + 1) if value else i + 1 for i, value in enumerate(model)])
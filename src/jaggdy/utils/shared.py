@@ -0,0 +1,84 @@
+import numpy as np
+from typing import Tuple
+from numpy.typing import NDArray
+from multiprocessing.shared_memory import SharedMemory
+
+# The name, shape, and dtype of an array in shared memory, enough for another process to attach to it.
+type SharedArraySpec = Tuple[str, Tuple[int, ...], str]
+
+
+def share_array(array: NDArray, track: bool=True) -> Tuple[SharedMemory, SharedArraySpec]:
+    """
+    Copies an array into a new block of shared memory. The caller owns the block and
+    must close and unlink it once every process is done with it.
+
+    :param array: The array to be shared.
+    :param track: Whether the block is unlinked when this process exits. A worker process
+    handing the block over to its parent shares it untracked, and the parent unlinks it.
+    :return: The shared memory block together with the spec for attaching to it.
+    """
+    memory = SharedMemory(create=True, size=max(array.nbytes, 1), track=track)
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)
+    shared[...] = array
+    return memory, (memory.name, array.shape, array.dtype.str)
+
+
+def create_array(shape: Tuple[int, ...], dtype: type) -> Tuple[SharedMemory, NDArray, SharedArraySpec]:
+    """
+    Allocates a zeroed array in a new block of shared memory, for worker processes to write
+    their results into. The caller owns the block and must close and unlink it once every
+    process is done with it.
+
+    :param shape: The shape of the array.
+    :param dtype: The type of its entries.
+    :return: The shared memory block, the array it holds, and the spec for attaching to it.
+    """
+    dtype = np.dtype(dtype)
+    memory = SharedMemory(create=True, size=max(int(np.prod(shape, dtype=np.int64)) * dtype.itemsize, 1))
+    array = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    array[...] = 0
+    return memory, array, (memory.name, tuple(shape), dtype.str)
+
+
+def attach_array(spec: SharedArraySpec, writeable: bool=False) -> Tuple[SharedMemory, NDArray]:
+    """
+    Attaches to an array shared by share_array or create_array, read-only unless writeable.
+    The returned shared memory block must be kept alive, and closed, for as long as the
+    array is used.
+
+    :param spec: The spec returned by share_array or create_array.
+    :param writeable: Whether the array may be written to.
+    :return: The shared memory block together with the array it holds.
+    """
+    name, shape, dtype = spec
+    memory = SharedMemory(name=name, track=False)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf)
+    array.flags.writeable = writeable
+    return memory, array
+
+
+class _SharedBuffer:
+    """
+    Exposes the buffer of a block of shared memory, keeping the block open for as long as
+    an array over it is in use.
+    """
+    def __init__(self, memory: SharedMemory) -> None:
+        self.memory: SharedMemory = memory
+
+
+    def __buffer__(self, flags: int) -> memoryview:
+        return self.memory.buf.__buffer__(flags)
+
+
+def keep_array(memory: SharedMemory, array: NDArray) -> NDArray:
+    """
+    Returns an array over the same block of shared memory as one from create_array that
+    keeps the block open for as long as it, or any view of it, is in use, so that the
+    block can be unlinked once the workers are done with it without copying the array out.
+    The block must then not be closed by the caller.
+
+    :param memory: The shared memory block holding the array.
+    :param array: The array in the block.
+    :return: The array, no longer tied to the lifetime of memory.
+    """
+    return np.ndarray(array.shape, dtype=array.dtype, buffer=_SharedBuffer(memory))
@@ -0,0 +1,312 @@
+import os
+import numpy as np
+from typing import BinaryIO, Tuple
+from numpy.typing import NDArray
+
+
+def build_csr(rows: NDArray[np.int64], cols: NDArray[np.int64], num_rows: int) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Builds the compressed sparse row structure of a set of (row, col) pairs. Pairs with
+    the same row keep their relative order, and repeated pairs are kept.
+
+    :param rows: The row of each pair.
+    :param cols: The column of each pair.
+    :param num_rows: The number of rows.
+    :return: The row offsets, of length num_rows + 1, and the columns ordered by row; the
+    columns of row i are indices[offsets[i]:offsets[i + 1]].
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    order = np.argsort(rows, kind="stable")
+    offsets = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=offsets[1:])
+    return offsets, cols[order]
+
+
+def csr_label_counts(offsets: NDArray[np.int64], indices: NDArray[np.int64],
+                     labels: NDArray[np.int64], num_labels: int) -> NDArray[np.int64]:
+    """
+    Multiplies a 0/1 sparse matrix in compressed sparse row form by the one-hot encoding
+    of a vector of labels: entry (i, l) of the result counts the entries of row i whose
+    column carries label l. Leading dimensions of labels are treated as a batch.
+
+    :param offsets: The row offsets of the sparse matrix.
+    :param indices: The columns of the sparse matrix, ordered by row.
+    :param labels: An array of shape (..., columns) giving the label of each column.
+    :param num_labels: The number of distinct labels.
+    :return: An array of shape (..., rows, num_labels) of counts.
+    """
+    num_rows: int = len(offsets) - 1
+    batch_shape = labels.shape[:-1]
+    batch_size: int = int(np.prod(batch_shape, dtype=np.int64))
+    rows = np.repeat(np.arange(num_rows, dtype=np.int64), np.diff(offsets))
+
+    # Flatten (batch, row, label) triples into bins and count them
+    edge_labels = labels.reshape(batch_size, -1)[:, indices].astype(np.int64)
+    bins = (np.arange(batch_size, dtype=np.int64)[:, np.newaxis] * num_rows + rows) * num_labels + edge_labels
+    counts = np.bincount(bins.ravel(), minlength=batch_size * num_rows * num_labels)
+    return counts.reshape(batch_shape + (num_rows, num_labels))
+
+
+class CSRMatrix:
+    """
+    A real matrix in compressed sparse row form, so that memory scales with the number of
+    non-zero entries. Supports what the Markov chains need: products with dense and sparse
+    matrices, row access, and sums.
+
+    ATTRIBUTES:
+        shape (Tuple[int, int]): The number of rows and columns.
+        indptr (NDArray[np.int64]): The row offsets, of length rows + 1.
+        indices (NDArray[np.int64]): The column of each entry, in increasing order within each row.
+        data (NDArray[np.float64]): The value of each entry.
+    """
+    # Make NumPy defer to __rmatmul__ for dense @ sparse products
+    __array_ufunc__ = None
+
+    def __init__(self, indptr: NDArray[np.int64], indices: NDArray[np.int64], data: NDArray[np.float64],
+                 shape: Tuple[int, int]) -> None:
+        if len(indptr) != shape[0] + 1 or len(indices) != len(data):
+            raise ValueError("Sparse matrix structure does not match its shape.")
+        self.shape: Tuple[int, int] = shape
+        self.indptr: NDArray[np.int64] = np.asarray(indptr, dtype=np.int64)
+        self.indices: NDArray[np.int64] = np.asarray(indices, dtype=np.int64)
+        self.data: NDArray[np.float64] = np.asarray(data, dtype=np.float64)
+
+
+    @classmethod
+    def from_triplets(cls, rows: NDArray[np.int64], cols: NDArray[np.int64], data: NDArray[np.float64],
+                      shape: Tuple[int, int]) -> 'CSRMatrix':
+        """
+        :param rows: The row of each entry.
+        :param cols: The column of each entry.
+        :param data: The value of each entry; values of repeated positions are added.
+        :param shape: The number of rows and columns.
+        :return: The sparse matrix with the given entries.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        keys, inverse = np.unique(rows * shape[1] + cols, return_inverse=True)
+        values = np.bincount(inverse.ravel(), weights=np.asarray(data, dtype=np.float64), minlength=len(keys))
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // max(shape[1], 1), minlength=shape[0]), out=indptr[1:])
+        return cls(indptr, keys % max(shape[1], 1), values, shape)
+
+
+    @classmethod
+    def from_dense(cls, mat: NDArray) -> 'CSRMatrix':
+        """
+        :param mat: A dense matrix.
+        :return: The sparse matrix with the non-zero entries of mat.
+        """
+        mat = np.asarray(mat, dtype=np.float64)
+        if mat.ndim != 2:
+            mat = mat.reshape(len(mat), -1) if mat.size else mat.reshape(0, 0)
+        rows, cols = np.nonzero(mat)
+        return cls.from_triplets(rows, cols, mat[rows, cols], mat.shape)
+
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+
+    def toarray(self) -> NDArray[np.float64]:
+        """
+        :return: The matrix as a dense array.
+        """
+        dense = np.zeros(self.shape)
+        dense[self._entry_rows(), self.indices] = self.data
+        return dense
+
+
+    def row(self, i: int) -> Tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """
+        :param i: The index of a row.
+        :return: The columns and values of the entries in the row.
+        """
+        start, stop = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:stop], self.data[start:stop]
+
+
+    def take_rows(self, rows: NDArray[np.int64]) -> 'CSRMatrix':
+        """
+        :param rows: The indices of rows, possibly repeated.
+        :return: The matrix of those rows, in the given order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.indptr[rows + 1] - self.indptr[rows]
+        positions = np.repeat(self.indptr[rows] - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return CSRMatrix(indptr, self.indices[positions], self.data[positions], (len(rows), self.shape[1]))
+
+
+    def __getitem__(self, i: int) -> NDArray[np.float64]:
+        cols, values = self.row(i)
+        dense = np.zeros(self.shape[1])
+        dense[cols] = values
+        return dense
+
+
+    def sum(self, axis: int | None=None) -> NDArray[np.float64] | float:
+        if axis is None:
+            return float(self.data.sum())
+        if axis == 0:
+            return np.bincount(self.indices, weights=self.data, minlength=self.shape[1])
+        return np.bincount(self._entry_rows(), weights=self.data, minlength=self.shape[0])
+
+
+    def prune(self, tolerance: float) -> 'CSRMatrix':
+        """
+        :param tolerance: Entries of at most this magnitude are dropped.
+        :return: The matrix without its negligible entries.
+        """
+        keep = np.abs(self.data) > tolerance
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._entry_rows()[keep], minlength=self.shape[0]), out=indptr[1:])
+        return CSRMatrix(indptr, self.indices[keep], self.data[keep], self.shape)
+
+
+    def __matmul__(self, other: 'CSRMatrix | NDArray') -> 'CSRMatrix | NDArray':
+        if self.shape[1] != other.shape[0]:
+            raise ValueError("Matrices must be compatible for multiplication.")
+        if not isinstance(other, CSRMatrix):
+            other = np.asarray(other, dtype=np.float64)
+            products = self.data.reshape((-1,) + (1,) * (other.ndim - 1)) * other[self.indices]
+            result = np.zeros((self.shape[0],) + other.shape[1:])
+            np.add.at(result, self._entry_rows(), products)
+            return result
+
+        # Each entry (i, j) of self meets every entry (j, k) of other in row j
+        lengths = np.diff(other.indptr)[self.indices]
+        starts = np.repeat(other.indptr[self.indices] - (np.cumsum(lengths) - lengths), lengths)
+        positions = starts + np.arange(lengths.sum(), dtype=np.int64)
+        return CSRMatrix.from_triplets(
+            np.repeat(self._entry_rows(), lengths),
+            other.indices[positions],
+            np.repeat(self.data, lengths) * other.data[positions],
+            (self.shape[0], other.shape[1])
+        )
+
+
+    def __rmatmul__(self, other: NDArray) -> NDArray:
+        other = np.asarray(other, dtype=np.float64)
+        if other.shape[-1] != self.shape[0]:
+            raise ValueError("Matrices must be compatible for multiplication.")
+        products = other[..., self._entry_rows()] * self.data
+        result = np.zeros(other.shape[:-1] + (self.shape[1],))
+        np.add.at(result, (..., self.indices), products)
+        return result
+
+
+    def save(self, prefix: str) -> None:
+        """
+        Writes the matrix to the files read by load.
+
+        :param prefix: The path of the files without their extensions.
+        """
+        writer = CSRFileWriter(prefix, self.shape[1])
+        writer.append(np.diff(self.indptr), self.indices, self.data)
+        writer.close()
+
+
+    @classmethod
+    def load(cls, prefix: str, num_cols: int) -> 'CSRMatrix':
+        """
+        Reads a matrix written by save or by a CSRFileWriter, memory-mapping its arrays
+        read-only, so that only the parts that are used are read from disk.
+
+        :param prefix: The path of the files without their extensions.
+        :param num_cols: The number of columns.
+        :return: The matrix.
+        """
+        arrays = [_map_file(f"{prefix}.{name}", dtype)
+                  for name, dtype in [("indptr", np.int64), ("indices", np.int64), ("data", np.float64)]]
+        return cls(*arrays, (len(arrays[0]) - 1, num_cols))
+
+
+    def _entry_rows(self) -> NDArray[np.int64]:
+        return np.repeat(np.arange(self.shape[0], dtype=np.int64), np.diff(self.indptr))
+
+
+class CSRFileWriter:
+    """
+    Writes a matrix in compressed sparse row form to files one block of rows at a time, so
+    that a matrix larger than memory can be built. The indptr, indices, and data of the
+    matrix are stored as raw arrays in the files prefix.indptr, prefix.indices, and
+    prefix.data, which only replace existing files once the writer is closed, so that
+    matrices already mapped from them stay valid.
+
+    ATTRIBUTES:
+        prefix (str): The path of the files without their extensions.
+        num_cols (int): The number of columns.
+        nnz (int): The number of entries written so far.
+        indices_path (str): The file the columns of the entries are written to until the
+        writer is closed.
+    """
+    def __init__(self, prefix: str, num_cols: int) -> None:
+        self.prefix: str = prefix
+        self.num_cols: int = num_cols
+        self.nnz: int = 0
+        self.indices_path: str = f"{prefix}.indices.tmp"
+        self._files: Tuple[BinaryIO, ...] = tuple(
+            open(f"{prefix}.{name}.tmp", "wb") for name in ("indptr", "indices", "data")
+        )
+        np.zeros(1, dtype=np.int64).tofile(self._files[0])
+
+
+    def append(self, lengths: NDArray[np.int64], indices: NDArray[np.int64], data: NDArray[np.float64]) -> None:
+        """
+        Writes the next rows of the matrix.
+
+        :param lengths: The number of entries of each row.
+        :param indices: The columns of the entries of the rows, ordered by row.
+        :param data: The values of the entries.
+        """
+        if int(np.sum(lengths)) != len(indices) or len(indices) != len(data):
+            raise ValueError("Sparse matrix structure does not match its shape.")
+        (self.nnz + np.cumsum(lengths, dtype=np.int64)).tofile(self._files[0])
+        np.asarray(indices, dtype=np.int64).tofile(self._files[1])
+        np.asarray(data, dtype=np.float64).tofile(self._files[2])
+        self.nnz += len(indices)
+
+
+    def reserve(self, lengths: NDArray[np.int64], data: NDArray[np.float64]) -> int:
+        """
+        Writes the next rows of the matrix except for the columns of their entries, which
+        are left as zeros in indices_path for other processes to fill in, as raw int64,
+        before the writer is closed.
+
+        :param lengths: The number of entries of each row.
+        :param data: The values of the entries.
+        :return: The position in indices_path of the first entry of the rows.
+        """
+        if int(np.sum(lengths)) != len(data):
+            raise ValueError("Sparse matrix structure does not match its shape.")
+        start: int = self.nnz
+        (self.nnz + np.cumsum(lengths, dtype=np.int64)).tofile(self._files[0])
+        np.asarray(data, dtype=np.float64).tofile(self._files[2])
+        self.nnz += len(data)
+        self._files[1].truncate(self.nnz * np.dtype(np.int64).itemsize)
+        self._files[1].seek(0, os.SEEK_END)
+        return start
+
+
+    def close(self) -> CSRMatrix:
+        """
+        :return: The matrix written, memory-mapped from its files.
+        """
+        for name, file in zip(("indptr", "indices", "data"), self._files):
+            file.close()
+            os.replace(f"{self.prefix}.{name}.tmp", f"{self.prefix}.{name}")
+        return CSRMatrix.load(self.prefix, self.num_cols)
+
+
+def _map_file(path: str, dtype: type) -> NDArray:
+    """
+    :return: The raw array in the file, memory-mapped read-only.
+    """
+    if os.path.getsize(path) == 0:
+        # Empty files cannot be memory-mapped
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
@@ -4,7 +4,9 @@ from numpy.typing import NDArray
 from src.jaggdy.utils.enums import Z2, Logic, Prop
 
 type Interpretation = List[Z2]
+type Atom = Prop | str
 type Sentence = List[Logic | Prop]
+type IndexedSentence = List[Logic | int]
 type Beliefs = Dict[Prop, Z2]
 type Connection = Tuple[int, int]
 type Matrix = NDArray
@@ -1,23 +1,190 @@
 import numpy as np
-from typing import List
-# remove beliefs
-from src.jaggdy.utils.types import Interpretation, Sentence, Beliefs, Matrix, MatrixZ2
+from math import factorial
+from fractions import Fraction
+from typing import List, Callable, Iterator, Tuple
+from numpy.typing import NDArray
+from src.jaggdy.utils.types import (Interpretation, Sentence, IndexedSentence,
+                                   Atom, Matrix, MatrixZ2)
 from src.jaggdy.utils.enums import Prop, Logic, Z2
+from src.jaggdy.utils.atoms import AtomTable
+from src.jaggdy.utils.sparse import CSRMatrix
+from src.jaggdy.utils.markov import AbsorptionAnalysis
 
-# TODO: remove beliefs from evaluate_sentence
-# TODO: See if can simplify matrix utils with where
 def hamming_distance(vec1: Interpretation, vec2: Interpretation) -> int:
     if len(vec1) != len(vec2):
         raise ValueError("List lengths are not equal.")
     return sum((a.value ^ b.value) for a, b in zip(vec1, vec2))
 
+def pack_rows(table: NDArray[np.bool_]) -> NDArray[np.uint64]:
+    """
+    Packs the rows of a boolean matrix into 64-bit words. Column k is stored in bit
+    k % 64 of word k // 64, so each row occupies ceil(columns / 64) words.
+
+    :param table: A boolean matrix whose rows are interpretations.
+    :return: A (rows x words) matrix of packed interpretations.
+    """
+    rows, cols = table.shape
+    num_words: int = -(-cols // 64)
+    padded = np.zeros((rows, num_words * 64), dtype=np.uint64)
+    padded[:, :cols] = table
+    shifts = np.arange(64, dtype=np.uint64)
+    return np.bitwise_or.reduce(padded.reshape(rows, num_words, 64) << shifts, axis=2)
+
+def unpack_rows(words: NDArray[np.uint64], num_atoms: int) -> NDArray[np.bool_]:
+    """
+    Inverse of pack_rows.
+
+    :param words: A (rows x words) matrix of packed interpretations.
+    :param num_atoms: The number of atomic propositions in each interpretation.
+    :return: A boolean matrix whose rows are the unpacked interpretations.
+    """
+    shifts = np.arange(64, dtype=np.uint64)
+    bits = (words[:, :, np.newaxis] >> shifts) & np.uint64(1)
+    return bits.reshape(words.shape[0], words.shape[1] * 64)[:, :num_atoms].astype(np.bool_)
+
+def pack_interpretations(interps: List[Interpretation], num_atoms: int | None=None) -> NDArray[np.uint64]:
+    """
+    :param interps: Vectors over Z2 of equal length.
+    :param num_atoms: The length of each vector; only needed when interps is empty.
+    :return: A (len(interps) x words) matrix of packed interpretations.
+    """
+    if num_atoms is None:
+        num_atoms = len(interps[0]) if interps else 0
+    table = np.array([interpretation_to_ints(interp) for interp in interps], dtype=np.bool_)
+    return pack_rows(table.reshape(len(interps), num_atoms))
+
+def unpack_interpretations(words: NDArray[np.uint64], num_atoms: int) -> List[Interpretation]:
+    """
+    :param words: A (rows x words) matrix of packed interpretations.
+    :param num_atoms: The number of atomic propositions in each interpretation.
+    :return: The unpacked interpretations as vectors over Z2.
+    """
+    values = (Z2.ZERO, Z2.ONE)
+    return [[values[value] for value in row] for row in unpack_rows(words, num_atoms).tolist()]
+
+def packed_hamming_distances(words1: NDArray[np.uint64], words2: NDArray[np.uint64]) -> NDArray[np.int64]:
+    """
+    Computes the Hamming distance between every pair of packed interpretations by
+    XOR and popcount over whole words.
+
+    :param words1: A (rows1 x words) matrix of packed interpretations.
+    :param words2: A (rows2 x words) matrix of packed interpretations.
+    :return: A (rows1 x rows2) matrix whose (i, j) entry is the distance between row i
+    of words1 and row j of words2.
+    """
+    if words1.shape[1] != words2.shape[1]:
+        raise ValueError("Packed interpretations must have the same number of words.")
+    differences = np.bitwise_xor(words1[:, np.newaxis, :], words2[np.newaxis, :, :])
+    return np.bitwise_count(differences).sum(axis=2, dtype=np.int64)
+
+def sample_minimizers(costs: NDArray, rng: np.random.Generator) -> NDArray[np.int64]:
+    """
+    For each vector of costs along the last axis, picks the position of one of its
+    minima uniformly at random.
+
+    :param costs: An array of costs whose last axis ranges over the candidates.
+    :param rng: The random number generator used to break ties.
+    :return: An array, with the last axis of costs removed, of the chosen positions.
+    """
+    minimal = costs == costs.min(axis=-1, keepdims=True)
+    keys = np.where(minimal, rng.random(costs.shape), -1.)
+    return keys.argmax(axis=-1)
+
+def state_code_weights(num_models: int, num_agents: int) -> NDArray:
+    """
+    :param num_models: The number of models each agent may hold.
+    :param num_agents: The number of agents.
+    :return: The place value of each agent in the mixed-radix code of a state, with the
+    first agent most significant. The weights are Python integers if the largest code
+    does not fit in 64 bits.
+    """
+    exponents = range(num_agents - 1, -1, -1)
+    if num_agents == 0 or num_models ** num_agents <= np.iinfo(np.int64).max:
+        return np.array([num_models ** e for e in exponents], dtype=np.int64)
+    return np.array([num_models ** e for e in exponents], dtype=np.object_)
+
+def encode_states(agent_models: NDArray[np.int64], num_models: int) -> NDArray:
+    """
+    Encodes states, given by the model index of each agent, as integers in base num_models.
+    Codes increase in the order in which itertools.product enumerates the states.
+
+    :param agent_models: An array of shape (..., agents) of model indices.
+    :param num_models: The number of models each agent may hold.
+    :return: An array of shape (...) of the codes of the states.
+    """
+    weights = state_code_weights(num_models, agent_models.shape[-1])
+    return np.matmul(agent_models.astype(weights.dtype), weights)
+
+def compositions(total: int, parts: int) -> Iterator[Tuple[int, ...]]:
+    """
+    Generates every way of writing total as an ordered sum of parts non-negative integers,
+    in lexicographic order.
+
+    :param total: The sum.
+    :param parts: The number of summands.
+    :return: An iterator over tuples of summands.
+    """
+    if parts == 0:
+        if total == 0:
+            yield ()
+        return
+    if parts == 1:
+        yield (total,)
+        return
+    for first in range(total + 1):
+        for rest in compositions(total - first, parts - 1):
+            yield (first,) + rest
+
+def multiset_permutations(counts: Tuple[int, ...]) -> Iterator[Tuple[int, ...]]:
+    """
+    Generates every distinct sequence in which each label m appears counts[m] times,
+    in lexicographic order.
+
+    :param counts: The number of occurrences of each label.
+    :return: An iterator over tuples of labels.
+    """
+    if sum(counts) == 0:
+        yield ()
+        return
+    for label, count in enumerate(counts):
+        if count > 0:
+            rest_counts = counts[:label] + (count - 1,) + counts[label + 1:]
+            for rest in multiset_permutations(rest_counts):
+                yield (label,) + rest
+
+def multinomial_probability(counts: Tuple[int, ...], exact: bool=False) -> float | Fraction:
+    """
+    :param counts: How many of sum(counts) independent uniform choices among len(counts)
+    outcomes fall on each outcome.
+    :param exact: If True, return the probability as a Fraction.
+    :return: The probability of exactly those counts.
+    """
+    coefficient: int = factorial(sum(counts))
+    for count in counts:
+        coefficient //= factorial(count)
+    if exact:
+        return Fraction(coefficient, len(counts) ** sum(counts))
+    return coefficient / len(counts) ** sum(counts)
+
 def ints_to_interpretation(nums: List[int]) -> Interpretation:
     return [Z2(a % 2) for a in nums]
 
 def interpretation_to_ints(interp: Interpretation) -> List[int]:
     return [0 if z == Z2.ZERO else 1 for z in interp]
 
-def strs_to_sentence(strs: List[str]) -> Sentence:
+def strs_to_sentence(strs: List[str], atoms: AtomTable | None=None) -> Sentence | IndexedSentence:
+    """
+    Parses a sentence given as a list of strings. Without an atom table, atoms must be
+    values of the Prop enum; with one, atoms may be any name in the table and are
+    replaced by their ids.
+
+    :param strs: The symbols of the sentence in Polish notation.
+    :param atoms: An optional table of the atoms in the agenda.
+    :return: The sentence as Logic and Prop members, or as Logic members and atom ids.
+    """
+    if atoms is not None:
+        return atoms.index_sentence(strs)
+
     def symbol_to_enum(symbol: str) -> Prop | Logic:
         try:
             res = Prop(symbol)
@@ -55,21 +222,19 @@ def use_operation(symbol: Logic, *args: Z2) -> Z2:
         return Z2.ONE if res else Z2.ZERO
     return res
 
-def evaluate_sentence(atoms: List[Prop], interpretation: Interpretation, sentence: Sentence) -> bool:
-    if len(atoms) == 0 or len(interpretation) == 0:
-        raise ValueError("Empty atoms or interpretation not allowed.")
-    if len(atoms) != len(interpretation):
-        raise ValueError("The length of the interpretation is not equal to the number of atomic propositions.")
+def evaluate_indexed_sentence(interpretation: Interpretation, sentence: IndexedSentence) -> bool:
+    """
+    Evaluates a sentence whose atoms are given by their ids, i.e. their positions
+    in the interpretation.
+
+    :param interpretation: The truth values of the atoms, indexed by id.
+    :param sentence: The propositional sentence in Polish notation.
+    :return: Whether the interpretation satisfies the sentence.
+    """
     if sentence == []:
         return True
 
-    # rewrite without beliefs (more efficient too)
     stack: List[Z2] = list()
-    interp: Beliefs = dict(zip(
-        atoms,
-        interpretation
-    ))
-
     for symbol in reversed(sentence):
         if isinstance(symbol, Logic):
             if symbol == Logic.NOT:
@@ -80,38 +245,157 @@ def evaluate_sentence(atoms: List[Prop], interpretation: Interpretation, sentenc
                 first = stack.pop()
                 stack.append(use_operation(symbol, second, first))
         else:
-            stack.append(interp[symbol])
+            stack.append(interpretation[symbol])
 
     return bool(stack[0])
 
-# can improve with where method?
+def normalize_sentence(sentence: IndexedSentence) -> IndexedSentence:
+    """
+    Rewrites a sentence whose atoms are given by their ids into a canonical form: the
+    operands of nested conjunctions, and of nested disjunctions, are gathered and sorted,
+    and the two operands of each biconditional are sorted, so that sentences differing only
+    in the order of operands of commutative connectives, such as a list of constraints in
+    another order, are written alike.
+
+    :param sentence: The propositional sentence in Polish notation.
+    :return: The equivalent sentence in canonical form, in Polish notation.
+    """
+    def order(operand: IndexedSentence) -> Tuple[Tuple[int, str | int], ...]:
+        return tuple((0, symbol.value) if isinstance(symbol, Logic) else (1, symbol) for symbol in operand)
+
+    # Each entry is a normalized subsentence together with its gathered operands, if it is
+    # a conjunction or a disjunction
+    stack: List[Tuple[IndexedSentence, List[IndexedSentence] | None]] = list()
+    for symbol in reversed(sentence):
+        if symbol == Logic.NOT:
+            stack.append(([symbol] + stack.pop()[0], None))
+        elif symbol in (Logic.AND, Logic.OR):
+            operands: List[IndexedSentence] = []
+            for operand, gathered in (stack.pop(), stack.pop()):
+                operands += gathered if gathered is not None and operand[0] == symbol else [operand]
+            operands.sort(key=order)
+            stack.append(([symbol] * (len(operands) - 1) + [s for operand in operands for s in operand], operands))
+        elif symbol == Logic.IFF:
+            first, second = sorted((stack.pop()[0], stack.pop()[0]), key=order)
+            stack.append(([symbol] + first + second, None))
+        elif isinstance(symbol, Logic):
+            first, second = stack.pop()[0], stack.pop()[0]
+            stack.append(([symbol] + first + second, None))
+        else:
+            stack.append(([symbol], None))
+    return stack[0][0] if stack else []
+
+def evaluate_sentence(atoms: List[Atom] | AtomTable, interpretation: Interpretation, sentence: Sentence) -> bool:
+    if len(atoms) == 0 or len(interpretation) == 0:
+        raise ValueError("Empty atoms or interpretation not allowed.")
+    if len(atoms) != len(interpretation):
+        raise ValueError("The length of the interpretation is not equal to the number of atomic propositions.")
+    if sentence == []:
+        return True
+
+    atom_table = atoms if isinstance(atoms, AtomTable) else AtomTable(atoms)
+    return evaluate_indexed_sentence(interpretation, atom_table.index_sentence(sentence))
+
+def truth_table(num_atoms: int, start: int=0, stop: int | None=None) -> NDArray[np.bool_]:
+    """
+    Returns rows start through stop of the truth table over num_atoms atomic propositions
+    as a boolean matrix. Rows are ordered as in itertools.product([Z2(0), Z2(1)], repeat=num_atoms),
+    so the first atom is the most significant bit of the row index.
+
+    :param num_atoms: The number of atomic propositions, i.e. the number of columns.
+    :param start: The index of the first row to return.
+    :param stop: The index after the last row to return; defaults to 2 ** num_atoms.
+    :return: A boolean matrix whose rows are assignments of truth values to the atoms.
+    """
+    if stop is None:
+        stop = 1 << num_atoms
+    rows = np.arange(start, stop, dtype=np.int64)
+    shifts = np.arange(num_atoms - 1, -1, -1, dtype=np.int64)
+    return ((rows[:, np.newaxis] >> shifts) & 1).astype(np.bool_)
+
+def compile_sentence(atoms: List[Atom] | AtomTable,
+                     sentence: Sentence | IndexedSentence) -> Callable[[NDArray[np.bool_]], NDArray[np.bool_]]:
+    """
+    Compiles a propositional sentence in Polish notation into a NumPy program over
+    boolean columns. The returned function takes a boolean matrix whose rows are
+    interpretations (columns ordered as in atoms) and evaluates the sentence on
+    every row at once.
+
+    :param atoms: The atomic propositions, in the order of the table's columns.
+    :param sentence: The propositional sentence in Polish notation, by atoms or atom ids.
+    :return: A function mapping a (rows x len(atoms)) boolean matrix to a boolean vector.
+    """
+    operations = {
+        Logic.AND: np.logical_and,
+        Logic.OR: np.logical_or,
+        Logic.IMPLIES: lambda p, q: np.logical_or(np.logical_not(p), q),
+        Logic.IFF: np.equal
+    }
+    atom_table = atoms if isinstance(atoms, AtomTable) else AtomTable(atoms)
+
+    # Resolve every symbol once, checking that the sentence is well-formed
+    program: IndexedSentence = list(reversed(atom_table.index_sentence(sentence)))
+    depth: int = 0
+    for symbol in program:
+        if isinstance(symbol, Logic):
+            arity = 1 if symbol == Logic.NOT else 2
+            if depth < arity:
+                raise ValueError("Sentence is not well-formed.")
+            depth -= arity - 1
+        else:
+            depth += 1
+    if sentence and depth != 1:
+        raise ValueError("Sentence is not well-formed.")
+
+    def evaluate(table: NDArray[np.bool_]) -> NDArray[np.bool_]:
+        if not program:
+            return np.ones(table.shape[0], dtype=np.bool_)
+
+        stack: List[NDArray[np.bool_]] = []
+        for instruction in program:
+            if instruction == Logic.NOT:
+                stack.append(np.logical_not(stack.pop()))
+            elif isinstance(instruction, Logic):
+                first = stack.pop()
+                second = stack.pop()
+                stack.append(operations[instruction](first, second))
+            else:
+                stack.append(table[:, instruction])
+        return stack[0]
+
+    return evaluate
+
 def matrix_z2_to_matrix(mat: MatrixZ2) -> Matrix:
     if np.array_equal(mat, np.array([])):
         return np.array([])
+    return np.where(mat == Z2.ZERO, 0., 1.)
 
-    rows, cols = mat.shape
-    res = np.ones((rows, cols))
-    for i in range(rows):
-        for j in range(cols):
-            if mat[i, j] == Z2.ZERO:
-                res[i, j] = 0
-    return res
-
-# can improve with where method?
 def matrix_to_matrix_z2(mat: Matrix) -> MatrixZ2:
     if np.array_equal(mat, np.array([])):
         return np.array([])
+    return np.where(np.asarray(mat) % 2 == 0, Z2.ZERO, Z2.ONE)
 
-    rows, cols = mat.shape
-    res: MatrixZ2 = np.empty((rows, cols), dtype=object)
-    for i in range(rows):
-        for j in range(cols):
-            res[i, j] = Z2(mat[i, j])
-    return res
+def matrix_to_bits(mat: MatrixZ2 | Matrix) -> NDArray[np.uint8]:
+    """
+    Converts a matrix over Z2, given either with Z2 entries or with integer entries,
+    into a native uint8 matrix of zeros and ones.
+
+    :param mat: A matrix over Z2.
+    :return: The same matrix with uint8 entries.
+    """
+    mat = np.asarray(mat)
+    if mat.dtype == np.object_:
+        return np.where(mat == Z2.ZERO, 0, 1).astype(np.uint8)
+    return (mat % 2).astype(np.uint8)
+
+def find_stationary(mat: Matrix | CSRMatrix) -> Matrix | CSRMatrix:
+    """
+    Computes the long-run transition matrix of a Markov chain by absorption analysis: the
+    (Cesàro) limit of the powers of the transition matrix, without computing any powers.
 
-def find_stationary(mat: Matrix) -> Matrix:
-    stationary = np.linalg.matrix_power(mat, 1_000_000)
-    stationary = np.where(
-        np.isclose(stationary, 0), 0, stationary
-    )
-    return stationary
\ No newline at end of file
+    :param mat: A transition matrix, dense or sparse.
+    :return: The limit matrix, dense or sparse as mat is.
+    """
+    if isinstance(mat, CSRMatrix):
+        return AbsorptionAnalysis(mat).limit_matrix()
+    return AbsorptionAnalysis(CSRMatrix.from_dense(mat)).limit_matrix().toarray()
@@ -0,0 +1,39 @@
+import pytest
+from src.jaggdy.utils.atoms import AtomTable
+from src.jaggdy.utils.enums import Logic, Prop
+
+
+def test_atom_table():
+    table = AtomTable([Prop.P, Prop.Q, "a12"])
+    assert len(table) == 3
+    assert list(table) == [Prop.P, Prop.Q, "a12"]
+    assert table.index(Prop.Q) == 1
+    assert table.index("p") == 0
+    assert table.index("a12") == 2
+    assert table[2] == "a12"
+    assert Prop.P in table and "q" in table and Prop.R not in table
+    assert table.add(Prop.R) == 3
+
+    table = AtomTable([f"a{i}" for i in range(500)])
+    assert table.index("a499") == 499
+
+    with pytest.raises(ValueError, match="Atoms in the agenda must be distinct."):
+        AtomTable([Prop.P, "p"])
+    with pytest.raises(ValueError, match="Atoms must be of type Prop or str."):
+        AtomTable([1])
+    with pytest.raises(ValueError, match="Sentence contains an atom not in the agenda."):
+        AtomTable([Prop.P]).index(Prop.Q)
+
+def test_index_sentence():
+    table = AtomTable([Prop.P, Prop.Q, "r1"])
+    assert table.index_sentence([]) == []
+    assert table.index_sentence([Logic.AND, Prop.P, Prop.Q]) == [Logic.AND, 0, 1]
+    assert table.index_sentence(["->", "r1", "~", "q"]) == [Logic.IMPLIES, 2, Logic.NOT, 1]
+    assert table.index_sentence([Logic.OR, 0, 2]) == [Logic.OR, 0, 2]
+
+    with pytest.raises(ValueError, match="Sentence contains an atom not in the agenda."):
+        table.index_sentence([Logic.AND, Prop.P, Prop.R])
+    with pytest.raises(ValueError, match="Sentence contains an atom not in the agenda."):
+        table.index_sentence([Logic.AND, 0, 3])
+    with pytest.raises(ValueError, match="Symbol is neither a valid atom nor Logic."):
+        table.index_sentence(["&", "p", "r2"])
@@ -1,4 +1,6 @@
+import pytest
 from src.jaggdy.BeliefBase import BeliefBase
+from src.jaggdy.utils.cache import ArrayCache
 from src.jaggdy.utils.enums import Logic, Prop, Z2
 
 def test_get_constraints():
@@ -29,3 +31,98 @@ def test_get_models():
 
     K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.NOT, Prop.P], [Logic.OR, Prop.P, Prop.R]])
     assert make_set(K.models) == make_set([[Z2(0), Z2(1), Z2(1)], [Z2(0), Z2(0), Z2(1)]])
+
+def test_get_models_truth_table():
+    sentences = [
+        [],
+        [[Logic.AND, Prop.P, Logic.NOT, Prop.P]],
+        [[Logic.IFF, Prop.R, Logic.IMPLIES, Prop.P, Prop.Q]],
+        [[Logic.NOT, Prop.P], [Logic.OR, Prop.P, Prop.R]],
+        [[Logic.OR, Prop.S, Prop.T], [Logic.IMPLIES, Logic.AND, Prop.P, Prop.Q, Logic.IFF, Prop.R, Prop.T]],
+    ]
+    for constraints in sentences:
+        K = BeliefBase([Prop.P, Prop.Q, Prop.R, Prop.S, Prop.T], constraints)
+        assert K.models == K.get_models(method="reference")
+
+    with pytest.raises(ValueError, match="Unknown model enumeration method sympy."):
+        K.get_models(method="sympy")
+
+def test_get_models_sat():
+    sentences = [
+        [],
+        [[Logic.AND, Prop.P, Logic.NOT, Prop.P]],
+        [[Logic.IFF, Prop.R, Logic.IMPLIES, Prop.P, Prop.Q]],
+        [[Logic.OR, Prop.S, Prop.T], [Logic.IMPLIES, Logic.AND, Prop.P, Prop.Q, Logic.IFF, Prop.R, Prop.T]],
+    ]
+    for constraints in sentences:
+        K = BeliefBase([Prop.P, Prop.Q, Prop.R, Prop.S, Prop.T], constraints)
+        assert K.get_models(method="sat") == K.get_models(method="truth_table")
+
+def test_iter_models():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.IMPLIES, Prop.P, Prop.Q]])
+    assert K._models is None
+
+    models = K.iter_models()
+    assert next(models) == [Z2(0), Z2(0), Z2(1)]
+    assert next(models) == [Z2(0), Z2(1), Z2(1)]
+    assert K._models is None
+
+    for method in ["truth_table", "sat", "reference"]:
+        assert list(K.iter_models(method)) == K.models
+    assert K._models is not None
+
+    with pytest.raises(ValueError, match="Unknown model enumeration method sympy."):
+        K.iter_models("sympy")
+
+def test_count_models():
+    K = BeliefBase([Prop.P, Prop.Q], [])
+    assert K.count_models() == 4
+    assert K._models is None
+
+    K = BeliefBase([Prop.P, Prop.Q], [[Logic.AND, Prop.P, Logic.NOT, Prop.P]])
+    assert K.count_models() == 0
+
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.IMPLIES, Prop.P, Prop.Q]])
+    assert K.count_models() == 4
+    assert K.count_models() == len(K.models)
+
+def test_named_atoms():
+    K = BeliefBase(["a", "b", Prop.R], [["<->", "r", "->", "a", "b"]])
+    assert K.indexed_constraints == [Logic.IFF, 2, Logic.IMPLIES, 0, 1]
+    assert K.models == BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.IMPLIES, Prop.P, Prop.Q]]).models
+
+    # A chain of implications over many atoms has one model per cut point
+    atoms = [f"a{i}" for i in range(200)]
+    constraints = [[Logic.IMPLIES, atoms[i + 1], atoms[i]] for i in range(len(atoms) - 1)]
+    K = BeliefBase(atoms, constraints)
+    assert len(K.models) == len(atoms) + 1
+    assert K.models[0] == [Z2(0)] * len(atoms)
+    assert K.models[-1] == [Z2(1)] * len(atoms)
+
+    with pytest.raises(ValueError, match="Sentence contains an atom not in the agenda."):
+        BeliefBase([Prop.P], [[Logic.AND, Prop.P, Prop.Q]])
+
+def test_cached_models(tmp_path):
+    cache = ArrayCache(str(tmp_path))
+    constraints = [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]]
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], constraints, cache=cache)
+    assert K.models == BeliefBase([Prop.P, Prop.Q, Prop.R], constraints).models
+    assert cache.stats()["misses"] == 1
+
+    # The same atoms by name and the same constraints hit the entry
+    L = BeliefBase(["p", "q", "r"], [["<->", "r", "&", "p", "q"]], cache=cache)
+    assert L.models == K.models
+    assert cache.stats()["hits"] == 1
+    assert BeliefBase([Prop.P, Prop.Q, Prop.R], [], cache=cache).packed_models.words.shape == (8, 1)
+    assert cache.stats()["misses"] == 2
+
+    # Constraints in another order, or with commuted operands, hit the entry too
+    constraints = [[Logic.OR, Prop.P, Prop.Q], [Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]]
+    M = BeliefBase([Prop.P, Prop.Q, Prop.R], constraints, cache=cache)
+    N = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Logic.AND, Prop.Q, Prop.P, Prop.R],
+                                              [Logic.OR, Prop.Q, Prop.P]], cache=cache)
+    assert M.cache_key() == N.cache_key()
+    assert M.cache_key() != BeliefBase([Prop.P, Prop.Q, Prop.R], constraints[:1]).cache_key()
+    assert M.cache_key() != BeliefBase([Prop.P, Prop.Q, Prop.R],
+                                       [[Logic.IMPLIES, Prop.Q, Prop.P], constraints[1]]).cache_key()
+    assert N.models == M.models
@@ -0,0 +1,73 @@
+import os
+import time
+import pytest
+import numpy as np
+from src.jaggdy.utils.cache import ArrayCache
+from src.jaggdy.utils.enums import Prop, Logic
+
+
+def test_cache_key():
+    key = ArrayCache.key("a", [1, Prop.P], np.arange(3))
+    assert key == ArrayCache.key("a", [1, Prop.P], np.arange(3))
+    assert len(key) == 64
+    assert key != ArrayCache.key("a", [1, Prop.Q], np.arange(3))
+    assert key != ArrayCache.key("a", [1, Prop.P], np.arange(3, dtype=np.int32))
+    assert key != ArrayCache.key("a", [1, Prop.P], np.arange(3).reshape(1, 3))
+    assert ArrayCache.key("1") != ArrayCache.key(1)
+    assert ArrayCache.key(["a", "b"]) != ArrayCache.key(["ab"])
+    assert ArrayCache.key(Logic.AND) != ArrayCache.key("&")
+    with pytest.raises(ValueError, match="Cannot hash values of type float."):
+        ArrayCache.key(1.5)
+
+
+def test_array_cache(tmp_path):
+    cache = ArrayCache(str(tmp_path), max_bytes=2000)
+    assert cache.get("x") is None
+    cache.put("x", {"a": np.arange(4), "b": np.eye(2)})
+    entry = cache.get("x")
+    assert np.array_equal(entry["a"], np.arange(4))
+    assert np.array_equal(entry["b"], np.eye(2))
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.stats()["entries"] == 1
+
+    # The least recently used entry is evicted once the cache is full
+    cache.put("y", {"a": np.zeros(100)})
+    os.utime(tmp_path / "y.npz", (time.time() - 10, time.time() - 10))
+    cache.get("x")
+    cache.put("z", {"a": np.zeros(100)})
+    assert cache.get("y") is None
+    assert cache.get("x") is not None and cache.get("z") is not None
+    assert cache.stats()["bytes"] <= 2000
+
+    assert not list(tmp_path.glob("*.tmp"))
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+
+def test_unreadable_entries(tmp_path, monkeypatch):
+    cache = ArrayCache(str(tmp_path))
+    cache.put("x", {"a": np.arange(1000)})
+    with open(tmp_path / "x.npz", "r+b") as file:
+        file.truncate(100)
+    assert cache.get("x") is None
+    assert not (tmp_path / "x.npz").exists()
+    (tmp_path / "y.npz").write_bytes(b"not an archive")
+    assert cache.get("y") is None
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 0
+
+    # An entry evicted by another process while it is being read is a miss
+    cache.put("z", {"a": np.arange(3)})
+    def evicted(path):
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(os, "utime", evicted)
+    assert cache.get("z") is None
+    assert cache.stats()["misses"] == 3
+
+    # Entries evicted by another process while the cache is listed are skipped
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda directory: listdir(directory) + ["gone.npz"])
+    assert cache.stats()["entries"] == 1
+    cache.max_bytes = 0
+    cache.put("w", {"a": np.arange(3)})
+    assert cache.stats()["entries"] == 1
@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 from typing import List
 from src.jaggdy.Graph import Graph
 from src.jaggdy.BeliefBase import BeliefBase
@@ -214,3 +215,103 @@ def test_update():
         G.update()
         for agent in G.agents:
             assert agent in [[Z2(1), Z2(0), Z2(0)], [Z2(0), Z2(0), Z2(1)], [Z2(1), Z2(1), Z2(1)]]
+
+def test_hamming_distance_rule_long_models():
+    # Models spanning several 64-bit words
+    models: List[Interpretation] = [
+        [Z2(0)] * 150,
+        [Z2(1)] * 150,
+        [Z2(i < 70) for i in range(150)],
+    ]
+    agents: List[Interpretation] = [models[0], models[1], models[2]]
+    G = Graph(models, [(0, 1), (0, 2), (1, 2), (2, 0)], agents)
+    assert G.hamming_distance_rule(0) == [models[1], models[2]]
+    assert G.hamming_distance_rule(1) == [models[2]]
+    assert G.hamming_distance_rule(2) == [models[0]]
+
+def test_neighbor_index():
+    K = BeliefBase([Prop.P, Prop.Q], [])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(2, 0), (0, 1), (0, 2), (2, 2)], agents)
+    assert list(G.neighbors(0)) == [1, 2]
+    assert list(G.neighbors(1)) == []
+    assert list(G.neighbors(2)) == [0, 2]
+    assert G.has_connection((2, 0))
+    assert not G.has_connection((1, 0))
+
+    G.add_connection((1, 0))
+    assert list(G.neighbors(1)) == [0]
+    G.remove_connection((0, 2))
+    assert list(G.neighbors(0)) == [1]
+    assert not G.has_connection((0, 2))
+
+    G.add_agent(K.models[3])
+    assert list(G.neighbors(3)) == []
+    G.complete_graph()
+    assert list(G.neighbors(3)) == [0, 1, 2, 3]
+
+    G.connections = [(3, 1), (1, 3)]
+    assert list(G.neighbors(3)) == [1]
+    assert G.has_connection((1, 3))
+
+    G.connections.append((0, 0))
+    assert G.connections == [(3, 1), (1, 3), (0, 0)]
+    assert G.has_connection((0, 0))
+    assert list(G.neighbors(0)) == [0]
+    G.connections.remove((0, 0))
+    assert not G.has_connection((0, 0))
+    assert list(G.neighbors(0)) == []
+    for agent in range(4):
+        G.add_connection((agent, 0))
+    G.add_connection((2, 0))
+    G.remove_connection((2, 0))
+    assert list(G.neighbors(2)) == [0]
+    assert G.has_connection((2, 0))
+
+def test_remove_agent():
+    K = BeliefBase([Prop.P, Prop.Q], [])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (2, 2)], agents)
+    G.remove_agent(1)
+    assert G.agents == [K.models[0], K.models[2]]
+    assert G.connections == [(1, 0), (1, 1)]
+    assert list(G.neighbors(0)) == []
+    assert list(G.neighbors(1)) == [0, 1]
+
+def test_update_batched():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[3], K.models[2]]
+    G = Graph(K, [(0, 1), (0, 2), (1, 2), (2, 3), (3, 0), (3, 1)], agents)
+    rules = [G.hamming_distance_rule(i) for i in range(len(agents))]
+    for i, rule in enumerate(rules):
+        costs = G.rule_costs()[i]
+        assert [K.models[m] for m in np.flatnonzero(costs == costs.min())] == rule
+
+    G.update(np.random.default_rng(3))
+    first = G.agents
+    assert all(agent in rule for agent, rule in zip(first, rules))
+    assert [K.models[m] for m in G.agent_models] == first
+
+    H = Graph(K, [(0, 1), (0, 2), (1, 2), (2, 3), (3, 0), (3, 1)], agents)
+    H.update(np.random.default_rng(3))
+    assert H.agents == first
+
+    with pytest.raises(ValueError, match="Agents must be represented by models."):
+        G.agents = [[Z2(1), Z2(1), Z2(0)]]
+
+def test_exchangeable_classes():
+    K = BeliefBase([Prop.P, Prop.Q], [])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2], K.models[3]]
+    G = Graph(K, [], agents)
+    assert G.exchangeable_classes() == [[0, 1, 2, 3]]
+    G.complete_graph()
+    assert G.exchangeable_classes() == [[0, 1, 2, 3]]
+
+    # A star: the leaves are interchangeable, the center is not
+    G.connections = [(0, 1), (0, 2), (0, 3), (1, 0), (2, 0), (3, 0)]
+    assert G.exchangeable_classes() == [[0], [1, 2, 3]]
+    G.add_connection((3, 3))
+    assert G.exchangeable_classes() == [[0], [1, 2], [3]]
+
+    G.connections = [(0, 1), (1, 2), (2, 3), (3, 0)]
+    assert G.exchangeable_classes() == [[0], [1], [2], [3]]
@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+from fractions import Fraction
+from typing import List
+from src.jaggdy.Graph import Graph
+from src.jaggdy.BeliefBase import BeliefBase
+from src.jaggdy.MarkovChain import MarkovChain
+from src.jaggdy.LumpedMarkovChain import LumpedMarkovChain
+from src.jaggdy.utils.enums import Z2, Prop, Logic
+from src.jaggdy.utils.types import Connection, Interpretation
+
+
+def test_lumped_markov_chain_init():
+    models: List[Interpretation] = [[Z2(1), Z2(0)], [Z2(0), Z2(1)]]
+    G = Graph(models, [], [])
+    L = LumpedMarkovChain(G)
+    assert L.classes == []
+    assert L.states == []
+    assert L.get_result_by_state() == []
+
+    G = Graph(models, [], [models[0], models[1], models[1]])
+    G.complete_graph()
+    L = LumpedMarkovChain(G)
+    assert L.classes == [[0, 1, 2]]
+    assert len(L.states) == 4
+    assert L.get_state_counts().tolist() == [[1], [2]]
+    assert np.allclose(L.state_graph_matrix.sum(axis=1), 1)
+
+    L = LumpedMarkovChain(G, by_belief=True)
+    assert L.classes == [[0], [1, 2]]
+    assert list(L.agent_classes) == [0, 1, 1]
+    assert len(L.states) == 6
+
+def test_get_result_by_state():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[1]]
+    graphs: List[List[Connection]] = [
+        [(a, b) for a in range(3) for b in range(3)],
+        [(0, 1), (0, 2), (1, 0), (2, 0), (1, 1), (2, 2)],
+        [(0, 1), (1, 2), (2, 0)],
+    ]
+    for connections in graphs:
+        G = Graph(K, connections, agents)
+        exact = MarkovChain(G).get_result_by_state()
+        lumped = LumpedMarkovChain(G, by_belief=True).get_result_by_state(by_agent=True)
+        assert len(exact) == len(lumped)
+        for (prob, state), (lumped_prob, lumped_state) in zip(exact, lumped):
+            assert prob == pytest.approx(lumped_prob)
+            assert np.array_equal(state, lumped_state)
+
+    G = Graph(K, graphs[1], agents)
+    exact = MarkovChain(G, exact=True).get_result_by_state()
+    lumped = LumpedMarkovChain(G, by_belief=True, exact=True).get_result_by_state(by_agent=True)
+    assert [prob for prob, _ in exact] == [prob for prob, _ in lumped]
+    assert all(isinstance(prob, Fraction) for prob, _ in lumped)
+
+    L = LumpedMarkovChain(G)
+    results = L.get_result_by_state()
+    assert sum(prob for prob, _ in results) == pytest.approx(1)
+    assert results[0][1].tolist() == [[0, 0], [1, 2], [0, 0], [0, 0]]
+    assert len(L.get_result_by_state(by_agent=True)) == len(results)
+
+    L = LumpedMarkovChain(Graph(K, graphs[0], agents))
+    with pytest.raises(ValueError, match="Agents in a class must share a belief to report results by agent."):
+        L.get_result_by_state(by_agent=True)
+
+def test_agent_marginals():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[1], K.models[3]]
+    for connections in [[(a, b) for a in range(4) for b in range(4)], [(0, 1), (1, 2), (2, 3), (3, 0)]]:
+        G = Graph(K, connections, agents)
+        expected = MarkovChain(G).get_agent_marginals()
+        assert np.allclose(LumpedMarkovChain(G, by_belief=True).get_agent_marginals(), expected)
+
+    G = Graph(K, [(a, b) for a in range(4) for b in range(4)], agents)
+    exact = LumpedMarkovChain(G, by_belief=True, exact=True).get_agent_marginals()
+    assert exact.tolist() == MarkovChain(G, exact=True).get_agent_marginals().tolist()
+    with pytest.raises(ValueError, match="Agents in a class must share a belief to report results by agent."):
+        LumpedMarkovChain(G).get_agent_marginals()
+
+def test_large_complete_graph():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    G = Graph(K, [], [K.models[i % 4] for i in range(12)])
+    G.complete_graph()
+    L = LumpedMarkovChain(G)
+    assert len(L.states) == 455
+    results = L.get_result_by_state()
+    assert sum(prob for prob, _ in results) == pytest.approx(1)
+    for _, state in results:
+        assert sorted(state.ravel().tolist()) == [0, 0, 0, 12]
@@ -0,0 +1,159 @@
+import pytest
+import numpy as np
+from fractions import Fraction
+from src.jaggdy.utils.sparse import CSRMatrix
+from src.jaggdy.utils.markov import (strongly_connected_components, bareiss_solve, dixon_solve,
+                                     AbsorptionAnalysis, ExactAbsorptionAnalysis)
+from src.jaggdy.utils.utils import find_stationary
+
+
+def test_strongly_connected_components():
+    # 0 -> 1 <-> 2 -> 3, 3 -> 3, 4 isolated
+    mat = CSRMatrix.from_dense(np.array([
+        [0, 1, 0, 0, 0],
+        [0, 0, 1, 0, 0],
+        [0, 1, 0, 1, 0],
+        [0, 0, 0, 1, 0],
+        [0, 0, 0, 0, 0],
+    ]))
+    num_components, labels = strongly_connected_components(mat)
+    assert num_components == 4
+    assert labels[1] == labels[2]
+    assert len({labels[0], labels[1], labels[3], labels[4]}) == 4
+    # Reverse topological order: components reachable from a component have smaller labels
+    assert labels[3] < labels[1] < labels[0]
+
+    # Stored zeros are not edges
+    zeros = CSRMatrix(mat.indptr, mat.indices, np.where(mat.indices == 1, 0., mat.data), mat.shape)
+    num_components, labels = strongly_connected_components(zeros)
+    assert num_components == 5
+
+def test_absorption_analysis():
+    P = np.array([
+        [0.5, 0.25, 0.25, 0, 0],
+        [0, 1, 0, 0, 0],
+        [0.5, 0, 0, 0.5, 0],
+        [0, 0, 0, 0, 1],
+        [0, 0, 0, 1, 0],
+    ])
+    analysis = AbsorptionAnalysis(CSRMatrix.from_dense(P))
+    closed = sorted(sorted(states.tolist()) for states in analysis.closed_classes)
+    assert closed == [[1], [3, 4]]
+    periods = {tuple(sorted(states.tolist())): period
+               for states, period in zip(analysis.closed_classes, analysis.periods)}
+    assert periods == {(1,): 1, (3, 4): 2}
+
+    # From state 0: absorbed into {1} with probability 2/3, into {3, 4} with 1/3
+    limit = analysis.limit_matrix().toarray()
+    assert limit[0] == pytest.approx([0, 2 / 3, 0, 1 / 6, 1 / 6])
+    assert limit[2] == pytest.approx([0, 1 / 3, 0, 1 / 3, 1 / 3])
+    assert limit[3] == pytest.approx([0, 0, 0, 0.5, 0.5])
+    assert np.allclose(limit.sum(axis=1), 1)
+
+    # The limit is the Cesàro average of the powers of P
+    powers = [np.linalg.matrix_power(P, n) for n in range(2000, 2002)]
+    assert np.allclose(limit, sum(powers) / 2)
+
+    assert np.allclose(find_stationary(P), limit)
+    assert np.allclose(find_stationary(CSRMatrix.from_dense(P)).toarray(), limit)
+
+    # Stored zeros are neither transitions nor absorption probabilities
+    mat = CSRMatrix.from_dense(P + 1)
+    zeros = CSRMatrix(mat.indptr, mat.indices, np.where(P.ravel() == 0, 0., P.ravel()), mat.shape)
+    assert np.array_equal(AbsorptionAnalysis(zeros).limit_matrix().toarray(), analysis.limit_matrix().toarray())
+    assert AbsorptionAnalysis(zeros).absorption.nnz == analysis.absorption.nnz
+
+def test_absorption_analysis_random():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        P = rng.random((12, 12)) * (rng.random((12, 12)) < 0.2)
+        P[np.arange(12), rng.integers(0, 12, 12)] += 0.1
+        P /= P.sum(axis=1, keepdims=True)
+        analysis = AbsorptionAnalysis(CSRMatrix.from_dense(P))
+        if all(period == 1 for period in analysis.periods):
+            assert np.allclose(analysis.limit_matrix().toarray(), np.linalg.matrix_power(P, 4096))
+
+def test_bareiss_solve():
+    A = np.array([[0, 2, 1], [1, 1, 0], [3, 0, 4]], dtype=np.object_)
+    B = np.array([[1, 2], [0, 0], [2, 1]], dtype=np.object_)
+    X, denominator = bareiss_solve(A, B)
+    assert denominator == 11
+    assert (np.dot(A, X) == B * denominator).all()
+
+    with pytest.raises(ValueError, match="Matrix is singular."):
+        bareiss_solve(np.array([[1, 2], [2, 4]], dtype=np.object_), np.array([[1], [1]], dtype=np.object_))
+
+def test_dixon_solve():
+    rng = np.random.default_rng(0)
+    for size in [1, 3, 40, 100]:
+        A = (rng.integers(-5, 6, (size, size)) + 40 * np.eye(size, dtype=np.int64)).astype(np.object_)
+        B = rng.integers(-9, 10, (size, 3)).astype(np.object_)
+        X, denominator = dixon_solve(A, B)
+        assert (np.dot(A, X) == B * denominator).all()
+        Y, bareiss_denominator = bareiss_solve(A, B)
+        assert all(Fraction(x, denominator) == Fraction(y, bareiss_denominator)
+                   for x, y in zip(X.ravel(), Y.ravel()))
+
+    # Leading blocks singular over the rationals, and entries too large for 64 bits
+    A = np.array([[0, 1], [1, 0]], dtype=np.object_)
+    X, denominator = dixon_solve(A, np.array([[1], [2]], dtype=np.object_))
+    assert X.ravel().tolist() == [2, 1] and denominator == 1
+    A = np.array([[1 << 70, 1], [1, 1]], dtype=np.object_)
+    X, denominator = dixon_solve(A, np.array([[1], [0]], dtype=np.object_))
+    assert (np.dot(A, X) == np.array([[1], [0]], dtype=np.object_) * denominator).all()
+
+def test_exact_absorption_analysis():
+    rows = [0, 0, 0, 1, 2, 2, 3, 4]
+    cols = [0, 1, 2, 1, 0, 3, 4, 3]
+    probs = [Fraction(1, 2), Fraction(1, 4), Fraction(1, 4), Fraction(1), Fraction(1, 2), Fraction(1, 2),
+             Fraction(1), Fraction(1)]
+    analysis = ExactAbsorptionAnalysis.from_fractions(np.array(rows), np.array(cols), probs, 5)
+    assert analysis.denominators == [4, 1, 2, 1, 1]
+    assert analysis.numerators == [2, 1, 1, 1, 1, 1, 1, 1]
+
+    cols_0, values_0 = analysis.limit_row(0)
+    assert cols_0.tolist() == [1, 3, 4]
+    assert values_0.tolist() == [Fraction(2, 3), Fraction(1, 6), Fraction(1, 6)]
+    assert analysis.limit_row(2)[1].tolist() == [Fraction(1, 3), Fraction(1, 3), Fraction(1, 3)]
+
+    P = np.zeros((5, 5))
+    P[rows, cols] = [float(prob) for prob in probs]
+    assert np.allclose(analysis.limit_matrix().toarray(), AbsorptionAnalysis(CSRMatrix.from_dense(P)).limit_matrix().toarray())
+
+    with pytest.raises(ValueError, match="Numerators of transition probabilities must be positive."):
+        ExactAbsorptionAnalysis(np.array([0, 1]), np.array([0]), [0], [1])
+
+def test_exact_absorption_analysis_random():
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        weights = rng.integers(1, 5, (10, 10)) * (rng.random((10, 10)) < 0.25)
+        weights[np.arange(10), rng.integers(0, 10, 10)] += 1
+        rows, cols = np.nonzero(weights)
+        totals = weights.sum(axis=1)
+        probs = [Fraction(int(weights[i, j]), int(totals[i])) for i, j in zip(rows, cols)]
+        exact = ExactAbsorptionAnalysis.from_fractions(rows, cols, probs, 10)
+        approximate = AbsorptionAnalysis(CSRMatrix.from_dense(weights / totals[:, np.newaxis]))
+        assert np.allclose(exact.limit_matrix().toarray(), approximate.limit_matrix().toarray())
+        for state in range(10):
+            assert sum(exact.limit_row(state)[1]) == 1
+
+
+def test_limit_rows():
+    rng = np.random.default_rng(2)
+    for _ in range(10):
+        weights = rng.integers(1, 5, (12, 12)) * (rng.random((12, 12)) < 0.2)
+        weights[np.arange(12), rng.integers(0, 12, 12)] += 1
+        rows, cols = np.nonzero(weights)
+        totals = weights.sum(axis=1)
+        probs = [Fraction(int(weights[i, j]), int(totals[i])) for i, j in zip(rows, cols)]
+        for analysis in [AbsorptionAnalysis(CSRMatrix.from_dense(weights / totals[:, np.newaxis])),
+                         ExactAbsorptionAnalysis.from_fractions(rows, cols, probs, 12)]:
+            states = np.array([3, 0, 3, 11])
+            limit = analysis.limit_rows(states)
+            assert limit.shape == (4, 12)
+            for k, state in enumerate(states):
+                expected_cols, expected_values = analysis.limit_row(state)
+                limit_cols, limit_values = limit.row(k)
+                assert np.array_equal(limit_cols, expected_cols)
+                assert np.array_equal(limit_values, np.array(expected_values, dtype=np.float64))
+    assert AbsorptionAnalysis(CSRMatrix.from_dense(np.zeros((0, 0)))).limit_rows(np.array([], dtype=np.int64)).shape == (0, 0)
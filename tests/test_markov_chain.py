@@ -1,11 +1,16 @@
 import pytest
 import numpy as np
+import src.jaggdy.MarkovChain
+from fractions import Fraction
 from typing import List
 from src.jaggdy.Graph import Graph
 from src.jaggdy.BeliefBase import BeliefBase
 from src.jaggdy.MarkovChain import MarkovChain
 from src.jaggdy.utils.enums import Z2, Prop, Logic
 from src.jaggdy.utils.types import Connection, Interpretation, MatrixZ2
+from src.jaggdy.utils.utils import matrix_z2_to_matrix, matrix_to_bits
+from src.jaggdy.utils.cache import ArrayCache
+from src.jaggdy.utils.markov import ExactAbsorptionAnalysis
 
 
 def test_markov_chain_init():
@@ -98,6 +103,28 @@ def test_markov_chain_init():
         [Z2(1), Z2(1), Z2(0), Z2(1)]
     ]))
 
+def test_native_matrices():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.IMPLIES, Prop.P, Prop.Q]])
+    G = Graph(K, [(0, 1), (1, 0), (2, 2)], [K.models[0], K.models[1], K.models[3]])
+    M = MarkovChain(G)
+    for matrix in [M._model_matrix, M._coord_matrix, M._adjacency, M.state_models]:
+        assert matrix.dtype == np.uint8
+    assert M.state_models.shape == (len(M.states), 3)
+    for models, state in zip(M.state_models, M.states):
+        assert np.array_equal(np.argmax(matrix_z2_to_matrix(state), axis=0), models)
+    assert np.array_equal(M.adjacency, np.array([
+        [Z2(0), Z2(1), Z2(0)],
+        [Z2(1), Z2(0), Z2(0)],
+        [Z2(0), Z2(0), Z2(1)]
+    ]))
+
+    # The Z2 and native forms of the same state give the same update
+    assert np.array_equal(
+        M.update_from_state(M.coord_matrix),
+        M.update_from_state(M._coord_matrix)
+    )
+    assert np.array_equal(M.get_state_models(), np.transpose(np.array(G.agents)))
+
 def test_model_matrix():
     M = MarkovChain(Graph([], [], []))
 
@@ -234,4 +261,255 @@ def test_get_possible_states():
         assert np.array_equal(next_states[i], coord_matrix)
 
     with pytest.raises(ValueError, match="Coordinate matrices must have same dimensions."):
-        M._get_possible_states(np.array([Z2(1)]))
\ No newline at end of file
+        M._get_possible_states(np.array([Z2(1)]))
+
+def test_reachable_states():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (1, 1)], agents)
+    M = MarkovChain(G)
+    R = MarkovChain(G, reachable=True)
+    assert len(R.states) < len(M.states)
+    assert any(np.array_equal(state, M.coord_matrix) for state in R.states)
+    assert np.allclose(R.state_graph_matrix.sum(axis=1), 1)
+
+    full = M.get_result_by_state()
+    reached = R.get_result_by_state()
+    assert len(full) == len(reached)
+    for (prob, state), (reached_prob, reached_state) in zip(full, reached):
+        assert prob == pytest.approx(reached_prob)
+        assert np.array_equal(state, reached_state)
+
+    seeds: List[MatrixZ2] = [M.states[5], M.states[9], M.states[5]]
+    S = MarkovChain(G, seeds=seeds)
+    assert any(np.array_equal(state, M.states[5]) for state in S.states)
+    assert any(np.array_equal(state, M.states[9]) for state in S.states)
+    assert S.get_result_by_state(M.states[9])[0][0] == pytest.approx(M.get_result_by_state(M.states[9])[0][0])
+
+    with pytest.raises(ValueError, match="Coordinate matrices must have same dimensions."):
+        MarkovChain(G, seeds=[np.array([[Z2(1)]])])
+
+    assert MarkovChain(Graph(K, [], []), reachable=True).states == []
+
+def test_state_codes():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[2], K.models[0], K.models[3]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0)], agents)
+    M = MarkovChain(G)
+    assert list(M.state_codes) == list(range(64))
+    assert M._state_row(M._coord_matrix) == 2 * 16 + 0 * 4 + 3
+    assert M._state_row(np.ones((4, 3), dtype=np.uint8)) is None
+    assert M.get_result_by_state(np.ones((4, 3), dtype=np.uint8)) == []
+
+    R = MarkovChain(G, reachable=True)
+    assert list(R.state_codes) == sorted(R.state_codes)
+    for code, state in zip(R.state_codes, R.states):
+        assert np.array_equal(state, M.states[code])
+    for row, state in enumerate(R.states):
+        assert R._state_row(matrix_to_bits(state)) == row
+    assert np.array_equal(R.get_results(R.state_models).toarray(), R.get_results().toarray())
+
+def test_exact_results():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (1, 1)], agents)
+    M = MarkovChain(G)
+    E = MarkovChain(G, exact=True)
+    for state in M.states[::7]:
+        results = M.get_result_by_state(state)
+        exact_results = E.get_result_by_state(state)
+        assert len(results) == len(exact_results)
+        assert sum(prob for prob, _ in exact_results) == 1
+        for (prob, end_state), (exact_prob, exact_end_state) in zip(results, exact_results):
+            assert isinstance(exact_prob, Fraction)
+            assert prob == pytest.approx(float(exact_prob))
+            assert np.array_equal(end_state, exact_end_state)
+    assert np.allclose(E.stationary.toarray(), M.stationary.toarray())
+
+
+def test_lazy_stages():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0)], agents)
+    M = MarkovChain(G)
+    M.update_from_state(M.coord_matrix)
+    M.get_state_models()
+    assert M._cached_state_models is None
+    assert M._cached_state_graph_matrix is None
+    assert M._cached_stationary is None
+
+    stationary = M.stationary.toarray()
+    assert M._cached_state_models is not None
+    assert M._cached_analysis is not None
+    assert M.stationary is M.stationary
+
+    M.invalidate()
+    assert M._cached_state_models is None
+    assert M._cached_stationary is None
+    M.exact = True
+    assert np.allclose(M.stationary.toarray(), stationary)
+    assert all(isinstance(prob, Fraction) for prob, _ in M.get_result_by_state())
+
+
+def test_batched_transitions():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2], K.models[3]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 3), (3, 0), (0, 2), (0, 2)], agents)
+    for M in [MarkovChain(G), MarkovChain(G, reachable=True)]:
+        mat = M.state_graph_matrix
+        for i, state in enumerate(M.states):
+            next_states = M._get_possible_states(M.update_from_state(state))
+            row = mat.indices[mat.indptr[i]:mat.indptr[i + 1]]
+            assert sorted(M._state_row(matrix_to_bits(s)) for s in next_states) == row.tolist()
+            assert np.allclose(mat.data[mat.indptr[i]:mat.indptr[i + 1]], 1 / len(next_states))
+
+
+def test_parallel_transitions(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.jaggdy.MarkovChain.STATE_BLOCK", 1 << 4)
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2], K.models[3]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 3), (3, 0), (0, 2)], agents)
+    for reachable in [False, True]:
+        serial = MarkovChain(G, reachable=reachable).state_graph_matrix
+        mat = MarkovChain(G, reachable=reachable, workers=2)._build_state_graph_parallel()
+        assert np.array_equal(mat.indptr, serial.indptr)
+        assert np.array_equal(mat.indices, serial.indices)
+        assert np.array_equal(mat.data, serial.data)
+
+        # The states mapped from workdir are opened by the workers instead of being shared
+        mapped = MarkovChain(G, reachable=reachable, workers=2, workdir=str(tmp_path / str(reachable)))
+        num_states = len(mapped.state_models)
+        shared_shapes = []
+        share_array = src.jaggdy.MarkovChain.share_array
+        monkeypatch.setattr("src.jaggdy.MarkovChain.share_array",
+                            lambda array: shared_shapes.append(array.shape) or share_array(array))
+        mat = mapped._build_state_graph_parallel()
+        monkeypatch.setattr("src.jaggdy.MarkovChain.share_array", share_array)
+        assert all(shape[0] != num_states for shape in shared_shapes)
+        assert isinstance(mat.indices.base, np.memmap)
+        assert np.array_equal(mat.toarray(), serial.toarray())
+    assert np.array_equal(MarkovChain(G, workers=2).stationary.toarray(), MarkovChain(G).stationary.toarray())
+
+
+def test_workdir(tmp_path):
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (1, 1)], agents)
+    M = MarkovChain(G)
+    for reachable in [False, True]:
+        D = MarkovChain(G, reachable=reachable, workdir=str(tmp_path / str(reachable)))
+        assert isinstance(D.state_models, np.memmap)
+        assert isinstance(D.state_graph_matrix.indices.base, np.memmap)
+        assert isinstance(D.stationary.data.base, np.memmap)
+        assert (tmp_path / str(reachable) / "state_graph_matrix.indices").exists()
+        assert isinstance(D.analysis.components, np.memmap)
+        assert isinstance(D.analysis.absorption.indices.base, np.memmap)
+        assert (tmp_path / str(reachable) / "analysis.class_stationary.npy").exists()
+        assert D.get_result_by_state()[0][0] == pytest.approx(M.get_result_by_state()[0][0])
+        if not reachable:
+            assert np.array_equal(D.state_graph_matrix.toarray(), M.state_graph_matrix.toarray())
+            assert np.array_equal(D.stationary.toarray(), M.stationary.toarray())
+
+    # Rebuilding replaces the files without disturbing the arrays mapped from the old ones
+    stationary = D.stationary
+    D.invalidate()
+    assert np.array_equal(D.stationary.toarray(), stationary.toarray())
+
+
+def test_cached_chain(tmp_path):
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (1, 1)], agents)
+    M = MarkovChain(G)
+    cache = ArrayCache(str(tmp_path))
+    # On a cold cache, one query reads its row from the analysis rather than building stationary
+    A = MarkovChain(G, cache=cache)
+    results = A.get_result_by_state()
+    assert A._cached_stationary is None
+    assert cache.stats() == {"hits": 0, "misses": 4, "entries": 3, "bytes": cache.stats()["bytes"]}
+    A.stationary
+    assert cache.stats() == {"hits": 0, "misses": 5, "entries": 4, "bytes": cache.stats()["bytes"]}
+
+    C = MarkovChain(G, cache=cache)
+    assert len(C.get_result_by_state()) == len(results)
+    assert cache.stats()["hits"] == 2
+    assert C._cached_analysis is None
+    assert np.array_equal(C.state_models, M.state_models)
+    assert np.array_equal(C.state_graph_matrix.toarray(), M.state_graph_matrix.toarray())
+    assert cache.stats()["hits"] == 3
+    for (prob, end_state), (expected_prob, expected_end_state) in zip(results, M.get_result_by_state()):
+        assert prob == expected_prob
+        assert np.array_equal(end_state, expected_end_state)
+
+    # The analysis is restored without building the transition matrix
+    D = MarkovChain(G, cache=cache)
+    assert D.analysis.periods == M.analysis.periods
+    assert D._cached_state_graph_matrix is None
+    assert cache.stats()["hits"] == 4
+    assert np.array_equal(D.analysis.limit_matrix().toarray(), M.analysis.limit_matrix().toarray())
+    assert np.array_equal(D.analysis.absorption.toarray(), M.analysis.absorption.toarray())
+    for state in range(0, len(M.state_models), 7):
+        assert all(np.array_equal(restored, built)
+                   for restored, built in zip(D.analysis.limit_row(state), M.analysis.limit_row(state)))
+
+    # Other seeds, another graph, or an exact chain are other entries
+    MarkovChain(G, reachable=True, cache=cache).state_models
+    MarkovChain(Graph(K, [(0, 1)], agents), cache=cache).state_models
+    assert cache.stats()["misses"] == 7
+    E = MarkovChain(G, exact=True, cache=cache)
+    assert E.get_result_by_state()[0][0] == Fraction(results[0][0]).limit_denominator()
+    assert isinstance(E.analysis, ExactAbsorptionAnalysis)
+
+
+def test_get_results():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (1, 1)], agents)
+    for M in [MarkovChain(G), MarkovChain(G, exact=True)]:
+        results = M.get_results()
+        assert results.shape == (len(M.states), len(M.states))
+        assert np.array_equal(results.toarray(), M.stationary.toarray())
+        for k, state in enumerate(M.states[::5]):
+            for (prob, end_state), (expected_prob, expected_end_state) in zip(
+                    M.get_outcomes(results, 5 * k), M.get_result_by_state(state)):
+                assert prob == pytest.approx(expected_prob)
+                assert np.array_equal(end_state, expected_end_state)
+
+    # Initial states outside a chain of reachable states have empty rows
+    M = MarkovChain(G)
+    R = MarkovChain(G, reachable=True)
+    initial = M.state_models[[40, 7, 40]]
+    results = R.get_results(initial)
+    assert results.shape == (3, len(R.states))
+    for k, models in enumerate(initial):
+        outcomes = R.get_outcomes(results, k)
+        expected = R.get_result_by_state(M.states[40] if k != 1 else M.states[7])
+        assert [prob for prob, _ in outcomes] == [prob for prob, _ in expected]
+    with pytest.raises(ValueError, match="Initial states must give a model index for each agent."):
+        M.get_results(np.zeros((2, 2), dtype=np.int64))
+    with pytest.raises(ValueError, match="Model indices must refer to models of the chain."):
+        M.get_results(np.full((1, 3), 4))
+
+def test_agent_marginals():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (1, 1)], agents)
+    M = MarkovChain(G)
+    for state in M.states[::9]:
+        expected = np.zeros((3, 4))
+        for prob, end_state in M.get_result_by_state(state):
+            for agent, belief in enumerate(np.transpose(end_state).tolist()):
+                expected[agent, K.models.index(belief)] += prob
+        assert np.allclose(M.get_agent_marginals(state), expected)
+
+    marginals = M.get_marginals(M.get_results())
+    assert marginals.shape == (len(M.states), 3, 4)
+    for k in range(0, len(M.states), 9):
+        assert np.allclose(marginals[k], M.get_agent_marginals(M.states[k]))
+
+    E = MarkovChain(G, exact=True)
+    exact_marginals = E.get_agent_marginals()
+    assert all(isinstance(prob, Fraction) for prob in exact_marginals.ravel())
+    assert all(sum(row) == 1 for row in exact_marginals.tolist())
+    assert np.allclose(exact_marginals.astype(np.float64), M.get_agent_marginals())
+    assert not np.any(MarkovChain(G, reachable=True).get_agent_marginals(M.states[7]))
@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+from typing import List
+import src.jaggdy.ModelSet as model_set_module
+from src.jaggdy.ModelSet import ModelSet
+from src.jaggdy.BeliefBase import BeliefBase
+from src.jaggdy.utils.enums import Z2, Prop, Logic
+from src.jaggdy.utils.types import Interpretation
+from src.jaggdy.utils.utils import hamming_distance
+
+
+def test_model_set_init():
+    models: List[Interpretation] = [[Z2(1), Z2(0)], [Z2(0), Z2(1)], [Z2(1), Z2(1)]]
+    S = ModelSet(models)
+    assert len(S) == 3
+    assert S.num_atoms == 2
+    assert S.to_interpretations() == models
+    assert np.array_equal(S.words, np.array([[1], [2], [3]], dtype=np.uint64))
+
+    S = ModelSet([])
+    assert len(S) == 0
+    assert S.to_interpretations() == []
+
+    S = ModelSet.from_bools(np.array([[True, False], [False, True]]))
+    assert S.to_interpretations() == [[Z2(1), Z2(0)], [Z2(0), Z2(1)]]
+
+    with pytest.raises(ValueError, match="The number of atoms must be given with packed models."):
+        ModelSet(np.array([[1]], dtype=np.uint64))
+
+def test_index():
+    models: List[Interpretation] = [[Z2(1), Z2(0)], [Z2(0), Z2(1)], [Z2(1), Z2(1)]]
+    S = ModelSet(models)
+    assert S.index([Z2(0), Z2(1)]) == 1
+    assert np.array_equal(S.indices([[Z2(1), Z2(1)], [Z2(1), Z2(0)]]), [2, 0])
+
+    with pytest.raises(ValueError, match="Agents must be represented by models."):
+        S.index([Z2(0), Z2(0)])
+    with pytest.raises(ValueError, match="Agents must be represented by models."):
+        S.index([Z2(1), Z2(0), Z2(0)])
+
+def test_distances():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.IMPLIES, Prop.P, Prop.Q]])
+    S = K.packed_models
+    assert S.to_interpretations() == K.models
+    assert np.array_equal(S.distances(), np.array([
+        [hamming_distance(a, b) for b in K.models] for a in K.models
+    ]))
+    assert np.array_equal(S.distances(np.array([0]), np.array([1, 2])), np.array([[1, 2]]))
+
+def test_distance_table(monkeypatch):
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    table = K.packed_models.distance_table
+    assert table.dtype == np.uint8
+    assert not table.flags.writeable
+    assert table is K.packed_models.distance_table
+    for i, first in enumerate(K.models):
+        for j, second in enumerate(K.models):
+            assert table[i, j] == hamming_distance(first, second)
+
+    monkeypatch.setattr(model_set_module, "DISTANCE_TABLE_MEMMAP_BYTES", 0)
+    monkeypatch.setattr(model_set_module, "DISTANCE_TABLE_BLOCK", 3)
+    mapped = ModelSet(K.models).distance_table
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, table)
+    with pytest.raises(ValueError):
+        mapped[0, 0] = 1
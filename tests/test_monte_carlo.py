@@ -0,0 +1,116 @@
+import pytest
+import numpy as np
+from typing import List
+from src.jaggdy.Graph import Graph
+from src.jaggdy.BeliefBase import BeliefBase
+from src.jaggdy.MarkovChain import MarkovChain
+from src.jaggdy.LumpedMarkovChain import LumpedMarkovChain
+import src.jaggdy.MonteCarlo as monte_carlo_module
+from src.jaggdy.MonteCarlo import MonteCarlo
+from src.jaggdy.utils.enums import Z2, Prop, Logic
+from src.jaggdy.utils.types import Connection, Interpretation
+
+
+def test_monte_carlo_init():
+    models: List[Interpretation] = [[Z2(1), Z2(0)], [Z2(0), Z2(1)]]
+    G = Graph(models, [], [])
+    MC = MonteCarlo(G, seed=0)
+    assert MC.seed == 0
+    assert MC.simulate(10, 5).shape == (10, 0)
+    assert MC.get_result_by_state(replicas=10, steps=5) == []
+
+    G = Graph(models, [(0, 1)], [models[1], models[0]])
+    MC = MonteCarlo(G)
+    assert list(MC.agent_models) == [1, 0]
+    assert list(MC.get_initial_state(np.array([[Z2(1), Z2(1)], [Z2(0), Z2(0)]]))) == [0, 0]
+    with pytest.raises(ValueError, match="Each agent must hold exactly one model."):
+        MC.get_initial_state(np.array([[Z2(1), Z2(1)], [Z2(1), Z2(0)]]))
+    with pytest.raises(ValueError, match="Coordinate matrices must have same dimensions."):
+        MC.get_initial_state(np.array([[Z2(1)], [Z2(0)]]))
+
+def test_step():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[3]]
+    G = Graph(K, [(0, 1), (0, 2), (1, 2), (2, 0)], agents)
+    MC = MonteCarlo(G, seed=0)
+    rules = [G.hamming_distance_rule(i) for i in range(len(agents))]
+    states = MC.step(np.tile(MC.agent_models, (200, 1)), np.random.default_rng(0))
+    for state in states:
+        assert all(K.models[m] in rule for m, rule in zip(state, rules))
+
+def test_get_result_by_state():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2], K.models[3]]
+    connections: List[Connection] = [(0, 1), (1, 2), (2, 0), (3, 0), (0, 3), (1, 1)]
+    G = Graph(K, connections, agents)
+    exact = MarkovChain(G).get_result_by_state()
+    estimate = MonteCarlo(G, seed=7).get_result_by_state(replicas=4000, steps=100)
+
+    assert len(exact) == len(estimate)
+    for (prob, state), (mc_prob, stderr, mc_state) in zip(exact, estimate):
+        assert np.array_equal(state, mc_state)
+        assert abs(prob - mc_prob) < 5 * stderr
+
+    # The same seed reproduces the same trajectories
+    first = MonteCarlo(G, seed=7).simulate(2000, 10)
+    assert np.array_equal(MonteCarlo(G, seed=7).simulate(2000, 10), first)
+    assert not np.array_equal(MonteCarlo(G, seed=8).simulate(2000, 10), first)
+
+def test_periodic_chain():
+    models: List[Interpretation] = [[Z2(1), Z2(0)], [Z2(0), Z2(1)]]
+    # The two agents swap their beliefs at every step
+    G = Graph(models, [(0, 1), (1, 0)], [models[0], models[1]])
+    exact = MarkovChain(G).get_result_by_state()
+    assert [prob for prob, _ in exact] == pytest.approx([0.5, 0.5])
+    for steps in (100, 101):
+        estimate = MonteCarlo(G, seed=3).get_result_by_state(replicas=4000, steps=steps)
+        assert len(estimate) == len(exact)
+        for (prob, state), (mc_prob, stderr, mc_state) in zip(exact, estimate):
+            assert np.array_equal(state, mc_state)
+            assert 0 < stderr and abs(prob - mc_prob) < 5 * stderr
+
+    # With a window of one iteration, the state after exactly steps iterations is observed
+    MC = MonteCarlo(G, seed=3)
+    assert [prob for prob, _, _ in MC.get_result_by_state(replicas=100, steps=100, window=1)] == [1.0]
+    assert len(np.unique(MC.simulate(100, 101, window=1), axis=0)) == 1
+    with pytest.raises(ValueError, match="The window must contain between 1 and steps \\+ 1 iterations."):
+        MC.simulate(10, 5, window=7)
+
+def test_count_outcomes_workers(monkeypatch):
+    monkeypatch.setattr(monte_carlo_module, "MONTE_CARLO_BLOCK", 64)
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2], K.models[3]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (3, 0), (0, 3), (1, 1)], agents)
+    MC = MonteCarlo(G, seed=11)
+
+    states, counts = MC.count_outcomes(300, 10)
+    assert counts.sum() == 300
+    final = MC.simulate(300, 10)
+    expected_states, expected_counts = np.unique(final, axis=0, return_counts=True)
+    assert np.array_equal(states, expected_states)
+    assert np.array_equal(counts, expected_counts)
+
+    parallel_states, parallel_counts = MC.count_outcomes(300, 10, workers=2)
+    assert np.array_equal(parallel_states, states)
+    assert np.array_equal(parallel_counts, counts)
+
+def test_agent_marginals():
+    K = BeliefBase([Prop.P, Prop.Q, Prop.R], [[Logic.IFF, Prop.R, Logic.AND, Prop.P, Prop.Q]])
+    agents: List[Interpretation] = [K.models[0], K.models[1], K.models[2], K.models[3]]
+    G = Graph(K, [(0, 1), (1, 2), (2, 0), (3, 0), (0, 3), (1, 1)], agents)
+    exact = MarkovChain(G).get_agent_marginals()
+    estimate, stderrs = MonteCarlo(G, seed=7).get_agent_marginals(replicas=4000, steps=100)
+    assert estimate.shape == exact.shape
+    assert np.allclose(estimate.sum(axis=1), 1)
+    assert np.all(np.abs(estimate - exact) <= 5 * stderrs + 1e-12)
+
+    # On a periodic chain the estimates follow the time average, as the exact engines do
+    models: List[Interpretation] = [[Z2(1), Z2(0)], [Z2(0), Z2(1)]]
+    G = Graph(models, [(0, 1), (1, 0)], [models[0], models[1]])
+    exact = MarkovChain(G).get_agent_marginals()
+    assert np.allclose(exact, 0.5)
+    assert np.allclose(LumpedMarkovChain(G, by_belief=True).get_agent_marginals(), exact)
+    for steps in (100, 101):
+        estimate, stderrs = MonteCarlo(G, seed=5).get_agent_marginals(replicas=4000, steps=steps)
+        assert np.all(stderrs > 0)
+        assert np.all(np.abs(estimate - exact) < 5 * stderrs)
@@ -0,0 +1,49 @@
+import pytest
+from itertools import product
+from src.jaggdy.utils.sat import sentence_to_cnf, SatSolver, enumerate_models
+from src.jaggdy.utils.utils import evaluate_sentence, ints_to_interpretation
+from src.jaggdy.utils.enums import Logic, Prop
+
+
+def test_sentence_to_cnf():
+    assert sentence_to_cnf([Prop.P, Prop.Q], []) == ([], 2)
+    assert sentence_to_cnf([Prop.P], [Logic.NOT, Prop.P]) == ([[-1]], 1)
+    assert sentence_to_cnf([Prop.P, Prop.Q], [Logic.AND, Prop.P, Prop.Q]) == (
+        [[-3, 1], [-3, 2], [3, -1, -2], [3]], 3
+    )
+
+    with pytest.raises(ValueError, match="Sentence contains an atom not in the agenda."):
+        sentence_to_cnf([Prop.P], [Logic.OR, Prop.P, Prop.Q])
+    with pytest.raises(ValueError, match="Sentence is not well-formed."):
+        sentence_to_cnf([Prop.P, Prop.Q], [Logic.IFF, Prop.P])
+    with pytest.raises(ValueError, match="Sentence is not well-formed."):
+        sentence_to_cnf([Prop.P, Prop.Q], [Prop.P, Prop.Q])
+
+def test_sat_solver():
+    assert SatSolver(0).solve() == [False]
+    assert SatSolver(2, [[1, 2], [-1]]).solve() == [False, False, True]
+    assert SatSolver(2, [[1, 2], [-1], [-2]]).solve() is None
+    assert SatSolver(1, [[]]).solve() is None
+
+    solver = SatSolver(3, [[1, 2, 3]])
+    assert solver.solve() == [False, False, False, True]
+    solver.add_clause([-3])
+    assert solver.solve() == [False, False, True, False]
+
+    with pytest.raises(ValueError, match="Clause refers to an unknown variable."):
+        solver.add_clause([4])
+
+def test_enumerate_models():
+    atoms = [Prop.P, Prop.Q, Prop.R, Prop.S]
+    sentences = [
+        [],
+        [Logic.AND, Prop.P, Logic.NOT, Prop.P],
+        [Logic.IFF, Prop.R, Logic.IMPLIES, Prop.P, Prop.Q],
+        [Logic.AND, Logic.OR, Prop.P, Prop.Q, Logic.IFF, Prop.S, Logic.NOT, Prop.R],
+    ]
+    for sentence in sentences:
+        expected = [list(map(bool, interp)) for interp in product([0, 1], repeat=len(atoms))
+            if evaluate_sentence(atoms, ints_to_interpretation(list(interp)), sentence)]
+        assert list(enumerate_models(atoms, sentence)) == expected
+
+    assert list(enumerate_models([], [])) == [[]]
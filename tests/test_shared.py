@@ -0,0 +1,45 @@
+import pytest
+import numpy as np
+from src.jaggdy.utils.shared import share_array, create_array, attach_array, keep_array
+
+
+def test_share_array():
+    array = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    memory, spec = share_array(array)
+    try:
+        attached_memory, attached = attach_array(spec)
+        assert attached.dtype == np.uint16
+        assert np.array_equal(attached, array)
+        with pytest.raises(ValueError):
+            attached[0, 0] = 1
+        del attached
+        attached_memory.close()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def test_create_array():
+    memory, array, spec = create_array((2, 3), np.int64)
+    try:
+        assert not np.any(array)
+        attached_memory, attached = attach_array(spec, writeable=True)
+        attached[1, 2] = 7
+        del attached
+        attached_memory.close()
+        assert array[1, 2] == 7
+        del array
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def test_keep_array():
+    memory, array, _ = create_array((4,), np.int64)
+    array[:] = [1, 2, 3, 4]
+    kept = keep_array(memory, array)
+    memory.unlink()
+    del memory, array
+    view = kept[1:3]
+    del kept
+    assert np.array_equal(view, [2, 3])
@@ -0,0 +1,86 @@
+import pytest
+import numpy as np
+from src.jaggdy.utils.sparse import (build_csr, csr_label_counts, CSRMatrix, CSRFileWriter)
+
+
+def test_build_csr():
+    offsets, indices = build_csr(np.array([2, 0, 0, 2, 2]), np.array([0, 1, 2, 2, 0]), 3)
+    assert list(offsets) == [0, 2, 2, 5]
+    assert list(indices) == [1, 2, 0, 2, 0]
+
+    offsets, indices = build_csr(np.array([], dtype=np.int64), np.array([], dtype=np.int64), 2)
+    assert list(offsets) == [0, 0, 0]
+    assert len(indices) == 0
+
+def test_csr_label_counts():
+    offsets, indices = build_csr(np.array([0, 0, 1, 2, 2]), np.array([1, 2, 0, 0, 2]), 3)
+    labels = np.array([1, 0, 1])
+    counts = csr_label_counts(offsets, indices, labels, 2)
+    assert counts.tolist() == [[1, 1], [0, 1], [0, 2]]
+
+    batch = np.array([[1, 0, 1], [0, 0, 0]])
+    counts = csr_label_counts(offsets, indices, batch, 2)
+    assert counts.shape == (2, 3, 2)
+    assert counts[0].tolist() == [[1, 1], [0, 1], [0, 2]]
+    assert counts[1].tolist() == [[2, 0], [1, 0], [2, 0]]
+
+def test_csr_matrix():
+    rng = np.random.default_rng(0)
+    A = rng.random((5, 4)) * (rng.random((5, 4)) < 0.4)
+    B = rng.random((4, 6)) * (rng.random((4, 6)) < 0.5)
+    a = CSRMatrix.from_dense(A)
+    b = CSRMatrix.from_dense(B)
+    assert a.nnz == np.count_nonzero(A)
+    assert np.array_equal(a.toarray(), A)
+    assert np.allclose((a @ b).toarray(), A @ B)
+    assert np.allclose(a @ B, A @ B)
+    assert np.allclose(a @ B[:, 0], A @ B[:, 0])
+    x = rng.random(5)
+    assert np.allclose(x @ a, x @ A)
+    assert np.allclose(np.ones((2, 5)) @ a, np.ones((2, 5)) @ A)
+    assert np.allclose(a.sum(axis=1), A.sum(axis=1))
+    assert np.allclose(a.sum(axis=0), A.sum(axis=0))
+    assert np.array_equal(a[2], A[2])
+    assert np.array_equal(a.take_rows(np.array([3, 0, 3])).toarray(), A[[3, 0, 3]])
+    assert np.array_equal(a.prune(0.5).toarray(), np.where(A > 0.5, A, 0))
+    with pytest.raises(ValueError, match="Matrices must be compatible for multiplication."):
+        a @ a
+
+    c = CSRMatrix.from_triplets(np.array([1, 0, 1]), np.array([2, 1, 2]), np.array([1., 2., 3.]), (2, 3))
+    assert c.toarray().tolist() == [[0, 2, 0], [0, 0, 4]]
+    cols, values = c.row(1)
+    assert list(cols) == [2] and list(values) == [4]
+    assert CSRMatrix.from_dense(np.array([])).shape == (0, 0)
+
+def test_csr_files(tmp_path):
+    rng = np.random.default_rng(1)
+    A = rng.random((6, 5)) * (rng.random((6, 5)) < 0.4)
+    a = CSRMatrix.from_dense(A)
+    a.save(str(tmp_path / "a"))
+    loaded = CSRMatrix.load(str(tmp_path / "a"), 5)
+    assert isinstance(loaded.data.base, np.memmap)
+    assert np.array_equal(loaded.toarray(), A)
+
+    # Rows written a block at a time
+    writer = CSRFileWriter(str(tmp_path / "b"), 5)
+    for start in range(0, 6, 4):
+        block = a.indptr[start:min(start + 4, 6) + 1]
+        writer.append(np.diff(block), a.indices[block[0]:block[-1]], a.data[block[0]:block[-1]])
+    assert writer.nnz == a.nnz
+    assert np.array_equal(writer.close().toarray(), A)
+
+    # Rows whose columns are filled in through the file
+    writer = CSRFileWriter(str(tmp_path / "e"), 5)
+    assert writer.reserve(np.diff(a.indptr[:4]), a.data[:a.indptr[3]]) == 0
+    start = writer.reserve(np.diff(a.indptr[3:]), a.data[a.indptr[3]:])
+    assert start == a.indptr[3]
+    indices = np.memmap(writer.indices_path, dtype=np.int64, mode="r+")
+    indices[:] = a.indices
+    indices.flush()
+    del indices
+    assert np.array_equal(writer.close().toarray(), A)
+    with pytest.raises(ValueError, match="Sparse matrix structure does not match its shape."):
+        CSRFileWriter(str(tmp_path / "c"), 5).append(np.array([2]), np.array([0]), np.array([1.]))
+
+    CSRMatrix.from_dense(np.zeros((2, 2))).save(str(tmp_path / "d"))
+    assert CSRMatrix.load(str(tmp_path / "d"), 2).shape == (2, 2)
@@ -1,10 +1,16 @@
 import pytest
 import numpy as np
+from fractions import Fraction
 from src.jaggdy.utils.utils import (hamming_distance,
     evaluate_sentence, ints_to_interpretation,
     interpretation_to_ints, strs_to_sentence, use_operation,
-    matrix_z2_to_matrix, matrix_to_matrix_z2)
+    matrix_z2_to_matrix, matrix_to_matrix_z2, truth_table, compile_sentence,
+    evaluate_indexed_sentence, pack_rows, unpack_rows, pack_interpretations,
+    unpack_interpretations, packed_hamming_distances, matrix_to_bits, sample_minimizers,
+    compositions, multiset_permutations, multinomial_probability, state_code_weights,
+    encode_states, normalize_sentence)
 from src.jaggdy.utils.utils import Z2, Logic, Prop
+from src.jaggdy.utils.atoms import AtomTable
 
 
 def test_hamming_distance():
@@ -18,6 +24,77 @@ def test_hamming_distance():
     with pytest.raises(ValueError, match="List lengths are not equal."):
         hamming_distance([], [Z2(1), Z2(0), Z2(1)])
 
+def test_pack_rows():
+    table = np.array([[True, False, True], [False, False, True]])
+    assert np.array_equal(pack_rows(table), np.array([[5], [4]], dtype=np.uint64))
+    assert np.array_equal(unpack_rows(pack_rows(table), 3), table)
+    assert pack_rows(np.zeros((2, 0), dtype=bool)).shape == (2, 0)
+
+    table = np.arange(2 * 130).reshape(2, 130) % 3 == 0
+    assert pack_rows(table).shape == (2, 3)
+    assert np.array_equal(unpack_rows(pack_rows(table), 130), table)
+
+def test_pack_interpretations():
+    interps = [[Z2(1), Z2(0), Z2(1)], [Z2(0), Z2(0), Z2(1)]]
+    assert np.array_equal(pack_interpretations(interps), np.array([[5], [4]], dtype=np.uint64))
+    assert unpack_interpretations(pack_interpretations(interps), 3) == interps
+    assert pack_interpretations([], 70).shape == (0, 2)
+
+def test_packed_hamming_distances():
+    interps = [[Z2(1), Z2(0), Z2(0), Z2(1)], [Z2(1), Z2(1), Z2(0), Z2(1)], [Z2(0), Z2(1), Z2(1), Z2(0)]]
+    packed = pack_interpretations(interps)
+    assert np.array_equal(packed_hamming_distances(packed, packed), np.array([
+        [hamming_distance(a, b) for b in interps] for a in interps
+    ]))
+
+    long1 = [Z2(i % 2) for i in range(150)]
+    long2 = [Z2(i % 3 == 0) for i in range(150)]
+    assert packed_hamming_distances(
+        pack_interpretations([long1]), pack_interpretations([long2])
+    )[0, 0] == hamming_distance(long1, long2)
+
+    with pytest.raises(ValueError, match="Packed interpretations must have the same number of words."):
+        packed_hamming_distances(pack_interpretations([long1]), packed)
+
+def test_sample_minimizers():
+    rng = np.random.default_rng(0)
+    costs = np.array([[3, 1, 2], [0, 5, 0], [4, 4, 4]])
+    seen = set()
+    for _ in range(50):
+        choices = sample_minimizers(costs, rng)
+        assert choices[0] == 1
+        assert choices[1] in (0, 2)
+        seen.update((i, int(c)) for i, c in enumerate(choices))
+    assert seen == {(0, 1), (1, 0), (1, 2), (2, 0), (2, 1), (2, 2)}
+
+    assert sample_minimizers(costs[np.newaxis], np.random.default_rng(1)).shape == (1, 3)
+
+def test_encode_states():
+    assert list(state_code_weights(4, 3)) == [16, 4, 1]
+    assert state_code_weights(4, 40).dtype == np.object_
+    codes = encode_states(np.array([[0, 0, 0], [1, 2, 3], [3, 3, 3]]), 4)
+    assert list(codes) == [0, 27, 63]
+    assert encode_states(np.full(40, 3), 4) == 4 ** 40 - 1
+
+def test_compositions():
+    assert list(compositions(2, 2)) == [(0, 2), (1, 1), (2, 0)]
+    assert len(list(compositions(5, 3))) == 21
+    assert list(compositions(0, 0)) == [()]
+    assert list(compositions(1, 0)) == []
+
+def test_multiset_permutations():
+    assert list(multiset_permutations((1, 2))) == [(0, 1, 1), (1, 0, 1), (1, 1, 0)]
+    assert list(multiset_permutations((0, 0))) == [()]
+    assert len(list(multiset_permutations((2, 1, 1)))) == 12
+
+def test_multinomial_probability():
+    assert multinomial_probability((1, 1)) == 0.5
+    assert multinomial_probability((2, 0)) == 0.25
+    assert multinomial_probability((3,)) == 1
+    assert sum(multinomial_probability(c) for c in compositions(4, 3)) == pytest.approx(1)
+    assert multinomial_probability((2, 1), exact=True) == Fraction(3, 8)
+    assert sum(multinomial_probability(c, exact=True) for c in compositions(4, 3)) == 1
+
 def test_evaluate_sentence():
     assert evaluate_sentence([Prop.P], [Z2(0)], []) == True
     assert evaluate_sentence([Prop.P, Prop.Q], [Z2(1), Z2(0)], []) == True
@@ -36,6 +113,63 @@ def test_evaluate_sentence():
     with pytest.raises(ValueError, match="The length of the interpretation is not equal to the number of atomic propositions."):
         assert evaluate_sentence([Prop.P, Prop.Q], [Z2(1), Z2(0), Z2(1)], [])
 
+def test_evaluate_indexed_sentence():
+    assert evaluate_indexed_sentence([Z2(0)], []) == True
+    assert evaluate_indexed_sentence([Z2(1), Z2(0)], [Logic.IFF, 0, 1]) == False
+    assert evaluate_indexed_sentence([Z2(1), Z2(1)], [Logic.IFF, 0, 1]) == True
+    assert evaluate_indexed_sentence([Z2(1), Z2(0), Z2(1)], [Logic.IMPLIES, 0, 1]) == False
+    assert evaluate_indexed_sentence([Z2(1), Z2(0), Z2(1)], [Logic.IMPLIES, 1, 0]) == True
+    assert evaluate_indexed_sentence([Z2(1), Z2(0), Z2(1), Z2(0)], [Logic.AND, Logic.OR, 0, 1, Logic.OR, 2, 3]) == True
+
+    interpretation = [Z2(i % 3 == 0) for i in range(300)]
+    assert evaluate_indexed_sentence(interpretation, [Logic.AND, 0, Logic.NOT, 299]) == True
+
+def test_normalize_sentence():
+    assert normalize_sentence([]) == []
+    assert normalize_sentence([Logic.AND, 1, 0]) == [Logic.AND, 0, 1]
+    assert normalize_sentence([Logic.IMPLIES, 1, 0]) == [Logic.IMPLIES, 1, 0]
+    assert normalize_sentence([Logic.IFF, 2, Logic.OR, 1, 0]) == [Logic.IFF, Logic.OR, 0, 1, 2]
+    # Nested conjunctions are gathered whatever their grouping
+    expected = [Logic.AND, Logic.AND, Logic.NOT, 2, 0, 1]
+    assert normalize_sentence([Logic.AND, Logic.NOT, 2, Logic.AND, 1, 0]) == expected
+    assert normalize_sentence([Logic.AND, Logic.AND, 1, Logic.NOT, 2, 0]) == expected
+    assert normalize_sentence([Logic.OR, 2, Logic.AND, 1, 0]) == [Logic.OR, Logic.AND, 0, 1, 2]
+
+def test_truth_table():
+    assert truth_table(0).shape == (1, 0)
+    assert np.array_equal(truth_table(2), np.array([
+        [False, False],
+        [False, True],
+        [True, False],
+        [True, True]
+    ]))
+    assert np.array_equal(truth_table(3, 2, 5), np.array([
+        [False, True, False],
+        [False, True, True],
+        [True, False, False]
+    ]))
+
+def test_compile_sentence():
+    table = truth_table(2)
+    assert np.array_equal(compile_sentence([Prop.P, Prop.Q], [])(table), [True, True, True, True])
+    assert np.array_equal(compile_sentence([Prop.P, Prop.Q], [Logic.IFF, Prop.P, Prop.Q])(table), [True, False, False, True])
+    assert np.array_equal(compile_sentence([Prop.P, Prop.Q], [Logic.IMPLIES, Prop.P, Prop.Q])(table), [True, True, False, True])
+    assert np.array_equal(compile_sentence([Prop.Q, Prop.P], [Logic.IMPLIES, Prop.P, Prop.Q])(table), [True, False, True, True])
+    assert np.array_equal(compile_sentence([Prop.P, Prop.Q], [Logic.AND, Logic.NOT, Prop.P, Prop.Q])(table), [False, True, False, False])
+
+    atoms = [Prop.P, Prop.Q, Prop.R, Prop.S]
+    sentence = [Logic.AND, Logic.OR, Prop.P, Prop.Q, Logic.IMPLIES, Prop.R, Logic.NOT, Prop.S]
+    table = truth_table(len(atoms))
+    expected = [evaluate_sentence(atoms, ints_to_interpretation(row), sentence) for row in table.astype(int).tolist()]
+    assert np.array_equal(compile_sentence(atoms, sentence)(table), expected)
+
+    with pytest.raises(ValueError, match="Sentence contains an atom not in the agenda."):
+        compile_sentence([Prop.P], [Logic.AND, Prop.P, Prop.Q])
+    with pytest.raises(ValueError, match="Sentence is not well-formed."):
+        compile_sentence([Prop.P, Prop.Q], [Logic.AND, Prop.P])
+    with pytest.raises(ValueError, match="Sentence is not well-formed."):
+        compile_sentence([Prop.P, Prop.Q], [Prop.P, Prop.Q])
+
 def test_ints_to_interpretation():
     assert ints_to_interpretation([]) == []
     assert ints_to_interpretation([1, 0, 1]) == [Z2(1), Z2(0), Z2(1)]
@@ -59,6 +193,13 @@ def test_strs_to_sentence():
     with pytest.raises(ValueError, match="Symbol is neither a valid Prop nor Logic."):
         strs_to_sentence(["sd"])
 
+    atoms = AtomTable(["a0", "a1", "p"])
+    assert strs_to_sentence(["&", "a1", "p"], atoms) == [Logic.AND, 1, 2]
+    assert strs_to_sentence(["<->", "a0", "->", "p", "a1"], atoms) == [Logic.IFF, 0, Logic.IMPLIES, 2, 1]
+
+    with pytest.raises(ValueError, match="Symbol is neither a valid atom nor Logic."):
+        strs_to_sentence(["&", "a2", "p"], atoms)
+
 def test_use_operation():
     assert use_operation(Logic.NOT, Z2(1)) == Z2(0)
     assert use_operation(Logic.AND, Z2(1), Z2(0)) == Z2(0)
@@ -125,3 +266,17 @@ def test_matrix_to_matrix_z2():
         ]))
     )
 
+
+def test_matrix_to_bits():
+    assert matrix_to_bits(np.array([], dtype=object)).size == 0
+
+    bits = matrix_to_bits(np.array([
+        [Z2(1), Z2(0), Z2(1)],
+        [Z2(0), Z2(0), Z2(1)],
+    ], dtype=object))
+    assert bits.dtype == np.uint8
+    assert np.array_equal(bits, np.array([[1, 0, 1], [0, 0, 1]]))
+
+    bits = matrix_to_bits(np.array([[3, 2, 1]]))
+    assert bits.dtype == np.uint8
+    assert np.array_equal(bits, np.array([[1, 0, 1]]))